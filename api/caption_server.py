@@ -0,0 +1,289 @@
+"""
+FastAPI caption server implementing the endpoints JoyCaptionServiceClient targets,
+so one GPU box can serve many ComfyUI workers in remote mode.
+
+Run it from the directory containing the extension folder, e.g. ComfyUI/custom_nodes:
+
+    python -m Pillar_For_ComfyUI.api.caption_server --port 8000 --workers 2
+
+Every worker process loads its own copy of the model. To scale across GPUs, start one
+server per GPU (CUDA_VISIBLE_DEVICES) on its own port.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, Response
+from PIL import Image, UnidentifiedImageError
+
+from ..dto.base_dto import CacheClearRequest, CacheClearResponse, MemoryCleanupRequest, MemoryCleanupResponse
+from ..dto.joy_caption_dto import JoyCaptionRequest, JoyCaptionResponse
+from ..dto.translate_dto import TranslationBatchRequest, TranslationBatchResponse, TranslationRequest, \
+    TranslationResponse
+from ..service.batch_scheduler import BatchScheduler
+from ..service.joy_caption_service import JoyCaptionService
+from ..service.model_registry import ModelRegistry
+from ..util import metrics
+from ..util.log import setup_server_logging
+from ..util.cache import ResultCache, hash_key
+from ..util.constants import DEFAULT_MAX_NEW_TOKENS, DEFAULT_OUTPUT_LANGUAGE, DEFAULT_SYSTEM_PROMPT, \
+    DEFAULT_TEMPERATURE, DEFAULT_TOP_K, DEFAULT_TOP_P, OUTPUT_LANGUAGE, TRANSLATION_DIRECTION
+from ..util.settings import CAPTION_CACHE_MAX_ENTRIES, CAPTION_CACHE_TTL, PREFIX_CACHE_ENABLED, PRELOAD_MODEL, \
+    PRELOAD_WARMUP, SERVER_BATCH_WAIT_MS, SERVER_HOST, SERVER_MAX_BATCH_SIZE, SERVER_MAX_QUEUE, SERVER_MEMORY_MODE, \
+    SERVER_MODEL, SERVER_MODEL_DIR, SERVER_PORT, SERVER_RETRY_AFTER, SERVER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Runs in every worker process
+    setup_server_logging()
+    if PRELOAD_MODEL:
+        # Resolve (and possibly download) the checkpoint off the event loop, requests wait for the load
+        threading.Thread(target=lambda: ModelRegistry.preload(JoyCaptionService, _resolve_model_path(),
+                                                              SERVER_MEMORY_MODE, warmup=PRELOAD_WARMUP),
+                         name="preload", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="Pillar Caption Server", lifespan=_lifespan)
+
+_caches: Dict[str, ResultCache] = {
+    "caption": ResultCache("caption", CAPTION_CACHE_MAX_ENTRIES, CAPTION_CACHE_TTL),
+}
+
+
+def _model_path(model: str = SERVER_MODEL, model_dir: str = SERVER_MODEL_DIR) -> str:
+    return model if Path(model).is_dir() else str(Path(model_dir) / Path(model).stem)
+
+
+def _resolve_model_path(model: str = SERVER_MODEL, model_dir: str = SERVER_MODEL_DIR) -> str:
+    """Use model as a local checkpoint directory, or download it from the Hugging Face hub."""
+    if Path(model).is_dir():
+        return model
+
+    model_path = Path(_model_path(model, model_dir))
+    if not model_path.exists():
+        from huggingface_hub import snapshot_download
+        logger.info("Downloading model from %s to %s...", model, model_path)
+        snapshot_download(repo_id=model, local_dir=str(model_path))
+    return str(model_path)
+
+
+def _caption_form(image_file: bytes = File(...),
+                  system_prompt: str = Form(DEFAULT_SYSTEM_PROMPT),
+                  prompt: str = Form("Describe this image"),
+                  max_new_tokens: int = Form(DEFAULT_MAX_NEW_TOKENS),
+                  temperature: float = Form(DEFAULT_TEMPERATURE),
+                  top_p: float = Form(DEFAULT_TOP_P),
+                  top_k: int = Form(DEFAULT_TOP_K),
+                  output_language: str = Form(DEFAULT_OUTPUT_LANGUAGE),
+                  user_name: str = Form("anonymous")) -> JoyCaptionRequest:
+    """Parse the multipart form JoyCaptionServiceClient.generate_caption sends."""
+    return JoyCaptionRequest(image_file=image_file, system_prompt=system_prompt, prompt=prompt,
+                             max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, top_k=top_k,
+                             output_language=output_language, user_name=user_name)
+
+
+def _digest(image_file: bytes) -> str:
+    return hashlib.blake2b(image_file, digest_size=16).hexdigest()
+
+
+def _decode_image(image_file: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(image_file)).convert("RGB")
+
+
+def _use_service():
+    return ModelRegistry.use(JoyCaptionService, _resolve_model_path(), SERVER_MEMORY_MODE)
+
+
+def _run_caption_batch(key: Tuple, items: List[Tuple[Image.Image, str, str]]) -> List[Tuple[str, str]]:
+    max_new_tokens, temperature, top_p, top_k, output_language = key
+    with _use_service() as service:
+        return service.generate_many(items, max_new_tokens, temperature, top_p, top_k, SERVER_MAX_BATCH_SIZE,
+                                     output_language=output_language)
+
+
+def _run_translation_batch(key: Tuple, texts: List[str]) -> List[str]:
+    direction, = key
+    with _use_service() as service:
+        return service.translate_many(texts, SERVER_MAX_BATCH_SIZE, direction)
+
+
+# Concurrent requests with compatible generation parameters share one batched generate call
+_caption_scheduler = BatchScheduler(_run_caption_batch, SERVER_MAX_BATCH_SIZE, SERVER_BATCH_WAIT_MS / 1000,
+                                    "caption")
+_translation_scheduler = BatchScheduler(_run_translation_batch, SERVER_MAX_BATCH_SIZE, SERVER_BATCH_WAIT_MS / 1000,
+                                        "translation")
+
+
+def _check_overload(scheduler: BatchScheduler) -> None:
+    """Refuse new work while the queue is full, so clients back off instead of timing out in the queue."""
+    pending = scheduler.pending_count()
+    if SERVER_MAX_QUEUE and pending >= SERVER_MAX_QUEUE:
+        raise HTTPException(status_code=503, detail=f"Server overloaded, {pending} {scheduler.name} requests queued",
+                            headers={"Retry-After": str(SERVER_RETRY_AFTER)})
+
+
+def _is_loaded() -> bool:
+    return any(entry["service"] == JoyCaptionService.get_name() for entry in ModelRegistry.resident())
+
+
+def _model_status() -> str:
+    return ModelRegistry.status(JoyCaptionService, _model_path(), SERVER_MEMORY_MODE)
+
+
+@app.get("/health/direct")
+def health_check() -> Dict:
+    return {
+        "success": True,
+        "msg": "ok",
+        "model": SERVER_MODEL,
+        "memory_mode": SERVER_MEMORY_MODE,
+        "model_loaded": _is_loaded(),
+        "model_status": _model_status(),
+        "resident_models": ModelRegistry.resident(),
+        "pid": os.getpid(),
+    }
+
+
+@app.get("/metrics")
+def get_metrics() -> Response:
+    """Prometheus metrics of this worker process (PILLAR_METRICS=1), every worker keeps its own."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled, set PILLAR_METRICS=1")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/joycaption/generate", response_model=JoyCaptionResponse)
+async def generate_caption(request: JoyCaptionRequest = Depends(_caption_form),
+                           x_request_id: str = Header(None)) -> JoyCaptionResponse:
+    req_id = x_request_id or request.req_id
+    if request.output_language not in OUTPUT_LANGUAGE.codes():
+        raise HTTPException(status_code=422, detail=f"Unknown output_language: {request.output_language}, "
+                                                    f"expected one of {OUTPUT_LANGUAGE.codes()}")
+    _check_overload(_caption_scheduler)
+
+    # Hashing and decoding take time proportional to the upload size, both run off the event loop
+    # Sampled captions are random, only deterministic results are cached
+    cache = _caches["caption"]
+    cache_key = None
+    if request.temperature <= 0:
+        image_digest = await asyncio.to_thread(_digest, request.image_file)
+        cache_key = hash_key(image_digest, request.system_prompt, request.prompt, request.max_new_tokens,
+                             request.temperature, request.top_p, request.top_k, request.output_language,
+                             SERVER_MEMORY_MODE, PREFIX_CACHE_ENABLED)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return JoyCaptionResponse(rel_req_id=req_id, enCaption=cached[0], cnCaption=cached[1])
+
+    try:
+        image = await asyncio.to_thread(_decode_image, request.image_file)
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=422, detail="image_file is not a valid image")
+
+    try:
+        key = (request.max_new_tokens, request.temperature, request.top_p, request.top_k, request.output_language)
+        en_caption, cn_caption = await asyncio.wrap_future(
+            _caption_scheduler.submit(key, (image, request.system_prompt, request.prompt)))
+    except Exception as e:
+        logger.error("Error generating caption for request %s: %s", req_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error generating caption: {str(e)}")
+
+    if cache_key is not None:
+        cache.set(cache_key, [en_caption, cn_caption])
+    return JoyCaptionResponse(rel_req_id=req_id, enCaption=en_caption, cnCaption=cn_caption)
+
+
+def _validate_direction(direction: str) -> None:
+    if direction not in TRANSLATION_DIRECTION.codes():
+        raise HTTPException(status_code=422, detail=f"Unknown direction: {direction}, "
+                                                    f"expected one of {TRANSLATION_DIRECTION.codes()}")
+
+
+@app.post("/translate", response_model=TranslationResponse)
+async def translate(request: TranslationRequest, x_request_id: str = Header(None)) -> TranslationResponse:
+    req_id = x_request_id or request.req_id
+    _validate_direction(request.direction)
+    _check_overload(_translation_scheduler)
+    start = time.perf_counter()
+    try:
+        translated_text = await asyncio.wrap_future(_translation_scheduler.submit((request.direction,),
+                                                                                  request.text))
+    except Exception as e:
+        logger.error("Error translating request %s: %s", req_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error translating text: {str(e)}")
+
+    return TranslationResponse(rel_req_id=req_id, translated_text=translated_text, original_text=request.text,
+                               execution_time=time.perf_counter() - start)
+
+
+@app.post("/translate/batch", response_model=TranslationBatchResponse)
+async def translate_batch(request: TranslationBatchRequest,
+                          x_request_id: str = Header(None)) -> TranslationBatchResponse:
+    req_id = x_request_id or request.req_id
+    _validate_direction(request.direction)
+    _check_overload(_translation_scheduler)
+    start = time.perf_counter()
+    try:
+        # Submitted one by one, the scheduler batches them together with texts of concurrent requests
+        translated_texts = await asyncio.gather(*(asyncio.wrap_future(
+            _translation_scheduler.submit((request.direction,), text)) for text in request.texts))
+    except Exception as e:
+        logger.error("Error translating batch request %s: %s", req_id, e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error translating texts: {str(e)}")
+
+    return TranslationBatchResponse(rel_req_id=req_id, translated_texts=list(translated_texts),
+                                    original_texts=request.texts, execution_time=time.perf_counter() - start)
+
+
+@app.post("/admin/clear-cache", response_model=CacheClearResponse)
+def clear_cache(request: CacheClearRequest) -> CacheClearResponse:
+    if request.service is not None and request.service not in _caches:
+        raise HTTPException(status_code=422, detail=f"Unknown cache: {request.service}")
+
+    names = [request.service] if request.service else list(_caches.keys())
+    cleared_count = sum(_caches[name].clear() for name in names)
+    return CacheClearResponse(rel_req_id=request.req_id, cleared_count=cleared_count, cleared_services=names)
+
+
+@app.post("/admin/cleanup-memory", response_model=MemoryCleanupResponse)
+def cleanup_memory(request: MemoryCleanupRequest) -> MemoryCleanupResponse:
+    if request.service not in (JoyCaptionService.get_name(), JoyCaptionService.get_model_name()):
+        raise HTTPException(status_code=422, detail=f"Unknown service: {request.service}")
+
+    if not _is_loaded():
+        return MemoryCleanupResponse(rel_req_id=request.req_id, freed_memory=False,
+                                     cleanup_details="Model is not loaded")
+
+    if not ModelRegistry.unload_all():
+        return MemoryCleanupResponse(rel_req_id=request.req_id, freed_memory=False,
+                                     cleanup_details="Model is in use by a running batch")
+    return MemoryCleanupResponse(rel_req_id=request.req_id, freed_memory=True,
+                                 cleanup_details=f"Unloaded {SERVER_MODEL} ({SERVER_MEMORY_MODE})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pillar caption server")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="Worker processes, each one loads its own copy of the model")
+    args = parser.parse_args()
+
+    setup_server_logging()
+    import uvicorn
+    uvicorn.run(f"{__package__}.caption_server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
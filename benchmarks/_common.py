@@ -0,0 +1,97 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import importlib
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+
+def import_package_module(name: str):
+    """Import a module of the extension, e.g. "util.image_codec", without installing the package."""
+    if str(PACKAGE_ROOT.parent) not in sys.path:
+        sys.path.insert(0, str(PACKAGE_ROOT.parent))
+    return importlib.import_module(f"{PACKAGE_ROOT.name}.{name}")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ms = [sample * 1000 for sample in samples]
+    return {
+        "runs": len(ms),
+        "mean_ms": statistics.fmean(ms) if ms else 0.0,
+        "p50_ms": percentile(ms, 50),
+        "p90_ms": percentile(ms, 90),
+        "p99_ms": percentile(ms, 99),
+        "min_ms": min(ms) if ms else 0.0,
+        "max_ms": max(ms) if ms else 0.0,
+    }
+
+
+def write_results(path: str, benchmark: str, results: Any) -> None:
+    """Write machine readable results, "-" writes to stdout."""
+    payload = {
+        "benchmark": benchmark,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(payload, indent=2, ensure_ascii=False)
+    if path == "-":
+        print(text)
+    else:
+        Path(path).write_text(text, encoding="utf-8")
+
+
+def measure_allocations(func: Callable[[], Any]) -> Dict[str, float]:
+    """
+    Python heap allocations of one call: the peak traced size and the blocks still allocated afterwards.
+    Memory allocated outside the Python allocator, such as torch tensors, is not seen.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        func()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained = after.compare_to(before, "filename")
+    return {
+        "alloc_peak_kib": peak / 1024,
+        "alloc_retained_blocks": sum(stat.count_diff for stat in retained),
+    }
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline_path: str, max_regression: float) -> List[str]:
+    """
+    Compare the p50 latency of every stage with the results of an earlier run written by write_results,
+    returns a message per stage slower by more than max_regression (0.2 is 20%).
+    """
+    baseline = {stage["stage"]: stage for stage in json.loads(Path(baseline_path).read_text("utf-8"))["results"]}
+    regressions = []
+    for stage in results:
+        previous = baseline.get(stage["stage"])
+        if previous and previous["p50_ms"] > 0 and stage["p50_ms"] > previous["p50_ms"] * (1 + max_regression):
+            regressions.append(f"{stage['stage']}: p50 {stage['p50_ms']:.2f} ms, "
+                               f"baseline {previous['p50_ms']:.2f} ms (+{stage['p50_ms'] / previous['p50_ms'] - 1:.0%})")
+    return regressions
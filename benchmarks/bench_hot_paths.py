@@ -0,0 +1,166 @@
+"""
+Benchmark the caption, translation and client hot paths on a CPU-only box.
+
+JoyCaptionService runs on a tiny randomly initialized Llava stand-in (see tiny_llava.py) and the client talks
+to a local stub server (see stub_server.py), so no GPU, model download or caption server is needed. Every stage
+reports latency percentiles, throughput and Python heap allocations per call.
+
+    python benchmarks/bench_hot_paths.py [--comfyui /path/to/ComfyUI] [--runs 20] [--json results.json]
+                                         [--baseline previous.json --max-regression 0.2]
+
+build_prompt and tensor_to_bytes live in the ComfyUI nodes and are only measured when ComfyUI can be
+imported (--comfyui). With --baseline the run fails when a stage's p50 is slower than in the baseline
+results by more than --max-regression.
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from PIL import Image
+
+from _common import find_regressions, import_package_module, measure_allocations, summarize, write_results
+from stub_server import StubServer
+import tiny_llava
+
+BILINGUAL_CAPTION = (
+    "**English:** A red fox sits in the snow at dusk, its thick winter fur glowing orange in the low sunlight. "
+    "Bare birch trunks stand behind it and the sky fades from pink to deep blue.\n\n"
+    "**Chinese:** 黄昏时分，一只红狐狸坐在雪地里，厚厚的冬毛在低垂的阳光下泛着橙色的光。"
+    "它身后立着光秃秃的白桦树干，天空从粉色渐渐过渡到深蓝色。"
+)
+TRANSLATION_TEXTS = ["masterpiece, best quality, 1girl, red hair, smiling", "一只在雪地里的红狐狸",
+                     "soft cinematic lighting, shallow depth of field", "夕阳下的城市天际线"] * 4
+
+
+def run_stage(name: str, func: Callable[[], Any], runs: int, items: int = 1) -> Dict[str, Any]:
+    """Time func over runs calls after one warm-up call, items is the number of items one call handles."""
+    func()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    summary = summarize(samples)
+    return {
+        "stage": name,
+        "items_per_call": items,
+        **summary,
+        "items_per_s": items * 1000 / summary["mean_ms"] if summary["mean_ms"] else 0.0,
+        **measure_allocations(func),
+    }
+
+
+def node_stages(runs: int) -> List[Dict[str, Any]]:
+    import torch
+
+    joy_caption = import_package_module("nodes.joy_caption")
+    constants = import_package_module("util.constants")
+    image_codec = import_package_module("util.image_codec")
+
+    caption_type = constants.CAPTION_TYPE.labels()[0]
+    caption_length = constants.CAPTION_LENGTH_CHOICES.labels()[-1]
+    extra_options = constants.EXTRA_OPTIONS.labels()[:3]
+    frame = torch.rand(1, 1080, 1920, 3)
+    return [
+        run_stage("build_prompt", lambda: joy_caption.build_prompt(caption_type, caption_length, extra_options,
+                                                                   "Alice"), runs),
+        run_stage("tensor_to_bytes[1080p,JPEG]", lambda: joy_caption.tensor_to_bytes(frame), runs),
+        run_stage(f"tensor_to_bytes[1080p,JPEG,{image_codec.MODEL_IMAGE_SIZE}]",
+                  lambda: joy_caption.tensor_to_bytes(frame, short_side=image_codec.MODEL_IMAGE_SIZE), runs),
+    ]
+
+
+def parser_stages(runs: int) -> List[Dict[str, Any]]:
+    bilingual = import_package_module("service.bilingual")
+    return [run_stage("parse_bilingual_caption", lambda: bilingual.parse_bilingual_caption(BILINGUAL_CAPTION),
+                      runs)]
+
+
+def client_stages(runs: int, delay: float) -> List[Dict[str, Any]]:
+    client_module = import_package_module("client.joy_caption_service_client")
+    joy_caption_dto = import_package_module("dto.joy_caption_dto")
+    translate_dto = import_package_module("dto.translate_dto")
+
+    buffer = io.BytesIO()
+    Image.effect_noise((384, 384), 32).convert("RGB").save(buffer, "JPEG", quality=85)
+    caption_request = joy_caption_dto.JoyCaptionRequest(image_file=buffer.getvalue(), system_prompt="system",
+                                                        prompt="Write a detailed description for this image.")
+    translation_request = translate_dto.TranslationBatchRequest(texts=TRANSLATION_TEXTS)
+
+    client = client_module.JoyCaptionServiceClient()
+    with StubServer(delay=delay) as server:
+        return [
+            run_stage("client.generate_caption", lambda: client.generate_caption(server.base_url, caption_request),
+                      runs),
+            run_stage("client.translate_many", lambda: client.translate_many(server.base_url, translation_request),
+                      runs, len(TRANSLATION_TEXTS)),
+        ]
+
+
+def service_stages(runs: int, model_dir: Path, images: int, max_new_tokens: int) -> List[Dict[str, Any]]:
+    service_module = import_package_module("service.joy_caption_service")
+
+    service = service_module.JoyCaptionService(str(tiny_llava.ensure(model_dir)), "Default", "cpu")
+    frames = [Image.effect_noise((512, 512), 32).convert("RGB") for _ in range(images)]
+    stages = []
+    for batch_size in (1, images):
+        stages.append(run_stage(
+            f"service.generate[batch={batch_size}]",
+            lambda: service.generate(frames, "system", "Write a detailed description for this image.",
+                                     max_new_tokens, 0.0, 0.9, 0, batch_size), runs, images))
+    stages.append(run_stage("service.translate_many",
+                            lambda: service.translate_many(TRANSLATION_TEXTS, len(TRANSLATION_TEXTS)), runs,
+                            len(TRANSLATION_TEXTS)))
+    service.cleanup()
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comfyui", help="ComfyUI checkout, enables the build_prompt and tensor_to_bytes stages")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--model-runs", type=int, default=5, help="Runs of the stages calling the stand-in model")
+    parser.add_argument("--images", type=int, default=4, help="Images per service.generate call")
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    parser.add_argument("--server-delay-ms", type=float, default=0.0, help="Simulated inference time of the stub")
+    parser.add_argument("--model-dir", type=Path, default=tiny_llava.DEFAULT_PATH,
+                        help="Where the stand-in model is built, reused by later runs")
+    parser.add_argument("--skip-model", action="store_true", help="Skip the stages calling the stand-in model")
+    parser.add_argument("--json", help="Write machine readable results to this file, - for stdout")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.comfyui:
+        sys.path.insert(0, args.comfyui)
+
+    results = []
+    try:
+        import folder_paths  # noqa: F401
+        results += node_stages(args.runs)
+    except ImportError:
+        print("ComfyUI not importable, skipping build_prompt and tensor_to_bytes (see --comfyui)")
+    results += parser_stages(args.runs)
+    results += client_stages(args.runs, args.server_delay_ms / 1000)
+    if not args.skip_model:
+        results += service_stages(args.model_runs, args.model_dir, args.images, args.max_new_tokens)
+
+    print(f"{'stage':<36} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'items/s':>10} {'peak KiB':>9} {'blocks':>7}")
+    for stage in results:
+        print(f"{stage['stage']:<36} {stage['p50_ms']:>9.3f} {stage['p90_ms']:>9.3f} {stage['p99_ms']:>9.3f} "
+              f"{stage['items_per_s']:>10.1f} {stage['alloc_peak_kib']:>9.1f} {stage['alloc_retained_blocks']:>7}")
+    if args.json:
+        write_results(args.json, "hot_paths", results)
+
+    if args.baseline:
+        regressions = find_regressions(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"FAIL: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
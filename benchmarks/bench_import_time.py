@@ -0,0 +1,102 @@
+"""
+Benchmark the import cost the extension adds to ComfyUI startup, and fail when it regresses.
+
+Every run imports the startup modules in a fresh interpreter after torch, which ComfyUI has already
+loaded before custom nodes. The run fails when the median import time exceeds --max-ms or when one of
+the deferred dependencies (transformers, langdetect, torchvision) is imported at startup.
+
+    python benchmarks/bench_import_time.py [--comfyui /path/to/ComfyUI] [--runs 5] [--max-ms 300] [--json -]
+
+Without --comfyui only the modules that do not need ComfyUI are imported; with it the whole
+extension is loaded the way ComfyUI loads it.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from _common import PACKAGE_ROOT, write_results
+
+# Modules the nodes import at load time, the nodes themselves need ComfyUI. The services are
+# only imported on first local use but must stay cheap to import as well.
+STARTUP_MODULES = [
+    "util.constants",
+    "util.settings",
+    "util.cache",
+    "util.image_codec",
+    "dto.joy_caption_dto",
+    "dto.translate_dto",
+    "client.joy_caption_service_client",
+    "client.async_joy_caption_service_client",
+    "service.joy_caption_service",
+    "service.model_registry",
+]
+COMFYUI_MODULES = ["pillar_plus"]
+
+# Only needed for local execution, must not be imported at startup
+DEFERRED_MODULES = ["transformers", "langdetect", "torchvision"]
+
+PROBE = """
+import importlib, json, sys, time
+sys.path[:0] = {paths!r}
+import torch
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "deferred_loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def probe(modules, paths):
+    code = PROBE.format(paths=paths, modules=modules, deferred=DEFERRED_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comfyui", help="ComfyUI checkout, imports the whole extension like ComfyUI does")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=300.0, help="Fail when the median import time exceeds this")
+    parser.add_argument("--json", help="Write machine readable results to this file, - for stdout")
+    args = parser.parse_args()
+
+    package = PACKAGE_ROOT.name
+    paths = [str(PACKAGE_ROOT.parent)]
+    modules = [f"{package}.{name}" for name in STARTUP_MODULES]
+    if args.comfyui:
+        paths.insert(0, args.comfyui)
+        modules += [f"{package}.{name}" for name in COMFYUI_MODULES]
+
+    samples = [probe(modules, paths) for _ in range(args.runs)]
+    ms = [sample["seconds"] * 1000 for sample in samples]
+    deferred_loaded = sorted({name for sample in samples for name in sample["deferred_loaded"]})
+    results = {
+        "modules": modules,
+        "runs": len(ms),
+        "p50_ms": statistics.median(ms),
+        "min_ms": min(ms),
+        "max_ms": max(ms),
+        "max_allowed_ms": args.max_ms,
+        "deferred_loaded": deferred_loaded,
+    }
+
+    print(f"Imported {len(modules)} modules in {results['p50_ms']:.1f} ms (median of {len(ms)}, "
+          f"min {results['min_ms']:.1f}, max {results['max_ms']:.1f})")
+    if args.json:
+        write_results(args.json, "import_time", results)
+
+    failures = []
+    if deferred_loaded:
+        failures.append(f"deferred dependencies imported at startup: {', '.join(deferred_loaded)}")
+    if results["p50_ms"] > args.max_ms:
+        failures.append(f"median import time {results['p50_ms']:.1f} ms exceeds {args.max_ms:.1f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the remote upload encoding: encode time and payload size per codec, quality and resize setting.
+
+    python benchmarks/bench_upload_encoding.py [--image photo.png] [--runs 10] [--json results.json]
+"""
+import argparse
+import time
+
+from PIL import Image
+
+from _common import import_package_module, summarize, write_results
+
+image_codec = import_package_module("util.image_codec")
+
+QUALITIES = [95, 85, 75]
+SHORT_SIDES = [0, 1024, image_codec.MODEL_IMAGE_SIZE]
+
+
+def synthetic_image(width: int = 3840, height: int = 2160) -> Image.Image:
+    """A 4K frame with smooth gradients, fine detail and noise, harder to compress than a flat image."""
+    detail = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 1.0, 1.2), 64)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    return Image.merge("RGB", (detail, gradient, noise))
+
+
+def run(image: Image.Image, runs: int):
+    results = []
+    for image_format in image_codec.IMAGE_FORMATS:
+        qualities = QUALITIES if image_format != "PNG" else [0]
+        for quality in qualities:
+            for short_side in SHORT_SIDES:
+                samples = []
+                payload = b""
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    payload = image_codec.encode_image(image, image_format, quality, short_side)
+                    samples.append(time.perf_counter() - start)
+                results.append({
+                    "format": image_format,
+                    "quality": quality or None,
+                    "short_side": short_side,
+                    "bytes": len(payload),
+                    **summarize(samples),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Image to encode, a synthetic 4K frame is used by default")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Write machine readable results to this file, - for stdout")
+    args = parser.parse_args()
+
+    image = Image.open(args.image).convert("RGB") if args.image else synthetic_image()
+    results = run(image, args.runs)
+
+    print(f"Source image: {image.size[0]}x{image.size[1]}")
+    print(f"{'format':<6} {'quality':>7} {'short side':>10} {'p50 ms':>9} {'p90 ms':>9} {'KiB':>9}")
+    for result in results:
+        print(f"{result['format']:<6} {result['quality'] or '-':>7} {result['short_side'] or 'orig':>10} "
+              f"{result['p50_ms']:>9.1f} {result['p90_ms']:>9.1f} {result['bytes'] / 1024:>9.1f}")
+
+    if args.json:
+        write_results(args.json, "upload_encoding", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Local stub of the caption server answering the endpoints JoyCaptionServiceClient calls with canned results,
+so the client hot path can be measured without a GPU or a real server.
+
+    python benchmarks/stub_server.py [--port 8000] [--delay-ms 0]
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EN_CAPTION = "A red fox sits in the snow at dusk, its fur glowing in the low sunlight."
+CN_CAPTION = "黄昏时分，一只红狐狸坐在雪地里，毛发在低垂的阳光下闪闪发光。"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    # Headers and body go out as separate writes, without this delayed ACKs add 40 ms to every response
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health/direct":
+            self._reply({"success": True, "msg": "ok", "model_status": "ready"})
+        else:
+            self._reply({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.delay:
+            time.sleep(self.delay)
+
+        path = self.path.rstrip("/")
+        response = {"res_id": str(uuid.uuid4()), "rel_req_id": self.headers.get("X-Request-ID", ""),
+                    "success": True, "msg": "Request processed successfully"}
+        if path == "/joycaption/generate":
+            self._reply({**response, "enCaption": EN_CAPTION, "cnCaption": CN_CAPTION})
+        elif path == "/translate":
+            text = json.loads(body)["text"]
+            self._reply({**response, "translated_text": text, "original_text": text})
+        elif path == "/translate/batch":
+            texts = json.loads(body)["texts"]
+            self._reply({**response, "translated_texts": texts, "original_texts": texts})
+        else:
+            self._reply({"detail": "Not Found"}, 404)
+
+    def _reply(self, payload, status: int = 200):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Serve the stub on a free local port for the duration of a with block."""
+
+    def __init__(self, port: int = 0, delay: float = 0.0):
+        handler = type("Handler", (StubHandler,), {"delay": delay})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="Simulated inference time per request")
+    args = parser.parse_args()
+
+    with StubServer(args.port, args.delay_ms / 1000) as server:
+        print(f"Stub caption server listening on {server.base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Tiny randomly initialized Llava checkpoint standing in for JoyCaption, so JoyCaptionService runs on a CPU.
+
+The architecture and chat template match JoyCaption (Siglip vision tower, Llama text model, image placed at the
+start of the user message), the weights are random so the captions are noise. Only timings are meaningful.
+
+    python benchmarks/tiny_llava.py [path]
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+DEFAULT_PATH = Path(tempfile.gettempdir()) / "pillar_tiny_llava"
+
+CHAT_TEMPLATE = ("{% for message in messages %}<|start_header_id|>{{ message['role'] }}<|end_header_id|>\n\n"
+                 "{% if message['role'] == 'user' %}<image>{% endif %}{{ message['content'] }}<|eot_id|>{% endfor %}"
+                 "{% if add_generation_prompt %}<|start_header_id|>assistant<|end_header_id|>\n\n{% endif %}")
+
+# Text the tokenizer vocabulary is trained on, covers the caption prompts and both caption languages
+TOKENIZER_CORPUS = ["Write a detailed description for this image. **English:** **Chinese:** 中文 描述 图片 一个"]
+
+
+def build(path: Path = DEFAULT_PATH, image_size: int = 32, patch_size: int = 8) -> Path:
+    """Save the stand-in model and processor to path, loadable with JoyCaptionService(path, "Default")."""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import LlamaConfig, LlavaConfig, LlavaForConditionalGeneration, LlavaProcessor, \
+        PreTrainedTokenizerFast, SiglipImageProcessor, SiglipVisionConfig
+
+    specials = ["<pad>", "<|eot_id|>", "<image>", "<|start_header_id|>", "<|end_header_id|>"]
+    backend = Tokenizer(models.BPE(unk_token=None))
+    backend.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    backend.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=400, special_tokens=specials,
+                                  initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    backend.train_from_iterator(TOKENIZER_CORPUS * 10, trainer)
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, pad_token="<pad>", eos_token="<|eot_id|>")
+
+    image_processor = SiglipImageProcessor(size={"height": image_size, "width": image_size})
+    processor = LlavaProcessor(image_processor=image_processor, tokenizer=tokenizer, patch_size=patch_size,
+                               chat_template=CHAT_TEMPLATE, vision_feature_select_strategy="full",
+                               image_token="<image>", num_additional_image_tokens=0)
+
+    text_config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                              num_attention_heads=2, num_key_value_heads=2, pad_token_id=tokenizer.pad_token_id,
+                              eos_token_id=tokenizer.eos_token_id)
+    vision_config = SiglipVisionConfig(hidden_size=32, intermediate_size=64, num_hidden_layers=1,
+                                       num_attention_heads=2, image_size=image_size, patch_size=patch_size)
+    config = LlavaConfig(vision_config=vision_config, text_config=text_config,
+                         image_token_index=tokenizer.convert_tokens_to_ids("<image>"),
+                         vision_feature_select_strategy="full", vision_feature_layer=-1)
+
+    torch.manual_seed(0)
+    model = LlavaForConditionalGeneration(config)
+    model.save_pretrained(str(path))
+    processor.save_pretrained(str(path))
+    return path
+
+
+def ensure(path: Path = DEFAULT_PATH) -> Path:
+    """Build the stand-in model unless path already holds one."""
+    if not (path / "config.json").exists():
+        build(path)
+    return path
+
+
+if __name__ == "__main__":
+    print(build(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PATH))
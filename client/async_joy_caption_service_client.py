@@ -0,0 +1,144 @@
+"""
+Asyncio front end for the JoyCaption service client.
+
+The HTTP calls stay blocking: every request runs JoyCaptionServiceClient on a thread of one shared pool of
+MAX_WORKER_THREADS threads, and each fan-out keeps at most max_concurrency of its requests in flight.
+run_sync drives the coroutines on one long-lived event loop instead of starting a new loop per call.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Dict, List, TypeVar, Union
+
+from .base_client import logger
+from .joy_caption_service_client import JoyCaptionServiceClient
+from ..dto.joy_caption_dto import JoyCaptionRequest
+from ..dto.translate_dto import TranslationBatchRequest, TranslationRequest
+from ..util.image_codec import DEFAULT_IMAGE_FORMAT
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CONCURRENCY = 4
+# Threads blocking on HTTP requests, shared by all clients and fan-outs of the process
+MAX_WORKER_THREADS = 16
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKER_THREADS, thread_name_prefix="joycaption-client")
+
+
+class AsyncJoyCaptionServiceClient:
+    """
+    Async wrapper around JoyCaptionServiceClient.
+
+    Each request runs the blocking client on a thread of the shared pool, so it reuses the pooled keep-alive
+    sessions and the error mapping of BaseClient._handle_error_status unchanged, while up to
+    max_concurrency requests are in flight at the same time.
+    """
+
+    def __init__(self, client: JoyCaptionServiceClient = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Args:
+            client: The blocking client to delegate to, a new one is created if omitted
+            max_concurrency: Maximum number of requests in flight
+        """
+        self.client = client or JoyCaptionServiceClient()
+        self.max_concurrency = max(1, max_concurrency)
+
+    @staticmethod
+    async def _run(func, *args, **kwargs) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+    async def _call(self, semaphore: asyncio.Semaphore, func, *args, **kwargs) -> Any:
+        async with semaphore:
+            return await self._run(func, *args, **kwargs)
+
+    async def _gather(self, func, base_url: str, requests: List[Any], *, max_concurrency: int = None,
+                      return_exceptions: bool = True, **kwargs) -> List[Any]:
+        """Call func(base_url, request, **kwargs) for every request, keyword arguments are passed to every call."""
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+        tasks = [self._call(semaphore, func, base_url, request, **kwargs) for request in requests]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    async def generate_caption(self, base_url: str, request: JoyCaptionRequest,
+                               image_format: str = DEFAULT_IMAGE_FORMAT) -> Dict[str, str]:
+        return await self._run(self.client.generate_caption, base_url, request, image_format)
+
+    async def translate(self, base_url: str, request: TranslationRequest) -> str:
+        return await self._run(self.client.translate, base_url, request)
+
+    async def translate_many(self, base_url: str, request: TranslationBatchRequest) -> List[str]:
+        """Translate a list of texts with one translate/batch request, see JoyCaptionServiceClient.translate_many."""
+        return await self._run(self.client.translate_many, base_url, request)
+
+    async def generate_caption_many(self, base_url: str, requests: List[JoyCaptionRequest],
+                                    max_concurrency: int = None, return_exceptions: bool = True,
+                                    image_format: str = DEFAULT_IMAGE_FORMAT
+                                    ) -> List[Union[Dict[str, str], Exception]]:
+        """
+        Caption many images concurrently.
+
+        Args:
+            base_url: The base URL of the API server
+            requests: One caption request per image
+            max_concurrency: Overrides the client's limit of requests in flight
+            return_exceptions: Return failures in place of their result instead of raising the first one
+            image_format: Format the images of the requests are encoded in
+
+        Returns:
+            Results in the same order as requests
+        """
+        logger.debug("Captioning %d images with up to %d requests in flight", len(requests),
+                     max_concurrency or self.max_concurrency)
+        return await self._gather(self.client.generate_caption, base_url, requests, max_concurrency=max_concurrency,
+                                  return_exceptions=return_exceptions, image_format=image_format)
+
+    async def translate_concurrently(self, base_url: str, requests: List[TranslationRequest],
+                                     max_concurrency: int = None,
+                                     return_exceptions: bool = True) -> List[Union[str, Exception]]:
+        """
+        Translate many texts with one translate request each, sent concurrently. Unlike translate_many, one
+        failing text does not fail the others.
+
+        Args:
+            base_url: The base URL of the API server
+            requests: One translation request per text
+            max_concurrency: Overrides the client's limit of requests in flight
+            return_exceptions: Return failures in place of their result instead of raising the first one
+
+        Returns:
+            Results in the same order as requests
+        """
+        return await self._gather(self.client.translate, base_url, requests, max_concurrency=max_concurrency,
+                                  return_exceptions=return_exceptions)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop run_sync runs coroutines on, started once on a daemon thread."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="joycaption-client-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine to completion from synchronous code, on the shared client loop.
+    Works whether or not the calling thread runs an event loop of its own, except from the shared loop itself.
+    """
+    loop = _shared_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() would block the client event loop, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,143 @@
+"""
+Load balancing over a pool of caption servers: base_url may list several servers, each attempt of a
+request goes to the healthy one with the least outstanding requests or the lowest latency estimate.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..util.settings import HEALTH_CHECK_INTERVAL, LB_STRATEGY
+
+logger = logging.getLogger(__name__)
+
+LEAST_OUTSTANDING = "least_outstanding"
+EWMA = "ewma"
+STRATEGIES = (LEAST_OUTSTANDING, EWMA)
+
+# Weight of the latest response time in the latency estimate
+EWMA_ALPHA = 0.3
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def split_base_urls(base_url: str) -> List[str]:
+    """The servers of a base_url input, separated by commas, semicolons or whitespace, without duplicates."""
+    return list(dict.fromkeys(url for url in _SEPARATORS.split(base_url or "") if url))
+
+
+class EndpointState:
+    """Load and health of one server, shared by every pool it belongs to."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        # Exponentially weighted moving average of the response time in seconds, None before the first response
+        self.ewma = None
+        self.healthy = True
+
+    def score(self, strategy: str) -> float:
+        if strategy == EWMA:
+            # Idle servers without samples are tried first, busy ones are expected to answer after the queue
+            return (self.ewma or 0.0) * (self.outstanding + 1)
+        return self.outstanding
+
+    def to_dict(self) -> Dict:
+        return {"url": self.url, "healthy": self.healthy, "outstanding": self.outstanding,
+                "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None}
+
+
+class LoadBalancer:
+    """
+    Picks the server of a pool for each attempt and tracks the health of pooled servers.
+
+    A background thread probes every server that is part of a pool of two or more every health_interval
+    seconds, failing servers are ejected from their pools until a probe succeeds again. When every server
+    of a pool is ejected, requests are still spread over all of them rather than failed up front.
+    """
+
+    def __init__(self, probe: Callable[[str], bool], strategy: str = LB_STRATEGY,
+                 health_interval: float = HEALTH_CHECK_INTERVAL):
+        """
+        Args:
+            probe: Called with a server URL, returns whether the server is healthy
+            strategy: least_outstanding or ewma
+            health_interval: Seconds between probes of each pooled server, 0 disables probing
+        """
+        self.probe = probe
+        self.strategy = strategy if strategy in STRATEGIES else LEAST_OUTSTANDING
+        self.health_interval = health_interval
+        self._endpoints: Dict[str, EndpointState] = {}
+        self._pooled: Dict[str, EndpointState] = {}
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def _state(self, url: str) -> EndpointState:
+        state = self._endpoints.get(url)
+        if state is None:
+            state = self._endpoints.setdefault(url, EndpointState(url))
+        return state
+
+    def choose(self, urls: List[str], exclude: Iterable[str] = ()) -> Optional[str]:
+        """The server of the pool urls to send the next attempt to, None when every one is excluded."""
+        candidates = [url for url in urls if url not in exclude]
+        if len(urls) == 1:
+            return candidates[0] if candidates else None
+
+        with self._lock:
+            states = [self._state(url) for url in candidates]
+            for state in states:
+                self._pooled.setdefault(state.url, state)
+            self._start_prober()
+            states = [state for state in states if state.healthy] or states
+            if not states:
+                return None
+            random.shuffle(states)
+            return min(states, key=lambda state: state.score(self.strategy)).url
+
+    def begin(self, url: str) -> None:
+        """Count a request sent to url as outstanding."""
+        with self._lock:
+            self._state(url).outstanding += 1
+
+    def end(self, url: str, seconds: float = None) -> None:
+        """Count the request as answered, seconds is its response time if the server answered."""
+        with self._lock:
+            state = self._state(url)
+            state.outstanding = max(0, state.outstanding - 1)
+            if seconds is not None:
+                state.ewma = seconds if state.ewma is None else state.ewma + EWMA_ALPHA * (seconds - state.ewma)
+
+    def set_health(self, url: str, healthy: bool) -> None:
+        with self._lock:
+            state = self._state(url)
+            changed, state.healthy = state.healthy != healthy, healthy
+        if changed and healthy:
+            logger.info("Server %s passed its health check, admitted back to the pool", url)
+        elif changed:
+            logger.warning("Server %s failed its health check, ejected from the pool", url)
+
+    def status(self) -> List[Dict]:
+        """Load and health of every pooled server."""
+        with self._lock:
+            return [state.to_dict() for state in self._pooled.values()]
+
+    def _start_prober(self) -> None:
+        if self._prober is None and self.health_interval > 0:
+            self._prober = threading.Thread(target=self._probe_loop, name="health-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self) -> None:
+        while True:
+            with self._lock:
+                urls = list(self._pooled)
+            for url in urls:
+                try:
+                    healthy = self.probe(url)
+                except Exception as e:
+                    logger.debug("Health check of %s failed: %s", url, e)
+                    healthy = False
+                self.set_health(url, healthy)
+            time.sleep(self.health_interval)
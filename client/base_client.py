@@ -6,13 +6,22 @@ with common functionality for API communication.
 import json
 import logging
 import socket
+import threading
+import time
 import uuid
 from enum import Enum
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Set, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from .exceptions import APIError, RateLimitError, ServiceUnavailableError, ValidationError
+from .balancer import LoadBalancer, split_base_urls
+from .exceptions import APIError, CircuitOpenError, RateLimitError, ServiceUnavailableError, ValidationError
+from .retry import CircuitBreaker, CircuitBreakerRegistry, RetryPolicy, parse_retry_after
+from ..util import metrics
+from ..util.settings import HTTP_CONNECT_TIMEOUT, HTTP_KEEP_ALIVE, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, \
+    HTTP_READ_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
@@ -32,41 +41,121 @@ class AuthenticationError:
     pass
 
 
+class SessionPool:
+    """
+    Process-wide pool of keep-alive HTTP sessions, one per base URL.
+    Every client talking to the same server shares the same TCP connections.
+    """
+    _sessions: Dict[str, requests.Session] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, base_url: str) -> requests.Session:
+        session = cls._sessions.get(base_url)
+        if session is None:
+            with cls._lock:
+                session = cls._sessions.get(base_url)
+                if session is None:
+                    session = cls._create_session()
+                    cls._sessions[base_url] = session
+        return session
+
+    @staticmethod
+    def _create_session() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                              pool_block=False, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Connection"] = "keep-alive" if HTTP_KEEP_ALIVE else "close"
+        return session
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+
+
+@lru_cache(maxsize=1)
+def _resolve_client_info(default_hostname: str, default_ip: str) -> Tuple[str, str]:
+    """Resolve the local hostname and IP address once per process."""
+    try:
+        hostname = socket.gethostname()
+        return hostname, socket.gethostbyname(hostname)
+    except Exception as e:
+        logger.warning("Failed to get client IP address: %s", e)
+        return default_hostname, default_ip
+
+
+def _probe_health(server_url: str) -> bool:
+    """Whether the server answers its health check and its model did not fail to load."""
+    try:
+        response = SessionPool.get(server_url).get(f"{server_url.rstrip('/')}/{Endpoint.HEALTH_CHECK.value}",
+                                                   timeout=(HTTP_CONNECT_TIMEOUT, HTTP_CONNECT_TIMEOUT))
+        return response.ok and response.json().get("model_status") != "failed"
+    except (requests.exceptions.RequestException, ValueError):
+        return False
+
+
 class BaseClient:
     """
     Base client class for the ComfyUI Extension Service.
     This class provides the foundation for service-specific clients 
     with common functionality for API communication.
     """
-    DEFAULT_TIMEOUT = 60
+    DEFAULT_TIMEOUT = HTTP_READ_TIMEOUT
+    DEFAULT_CONNECT_TIMEOUT = HTTP_CONNECT_TIMEOUT
     DEFAULT_USERNAME = "anonymous"
     DEFAULT_IP = "127.0.0.1"
     DEFAULT_HOSTNAME = "localhost"
     CONTENT_TYPE_JSON = "application/json"
+    REQUEST_ID_HEADER = "X-Request-ID"
+
+    # Circuit breakers are shared by all clients so every node sees the same endpoint health
+    _circuit_breakers = CircuitBreakerRegistry()
+    # Load and health of the servers listed together in a base_url, shared the same way
+    _balancer = LoadBalancer(_probe_health)
 
     # Map HTTP status codes to exception classes
     ERROR_STATUS_MAP = {
         401: AuthenticationError,
         422: ValidationError,
         429: RateLimitError,
+        # Only statuses that say the server could not handle the request right now are retried. A 500 is
+        # an error of the request itself, sending it again would fail the same way.
+        502: ServiceUnavailableError,
+        503: ServiceUnavailableError,
+        504: ServiceUnavailableError,
     }
 
+    @classmethod
+    def server_status(cls) -> List[Dict[str, Any]]:
+        """Health, outstanding requests and latency estimate of every server used as part of a pool."""
+        return cls._balancer.status()
+
     def __init__(
             self,
             username: str = None,
-            timeout: int = DEFAULT_TIMEOUT,
+            timeout: float = DEFAULT_TIMEOUT,
             headers: Dict[str, str] = None,
+            connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+            retry_policy: RetryPolicy = None,
     ):
         """
         Initialize the base client.
         
         Args:
             username: The username to use for API calls
-            timeout: Request timeout in seconds
+            timeout: Read timeout in seconds
             headers: Additional headers to include in requests
+            connect_timeout: Connection timeout in seconds
+            retry_policy: Retry policy for rate limited, unavailable or unreachable servers
         """
         self.username = username or self.DEFAULT_USERNAME
-        self.timeout = timeout
+        self.timeout = (connect_timeout, timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
         self.headers = headers or {}
         self.headers.update({"Content-Type": self.CONTENT_TYPE_JSON})
 
@@ -92,13 +181,7 @@ class BaseClient:
 
     def _setup_client_info(self) -> None:
         """Set up client hostname and IP address information."""
-        try:
-            self.hostname = socket.gethostname()
-            self.ip_address = socket.gethostbyname(self.hostname)
-        except Exception as e:
-            logger.warning(f"Failed to get client IP address: {e}")
-            self.ip_address = self.DEFAULT_IP
-            self.hostname = self.DEFAULT_HOSTNAME
+        self.hostname, self.ip_address = _resolve_client_info(self.DEFAULT_HOSTNAME, self.DEFAULT_IP)
 
     @staticmethod
     def _build_url(base_url: str, endpoint: str) -> str:
@@ -151,10 +234,13 @@ class BaseClient:
         try:
             data = response.json()
         except json.JSONDecodeError:
-            raise ValidationError(f"Invalid JSON response: {response.text}")
+            if response.status_code < 400:
+                raise ValidationError(f"Invalid JSON response: {response.text}")
+            # Proxies and load balancers answer errors with plain text or HTML pages
+            data = {"detail": response.text[:200]}
 
         # Check if the response is a BaseResponse
-        if isinstance(data, dict) and "success" in data:
+        if isinstance(data, dict) and "success" in data and response.status_code < 400:
             if not data["success"]:
                 raise APIError(
                     status_code=response.status_code,
@@ -164,13 +250,10 @@ class BaseClient:
 
         # Check HTTP status
         if response.status_code >= 400:
-            error_message = data.get("detail", "Unknown error")
+            error_message = data.get("detail", data.get("msg", "Unknown error"))
 
             # Use the error status map to get the appropriate exception class
-            exception_class = self.ERROR_STATUS_MAP.get(
-                response.status_code,
-                ServiceUnavailableError if response.status_code >= 500 else APIError
-            )
+            exception_class = self.ERROR_STATUS_MAP.get(response.status_code, APIError)
 
             if exception_class == APIError:
                 raise exception_class(
@@ -178,6 +261,9 @@ class BaseClient:
                     message=error_message,
                     response=data,
                 )
+            elif issubclass(exception_class, (RateLimitError, ServiceUnavailableError)):
+                raise exception_class(f"{exception_class.__name__}: {error_message}",
+                                      retry_after=parse_retry_after(response.headers.get("Retry-After")))
             else:
                 raise exception_class(f"{exception_class.__name__}: {error_message}")
 
@@ -191,11 +277,8 @@ class BaseClient:
             files: Dict[str, Any] = None,
             headers: Dict[str, str] = None,
     ) -> Dict[str, Any]:
-        logger.debug(f"base_url:{base_url}")
-        url = self._ensure_url_prefix(base_url)
-        logger.debug(f"_ensure_url_prefix:{url}")
-        url = self._build_url(url, endpoint)
-        logger.debug(f"_build_url:{url}")
+        # base_url may list several servers, every attempt goes to the one the balancer picks
+        servers = [self._ensure_url_prefix(url) for url in split_base_urls(base_url)] or [base_url]
         request_headers = self.headers.copy()
 
         if headers:
@@ -205,39 +288,123 @@ class BaseClient:
         if data and isinstance(data, dict) and not files:
             data = self._prepare_request_data(data)
 
-        try:
-            kwargs = {
-                "method": method.value,
-                "url": url,
-                "params": params,
-                "headers": request_headers,
-                "timeout": self.timeout,
-            }
-
-            if files:
-                if "Content-Type" in request_headers:
-                    del request_headers["Content-Type"]
-                kwargs["data"] = data
-                kwargs["files"] = files
+        # Every attempt carries the same request id so the server can recognise retried requests
+        req_id = data.get("req_id") if isinstance(data, dict) and data.get("req_id") else str(uuid.uuid4())
+        request_headers[self.REQUEST_ID_HEADER] = req_id
+
+        kwargs = {
+            "method": method.value,
+            "params": params,
+            "headers": request_headers,
+            "timeout": self.timeout,
+        }
+
+        if files:
+            if "Content-Type" in request_headers:
+                del request_headers["Content-Type"]
+            kwargs["data"] = data
+            kwargs["files"] = files
+        else:
+            kwargs["json"] = data if data else None
+
+        tried = set()
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            server_url, breaker = self._choose_server(servers, endpoint, tried)
+            url = kwargs["url"] = self._build_url(server_url, endpoint)
+            tried.add(server_url)
+            pooled = len(servers) > 1
+            if pooled:
+                self._balancer.begin(server_url)
+            sent = time.perf_counter()
+            answered = True
+            try:
+                with metrics.stage("request"):
+                    result = self._send(server_url, kwargs, data, files)
+            except requests.exceptions.ReadTimeout as e:
+                # The server may still be working on it, retrying would only pile up more work
+                breaker.record_failure()
+                raise ConnectionError(f"Connection error: {str(e)}")
+            except requests.exceptions.RequestException as e:
+                error, retry_after, answered = ConnectionError(f"Connection error: {str(e)}"), None, False
+            except (RateLimitError, ServiceUnavailableError) as e:
+                error, retry_after = e, e.retry_after
+            except Exception:
+                # The server answered, errors of the request itself say nothing about its health
+                breaker.record_success()
+                raise
             else:
-                kwargs["json"] = data if data else None
+                breaker.record_success()
+                return result
+            finally:
+                if pooled:
+                    self._balancer.end(server_url, time.perf_counter() - sent if answered else None)
+
+            breaker.record_failure()
+            if attempt >= self.retry_policy.max_attempts:
+                raise error
+            # Another server of the pool that was not tried yet can take the retry right away
+            delay = 0.0 if len(tried) < len(servers) else self.retry_policy.delay(attempt, retry_after)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.warning("Request %s to %s failed (attempt %d/%d, %.1f ms elapsed): %s. Retrying in %.2fs",
+                           req_id, url, attempt, self.retry_policy.max_attempts, elapsed_ms, error, delay,
+                           extra={"req_id": req_id, "elapsed_ms": elapsed_ms})
+            time.sleep(delay)
+
+    def _choose_server(self, servers: List[str], endpoint: str, tried: Set[str]) -> Tuple[str, CircuitBreaker]:
+        """
+        The server of the pool to send the next attempt to, preferring servers not tried yet.
 
-            response = requests.request(**kwargs)
+        Raises:
+            CircuitOpenError: If the circuit of every server is open
+        """
+        skipped = {}
+        while True:
+            server_url = (self._balancer.choose(servers, tried | skipped.keys())
+                          or self._balancer.choose(servers, skipped.keys()))
+            if server_url is None:
+                retry_in = min(breaker.retry_in() for breaker in skipped.values())
+                urls = ", ".join(self._build_url(url, endpoint) for url in skipped)
+                raise CircuitOpenError(f"CircuitOpenError: {urls} is failing, next trial in {retry_in:.1f}s")
+            breaker = self._circuit_breakers.get(self._build_url(server_url, endpoint))
+            if breaker.allow():
+                return server_url, breaker
+            skipped[server_url] = breaker
+
+    def _send(
+            self,
+            server_url: str,
+            kwargs: Dict[str, Any],
+            data: Dict[str, Any] = None,
+            files: Dict[str, Any] = None,
+    ) -> Dict[str, Any]:
+        """
+        Send a single request attempt through the pooled session of the server.
 
-            # Log request details before sending
-            logger.info(f"Sending {method.value} request to {url}")
-            logger.debug(f"Request headers: {request_headers}")
+        Raises:
+            requests.exceptions.RequestException: If the server cannot be reached
+            ClientException: If the API returns an error
+        """
+        start = time.perf_counter()
+        response = SessionPool.get(server_url).request(**kwargs)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Arguments are only formatted when a handler writes the record, the debug details are
+        # guarded since even building them (response.text) costs time on every request
+        req_id = kwargs["headers"].get(self.REQUEST_ID_HEADER)
+        extra = {"req_id": req_id, "elapsed_ms": elapsed_ms}
+        logger.info("Request %s %s %s -> %d in %.1f ms", req_id, kwargs["method"], kwargs["url"],
+                    response.status_code, elapsed_ms, extra=extra)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request %s headers: %s", req_id, kwargs["headers"], extra=extra)
             if data and not files:  # Only log data for non-file requests
-                logger.debug(f"Request data: {data}")
+                logger.debug("Request %s data: %s", req_id, data, extra=extra)
             if files:
-                logger.debug(f"Files to upload: {list(files.keys())}")
-            # Log response details before returning
-            logger.info(f"Received response with status {response.status_code}")
-            logger.debug(f"Response headers: {response.headers}")
-            logger.debug(f"Response content: {response.text[:1000]}...")  # Limit long responses
-            # Handle error status codes
-            self._handle_error_status(response)
-            return response.json()
-
-        except requests.exceptions.RequestException as e:
-            raise ConnectionError(f"Connection error: {str(e)}")
+                logger.debug("Request %s files to upload: %s", req_id, list(files.keys()), extra=extra)
+            logger.debug("Request %s response headers: %s", req_id, response.headers, extra=extra)
+            logger.debug("Request %s response content: %s...", req_id, response.text[:1000], extra=extra)
+        # Handle error status codes
+        self._handle_error_status(response)
+        return response.json()
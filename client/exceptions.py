@@ -41,13 +41,33 @@ class ValidationError(ClientException):
 
 
 class RateLimitError(ClientException):
-    """Exception raised when the client hits rate limits."""
-    pass
+    """
+    Exception raised when the client hits rate limits.
+
+    Attributes:
+        retry_after (float): Seconds the server asked the client to wait, if given
+    """
+    def __init__(self, message: str = None, retry_after: float = None):
+        self.retry_after = retry_after
+        super().__init__(message)
 
 
 class ServiceUnavailableError(ClientException):
     """
     Exception raised when a service is unavailable.
     This indicates temporary server issues or maintenance.
+
+    Attributes:
+        retry_after (float): Seconds the server asked the client to wait, if given
+    """
+    def __init__(self, message: str = None, retry_after: float = None):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """
+    Exception raised without contacting the server because its circuit breaker is open
+    after repeated failures.
     """
     pass
@@ -1,9 +1,12 @@
+import threading
+
 from .base_client import logger, HttpMethod
-from typing import Dict
+from typing import Dict, List
 
 from .base_client import BaseClient
 from ..dto.joy_caption_dto import JoyCaptionRequest
-from ..dto.translate_dto import TranslationRequest
+from ..dto.translate_dto import TranslationBatchRequest, TranslationRequest
+from ..util.image_codec import DEFAULT_IMAGE_FORMAT, IMAGE_EXTENSIONS, IMAGE_MIME_TYPES
 
 class JoyCaptionServiceClient(BaseClient):
     """
@@ -11,7 +14,19 @@ class JoyCaptionServiceClient(BaseClient):
     Inherits common functionality from BaseClient.
     """
 
-    def generate_caption(self, base_url: str, request: JoyCaptionRequest) -> Dict[str, str]:
+    def generate_caption(self, base_url: str, request: JoyCaptionRequest,
+                         image_format: str = DEFAULT_IMAGE_FORMAT) -> Dict[str, str]:
+        """
+        Generate a caption for an encoded image.
+
+        Args:
+            base_url: The base URL of the API server
+            request: The caption request, image_file holds the encoded image
+            image_format: Format image_file is encoded in (JPEG, WEBP or PNG), see util.image_codec.encode_image
+
+        Returns:
+            The English and Chinese captions, the one request.output_language did not ask for is empty
+        """
         try:
             data = {
                 "system_prompt": request.system_prompt,
@@ -20,11 +35,13 @@ class JoyCaptionServiceClient(BaseClient):
                 "temperature": str(request.temperature),
                 "top_p": str(request.top_p),
                 "top_k": str(request.top_k),
+                "output_language": request.output_language,
                 "user_name": self.username  # Use username from client
             }
 
             files = {
-                "image_file": ("image.jpg", request.image_file, "image/jpeg")
+                "image_file": (f"image.{IMAGE_EXTENSIONS[image_format]}", request.image_file,
+                               IMAGE_MIME_TYPES[image_format])
             }
 
             # Make request using base client's _request method
@@ -43,7 +60,7 @@ class JoyCaptionServiceClient(BaseClient):
             }
 
         except Exception as e:
-            logger.error(f"Error in generate_caption: {str(e)}", exc_info=True)
+            logger.error("Error in generate_caption: %s", e, exc_info=True)
             # Re-raise the exception with original context
             raise e from e
 
@@ -66,6 +83,7 @@ class JoyCaptionServiceClient(BaseClient):
         # Build request data using fields from request object
         request_data = {
             "text": request.text,
+            "direction": request.direction,
         }
 
         # Make request using base client's _request method
@@ -80,4 +98,44 @@ class JoyCaptionServiceClient(BaseClient):
         if isinstance(response, dict) and "translated_text" in response:
             return response["translated_text"]
         else:
-            raise ValueError("Invalid response format: missing translated_text field")
\ No newline at end of file
+            raise ValueError("Invalid response format: missing translated_text field")
+
+    def translate_many(self, base_url: str, request: TranslationBatchRequest) -> List[str]:
+        """
+        Translate a list of texts with one request, the server translates them in batches.
+
+        Args:
+            base_url: The base URL of the API server
+            request: The batch translation request containing the texts
+
+        Returns:
+            The translated texts in the order of request.texts
+
+        Raises:
+            ConnectionError: If there's a network error communicating with the service
+            ValueError: If the response format is invalid
+        """
+        response = self._request(
+            base_url=base_url,
+            method=HttpMethod.POST,
+            endpoint="translate/batch",
+            data={"texts": request.texts, "direction": request.direction}
+        )
+
+        if isinstance(response, dict) and len(response.get("translated_texts", [])) == len(request.texts):
+            return response["translated_texts"]
+        else:
+            raise ValueError("Invalid response format: missing or incomplete translated_texts field")
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client() -> JoyCaptionServiceClient:
+    """Return the process-wide client shared by all nodes."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = JoyCaptionServiceClient()
+    return _shared_client
@@ -1,11 +1,15 @@
 import uuid
+from typing import List
+
 from pydantic import Field
 from ..dto.base_dto import BaseRequest, BaseResponse
+from ..util.constants import DEFAULT_TRANSLATION_DIRECTION
 
 
 class TranslationRequest(BaseRequest):
     """Request model for translation API"""
     text: str
+    direction: str = DEFAULT_TRANSLATION_DIRECTION  # TRANSLATION_DIRECTION code
     user_name: str = "anonymous"
     ip_address: str = "anonymous"
     req_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -19,3 +23,22 @@ class TranslationResponse(BaseResponse):
     req_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     execution_time: float = 0.0
     rel_req_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+
+class TranslationBatchRequest(BaseRequest):
+    """Request model for the batch translation API"""
+    texts: List[str]
+    direction: str = DEFAULT_TRANSLATION_DIRECTION  # TRANSLATION_DIRECTION code
+    user_name: str = "anonymous"
+    ip_address: str = "anonymous"
+    req_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+
+class TranslationBatchResponse(BaseResponse):
+    """Response model for the batch translation API, translated_texts are in the order of the request texts"""
+    translated_texts: List[str] = []
+    original_texts: List[str] = []
+    success: bool = True
+    req_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    execution_time: float = 0.0
+    rel_req_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
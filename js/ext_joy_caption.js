@@ -0,0 +1,64 @@
+import {app} from "../../scripts/app.js";
+import {api} from "../../scripts/api.js";
+import {ComfyWidgets} from "../../scripts/widgets.js";
+
+const NODE_NAMES = ["Pillar_JoyCaption", "Pillar_JoyCaptionCustom"];
+
+// node id -> caption text per frame index of the running prompt
+const streamedCaptions = new Map();
+
+api.addEventListener("execution_start", () => streamedCaptions.clear());
+
+// Partial captions streamed by nodes/joy_caption.py while the model generates
+api.addEventListener("pillar.caption.progress", ({detail}) => {
+    const node = app.graph.getNodeById(Number(detail.node));
+    if (!node || !NODE_NAMES.includes(node.type)) return;
+
+    const w = node.widgets?.find((v) => v.name === "__preview");
+    if (!w) return;
+
+    if (detail.frame_count <= 1) {
+        w.value = detail.text;
+    } else {
+        // Every frame of the batch keeps its own section, captions of earlier frames stay visible
+        const captions = streamedCaptions.get(detail.node) ?? [];
+        captions[detail.index] = detail.text;
+        streamedCaptions.set(detail.node, captions);
+        // forEach skips frames not streamed, e.g. served from the caption cache
+        const sections = [];
+        captions.forEach((text, index) => sections.push(`[${index + 1}/${detail.frame_count}] ${text}`));
+        w.value = sections.join("\n\n");
+    }
+    app.graph.setDirtyCanvas(true, false);
+});
+
+app.registerExtension({
+    name: "Comfy.Pillar.JoyCaption",
+    async beforeRegisterNodeDef(nodeType, nodeData, app) {
+        if (!NODE_NAMES.includes(nodeData.name)) return;
+
+        const onNodeCreated = nodeType.prototype.onNodeCreated;
+        nodeType.prototype.onNodeCreated = function () {
+            onNodeCreated?.apply(this, arguments);
+
+            // add preview widget, filled while streaming
+            const previewer = ComfyWidgets.STRING(
+                this,
+                "__preview",
+                [
+                    "STRING",
+                    {
+                        default: "",
+                        placeholder: "流式输出预览...",
+                        multiline: true,
+                    },
+                ],
+                app
+            );
+            previewer.widget.inputEl.readOnly = true;
+            // Not part of the saved workflow, so widget values keep their positions
+            previewer.widget.serialize = false;
+            app.graph.setDirtyCanvas(true, false);
+        };
+    },
+});
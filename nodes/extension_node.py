@@ -4,7 +4,7 @@ from comfy.comfy_types import ComfyNodeABC
 from pathlib import Path
 from typing import Dict, Any, Tuple, ClassVar
 from ..util.pyproject import CATEGORY_NAME
-from ..util import log
+from ..util import log, metrics
 
 class ExtensionNode(ComfyNodeABC):
     RETURN_TYPES: ClassVar[Tuple[str, ...]] = ()
@@ -30,22 +30,27 @@ class ExtensionNode(ComfyNodeABC):
     def get_dispay_name(cls) -> str:
         return f"Pillar{cls.__name__}"
 
+    @staticmethod
+    def _model_save_path(repo_id: str, folder_name: str) -> Path:
+        return Path(folder_paths.models_dir) / folder_name / Path(repo_id).stem
+
+    @metrics.timed("model_check")
     def _download_model_from_hf(self, repo_id: str, folder_name: str, force_download: bool = False,
                                 local_files_only: bool = False) -> Path:
         try:
-            model_save_path = Path(folder_paths.models_dir) / folder_name / Path(repo_id).stem
+            model_save_path = self._model_save_path(repo_id, folder_name)
             if not model_save_path.exists() or force_download:
                 try:
                     from huggingface_hub import snapshot_download
-                    log.log_node_info(self.get_node_name(), f"Downloading model from {repo_id} to {model_save_path}...")
+                    log.log_node_info(self.get_node_name(), "Downloading model from %s to %s...", repo_id, model_save_path)
                     snapshot_download(
                         repo_id=repo_id,
                         local_dir=str(model_save_path),
                         force_download=force_download,
                         local_files_only=local_files_only
                     )
-                    self._log.log_node_info(self.get_node_name(),
-                                            f"Model successfully downloaded to {model_save_path}.")
+                    self._log.log_node_info(self.get_node_name(), "Model successfully downloaded to %s.",
+                                            model_save_path)
                 except FileNotFoundError:
                     error_msg = f"File not found during download of {repo_id}."
                     self._log.log_node_warn(self.get_node_name(), error_msg)
@@ -61,5 +66,5 @@ class ExtensionNode(ComfyNodeABC):
 
             return model_save_path
         except Exception as e:
-            self._log.log_node_warn(self.get_node_name(), f"Unexpected error processing model {repo_id}: {str(e)}")
+            self._log.log_node_warn(self.get_node_name(), "Unexpected error processing model %s: %s", repo_id, e)
             raise RuntimeError(f"Failed to process model {repo_id}: {str(e)}")
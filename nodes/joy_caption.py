@@ -1,13 +1,28 @@
-import io
-from typing import Any, Dict
-from torchvision.utils import save_image
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Any, Callable, Dict, List, Tuple
+
+import comfy.model_management
+import folder_paths
 from PIL import Image
 from .extension_node import ExtensionNode
-from ..client.joy_caption_service_client import JoyCaptionServiceClient
-from ..util.constants import CAPTION_LENGTH_CHOICES, CAPTION_TYPE, DEFAULT_BASE_URL, DEFAULT_MAX_NEW_TOKENS, \
-    DEFAULT_SYSTEM_PROMPT, DEFAULT_TEMPERATURE, DEFAULT_TOP_K, DEFAULT_TOP_P, EXEC_OPTIONS, EXTRA_OPTIONS, \
-    MEMORY_MODE, MIN_TEMPERATURE, MIN_TOKENS, MIN_TOP_K, MIN_TOP_P, \
-    TEMPERATURE_STEP, TOP_P_STEP, MAX_TOKENS, MAX_TEMPERATURE, MAX_TOP_P, MAX_TOP_K
+from ..client.async_joy_caption_service_client import AsyncJoyCaptionServiceClient, run_sync
+from ..client.joy_caption_service_client import JoyCaptionServiceClient, get_shared_client
+from ..util.constants import CAPTION_LENGTH_CHOICES, CAPTION_TYPE, DEFAULT_BASE_URL, DEFAULT_BATCH_SIZE, \
+    DEFAULT_MAX_NEW_TOKENS, DEFAULT_OUTPUT_LANGUAGE, DEFAULT_SYSTEM_PROMPT, DEFAULT_TEMPERATURE, DEFAULT_TOP_K, \
+    DEFAULT_TOP_P, EXEC_OPTIONS, EXTRA_OPTIONS, MEMORY_MODE, MIN_TEMPERATURE, MIN_TOKENS, MIN_TOP_K, MIN_TOP_P, \
+    OUTPUT_LANGUAGE, TEMPERATURE_STEP, TOP_P_STEP, MAX_TOKENS, MAX_TEMPERATURE, MAX_TOP_P, MAX_TOP_K, MIN_BATCH_SIZE, MAX_BATCH_SIZE
+from ..service.bilingual import parse_caption
+from ..util import metrics
+from ..util.cache import ResultCache, SQLiteStore, hash_key
+from ..util.image_codec import DEFAULT_IMAGE_FORMAT, DEFAULT_IMAGE_QUALITY, IMAGE_FORMATS, MODEL_IMAGE_SIZE, \
+    encode_image
+from ..util.pyproject import NAME
+from ..util.settings import CAPTION_CACHE_DISK, CAPTION_CACHE_DISK_MAX_ENTRIES, CAPTION_CACHE_ENABLED, \
+    CAPTION_CACHE_MAX_ENTRIES, CAPTION_CACHE_TTL, PREFIX_CACHE_ENABLED, PRELOAD_MEMORY_MODE, PRELOAD_WARMUP
 
 def build_prompt(caption_type: str, caption_length: str | int, extra_options: list[str], name_input: str) -> tuple[
     str, str]:
@@ -59,8 +74,15 @@ def build_prompt(caption_type: str, caption_length: str | int, extra_options: li
     return prompt_code, prompt_label
 
 
-# Shared client instance
-_joy_caption_client = None
+JOY_CAPTION_REPO_ID = "fancyfeast/llama-joycaption-beta-one-hf-llava"
+
+# memory mode code -> background preload of the local model, see preload_joy_caption
+_preloads: Dict[str, Future] = {}
+# Guards _preloads, written by the preload route and read by the prompt executor
+_preloads_lock = threading.Lock()
+
+# Shared cache instance
+_caption_cache = None
 
 
 def _validate_image_tensor(image_tensor):
@@ -71,7 +93,7 @@ def _validate_image_tensor(image_tensor):
         image_tensor: Input image tensor to validate
 
     Returns:
-        Validated tensor image
+        Validated tensor batch (batch_size, channels, height, width)
 
     Raises:
         ValueError: If the image tensor is invalid
@@ -85,14 +107,27 @@ def _validate_image_tensor(image_tensor):
     if image_tensor.shape[0] == 0:
         raise ValueError("Empty image tensor")
 
-    return image_tensor[0].permute(2, 0, 1)
+    return image_tensor.permute(0, 3, 1, 2)
 
-def tensor_to_bytes(image_tensor) -> bytes:
+
+def _frame_count(image_tensor) -> int:
+    """Number of frames in an IMAGE batch, 1 if the tensor is invalid."""
+    try:
+        return _validate_image_tensor(image_tensor).shape[0]
+    except ValueError:
+        return 1
+
+def tensor_to_bytes(image_tensor, index: int = 0, image_format: str = DEFAULT_IMAGE_FORMAT,
+                    quality: int = DEFAULT_IMAGE_QUALITY, short_side: int = 0) -> bytes:
     """
-    Convert a PyTorch image tensor to JPEG bytes.
+    Convert one frame of a PyTorch image tensor to encoded bytes for uploading to the remote service.
 
     Args:
         image_tensor: Input image tensor (batch_size, height, width, channels)
+        index: Index of the frame in the batch to convert
+        image_format: JPEG, WEBP or PNG
+        quality: Encoder quality for JPEG and WEBP
+        short_side: Downscale so the shorter side has this many pixels before encoding, 0 keeps the original size
 
     Returns:
         Bytes of the converted image
@@ -100,19 +135,107 @@ def tensor_to_bytes(image_tensor) -> bytes:
     Raises:
         ValueError: If the image tensor is invalid
     """
-    # Validate input
-    tensor_image = _validate_image_tensor(image_tensor)
-    buffer = io.BytesIO()
+    with metrics.stage("encode"):
+        data = encode_image(tensor_to_pil(image_tensor, index), image_format, quality, short_side)
+    metrics.count_upload(len(data))
+    return data
+
+def tensor_to_pil(image_tensor, index: int = 0) -> Image.Image:
+    """
+    Convert one frame of a PyTorch image tensor directly to an RGB PIL image, without
+    the lossy JPEG encode/decode round trip. Used for local execution.
 
-    save_image(tensor_image, buffer, "JPEG")
-    buffer.seek(0)
-    return buffer.getvalue()
+    Args:
+        image_tensor: Input image tensor (batch_size, height, width, channels) with values in [0, 1]
+        index: Index of the frame in the batch to convert
+
+    Returns:
+        The converted image
+
+    Raises:
+        ValueError: If the image tensor is invalid
+    """
+    _validate_image_tensor(image_tensor)
+    # Same rounding as torchvision's save_image
+    array = image_tensor[index].detach().mul(255).add_(0.5).clamp_(0, 255).byte().cpu().numpy()
+    if array.shape[-1] == 1:
+        return Image.fromarray(array[..., 0], "L").convert("RGB")
+    if array.shape[-1] == 4:
+        return Image.fromarray(array, "RGBA").convert("RGB")
+    return Image.fromarray(array[..., :3], "RGB")
 
 def _get_joy_caption_client() -> JoyCaptionServiceClient:
-    global _joy_caption_client
-    if _joy_caption_client is None:
-        _joy_caption_client = JoyCaptionServiceClient()
-    return _joy_caption_client
+    return get_shared_client()
+
+
+def _get_caption_cache() -> ResultCache | None:
+    global _caption_cache
+    if not CAPTION_CACHE_ENABLED:
+        return None
+    if _caption_cache is None:
+        store = None
+        if CAPTION_CACHE_DISK:
+            db_path = os.path.join(folder_paths.get_user_directory(), NAME, "caption_cache.sqlite")
+            store = SQLiteStore(db_path, "captions", CAPTION_CACHE_DISK_MAX_ENTRIES, CAPTION_CACHE_TTL)
+        _caption_cache = ResultCache("caption", CAPTION_CACHE_MAX_ENTRIES, CAPTION_CACHE_TTL, store)
+    return _caption_cache
+
+
+def _frame_digest(image_tensor, index: int) -> str:
+    """Fast content hash of the decoded pixels of one frame."""
+    frame = image_tensor[index].detach().contiguous().cpu()
+    digest = hashlib.blake2b(frame.numpy().tobytes(), digest_size=16)
+    digest.update(str(tuple(frame.shape)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _caption_cache_keys(image: Any, model_id: str, system_prompt: str, prompt: str, max_new_tokens: int,
+                        temperature: float, top_p: float, top_k: int, cache_sampled: bool,
+                        output_language: str = DEFAULT_OUTPUT_LANGUAGE) -> List[str] | None:
+    """
+    Build one cache key per frame, or None when the cache must be bypassed.
+
+    Sampling (temperature > 0) is non-deterministic, so those results are only cached when the user opts in.
+    """
+    if _get_caption_cache() is None or (temperature > 0 and not cache_sampled):
+        return None
+    frame_count = _validate_image_tensor(image).shape[0]
+    return [hash_key(_frame_digest(image, index), model_id, system_prompt, prompt, max_new_tokens, temperature,
+                     top_p, top_k, output_language) for index in range(frame_count)]
+
+
+def _run_with_caption_cache(self, keys: List[str] | None, frame_count: int,
+                            generate_frames: Callable[[List[int]], List[Tuple[str, str, bool]]]
+                            ) -> Tuple[List[str], List[str]]:
+    """
+    Serve cached frames and call generate_frames only for the missing ones.
+
+    generate_frames receives the missing frame indices and returns (en_caption, cn_caption, success)
+    for each of them; only successful captions are stored.
+    """
+    cache = _get_caption_cache() if keys is not None else None
+    results: List[Tuple[str, str] | None] = [None] * frame_count
+
+    if cache is not None:
+        for index, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is not None:
+                results[index] = (cached[0], cached[1])
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if missing:
+        for index, (en_caption, cn_caption, success) in zip(missing, generate_frames(missing)):
+            results[index] = (en_caption, cn_caption)
+            if success and cache is not None:
+                cache.set(keys[index], [en_caption, cn_caption])
+
+    if cache is not None:
+        stats = cache.stats()
+        self._log.log_node_info(self.get_node_name(),
+                                "Caption cache: %d/%d frames served from cache (total hits: %d, misses: %d)",
+                                frame_count - len(missing), frame_count, stats['hits'], stats['misses'])
+
+    return [result[0] for result in results], [result[1] for result in results]
 
 
 from ..dto.joy_caption_dto import JoyCaptionRequest
@@ -120,51 +243,142 @@ from ..dto.joy_caption_dto import JoyCaptionRequest
 
 def _process_remote_request(self,base_url: str, image: Any, system_prompt: str, prompt: str,
                             max_new_tokens: int, temperature: float, top_p: float,
-                            top_k: int) -> Dict[str, str]:
+                            top_k: int, cache_sampled: bool = False, max_concurrency: int = DEFAULT_BATCH_SIZE,
+                            upload_format: str = DEFAULT_IMAGE_FORMAT, upload_quality: int = DEFAULT_IMAGE_QUALITY,
+                            upload_short_side: int = 0,
+                            output_language: str = DEFAULT_OUTPUT_LANGUAGE) -> Tuple[List[str], List[str]]:
 
+    # Errors fill one entry per frame so the list outputs stay aligned with the batch
+    frame_count = _frame_count(image)
     if not base_url or base_url == DEFAULT_BASE_URL:
         error_msg = "Error: Please provide a valid base_url for remote execution"
-        return {
-            "enCaption": error_msg,
-            "cnCaption": error_msg
-        }
+        return [error_msg] * frame_count, [error_msg] * frame_count
+
+    def generate_frames(indices: List[int]) -> List[Tuple[str, str, bool]]:
+        client = AsyncJoyCaptionServiceClient(_get_joy_caption_client())
+        requests = [JoyCaptionRequest(image_file=tensor_to_bytes(image, index, upload_format, upload_quality,
+                                                                 upload_short_side),
+                                      system_prompt=system_prompt, prompt=prompt, max_new_tokens=max_new_tokens,
+                                      temperature=temperature, top_p=top_p, top_k=top_k,
+                                      output_language=output_language)
+                    for index in indices]
+        responses = run_sync(client.generate_caption_many(base_url, requests, max_concurrency=max_concurrency,
+                                                          image_format=upload_format))
+
+        results = []
+        for response in responses:
+            if isinstance(response, Exception):
+                self._log.log_node_warn(self.get_node_name(), "Error in remote caption generation: %s", response)
+                error_msg = f"Error generating caption: {str(response)}"
+                results.append((error_msg, error_msg, False))
+            else:
+                results.append((response.get("enCaption", ""), response.get("cnCaption", ""), True))
+        return results
 
     try:
-        client = _get_joy_caption_client()
-        request = JoyCaptionRequest.as_form(tensor_to_bytes(image),system_prompt,prompt,max_new_tokens,temperature,top_p,top_k)
-        return client.generate_caption(base_url=base_url, request=request)
+        _validate_image_tensor(image)
+        model_id = f"remote:{base_url}:{upload_format}:{upload_quality}:{upload_short_side}"
+        keys = _caption_cache_keys(image, model_id, system_prompt, prompt, max_new_tokens, temperature,
+                                   top_p, top_k, cache_sampled, output_language)
+        return _run_with_caption_cache(self, keys, frame_count, generate_frames)
     except Exception as e:
-        import traceback
-        traceback.format_exc()
-        self._log.log_node_warn(self.get_node_name(),f"Error in remote caption generation: {str(e)}")
+        self._log.log_node_warn(self.get_node_name(), "Error in remote caption generation: %s", e)
         error_msg = f"Error generating caption: {str(e)}"
-        return {
-            "enCaption": error_msg,
-            "cnCaption": error_msg
-        }
+        return [error_msg] * frame_count, [error_msg] * frame_count
 
 
-from ..service.joy_caption_service import JoyCaptionService
+CAPTION_PROGRESS_EVENT = "pillar.caption.progress"
+# Seconds between partial captions pushed to the frontend
+CAPTION_PROGRESS_INTERVAL = 0.1
 
-def _process_local_request(self, image: Any, system_prompt: str, prompt: str, memory_mode: str,
-                           max_new_tokens: int, temperature: float, top_p: float,
-                           top_k: int):
-    try:
-        checkpoint_path = self._download_model_from_hf("fancyfeast/llama-joycaption-beta-one-hf-llava",
-                                                       "LLavacheckpoints", False, False)
-        memory_mode_code = MEMORY_MODE.get_by_label(memory_mode)
-        service = JoyCaptionService(str(checkpoint_path), memory_mode_code)
 
-        image = Image.open(io.BytesIO(tensor_to_bytes(image)))
+def _send_caption_progress(unique_id: str, index: int, frame_count: int, text: str, done: bool) -> None:
+    """
+    Push a partial caption to the node's preview, see js/ext_joy_caption.js.
+    index is the position of the frame in the IMAGE batch of frame_count frames.
+    """
+    from server import PromptServer
+    PromptServer.instance.send_sync(CAPTION_PROGRESS_EVENT, {
+        "node": unique_id,
+        "index": index,
+        "frame_count": frame_count,
+        "text": text,
+        "done": done,
+    })
+
+
+def _stream_caption(service, index: int, frame_count: int, image: Image.Image, unique_id: str, system_prompt: str,
+                    prompt: str, max_new_tokens: int, temperature: float, top_p: float, top_k: int,
+                    should_stop: Callable[[], bool], output_language: str) -> Tuple[str, str]:
+    """Caption one frame token by token, pushing the partial caption to the frontend as it grows."""
+    last_sent = 0.0
+
+    def on_text(text: str) -> None:
+        nonlocal last_sent
+        now = time.monotonic()
+        if unique_id is not None and now - last_sent >= CAPTION_PROGRESS_INTERVAL:
+            _send_caption_progress(unique_id, index, frame_count, text, False)
+            last_sent = now
+
+    text = service.generate_stream(image, system_prompt, prompt, max_new_tokens, temperature, top_p, top_k, on_text,
+                                   should_stop, output_language)
+    if unique_id is not None:
+        _send_caption_progress(unique_id, index, frame_count, text, True)
+    return parse_caption(text, output_language)
 
-        en_caption, cn_caption = service.generate(image, system_prompt, prompt, max_new_tokens, temperature, top_p,
-                                                  top_k)
-        return en_caption, cn_caption
 
+def _process_local_request(self, image: Any, system_prompt: str, prompt: str, memory_mode: str,
+                           max_new_tokens: int, temperature: float, top_p: float,
+                           top_k: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                           cache_sampled: bool = False, stream: bool = False,
+                           unique_id: str = None,
+                           output_language: str = DEFAULT_OUTPUT_LANGUAGE) -> Tuple[List[str], List[str]]:
+    # Deferred so remote-only setups never import transformers
+    from ..service.joy_caption_service import JoyCaptionService
+    from ..service.model_registry import ModelRegistry
+
+    memory_mode_code = MEMORY_MODE.get_by_label(memory_mode)
+    # Errors fill one entry per frame so the list outputs stay aligned with the batch
+    frame_count = _frame_count(image)
+
+    def generate_frames(indices: List[int]) -> List[Tuple[str, str, bool]]:
+        with _preloads_lock:
+            preload = _preloads.get(memory_mode_code)
+        if preload is not None and not preload.done():
+            self._log.log_node_info(self.get_node_name(), "Waiting for the %s model to preload...", memory_mode_code)
+            wait([preload])
+        checkpoint_path = self._download_model_from_hf(JOY_CAPTION_REPO_ID, "LLavacheckpoints", False, False)
+        images = [tensor_to_pil(image, index) for index in indices]
+
+        # Stop generating as soon as the workflow is interrupted, which also releases the model
+        should_stop = comfy.model_management.processing_interrupted
+        with ModelRegistry.use(JoyCaptionService, str(checkpoint_path), memory_mode_code) as service:
+            if stream:
+                # Frames served from the caption cache are skipped, indices keep their place in the batch
+                results = [_stream_caption(service, index, image.shape[0], pil_image, unique_id, system_prompt,
+                                           prompt, max_new_tokens, temperature, top_p, top_k, should_stop,
+                                           output_language)
+                           for index, pil_image in zip(indices, images)]
+            else:
+                results = service.generate(images, system_prompt, prompt, max_new_tokens, temperature, top_p,
+                                           top_k, batch_size, should_stop, output_language)
+        comfy.model_management.throw_exception_if_processing_interrupted()
+        return [(en_caption, cn_caption, True) for en_caption, cn_caption in results]
+
+    try:
+        _validate_image_tensor(image)
+        # Captions generated from a cached prompt prefix are kept apart from fully prefilled ones
+        model_id = f"local:{JOY_CAPTION_REPO_ID}:{memory_mode_code}:prefix_cache={PREFIX_CACHE_ENABLED}"
+        keys = _caption_cache_keys(image, model_id, system_prompt, prompt, max_new_tokens, temperature, top_p, top_k,
+                                   cache_sampled, output_language)
+        return _run_with_caption_cache(self, keys, frame_count, generate_frames)
+
+    except comfy.model_management.InterruptProcessingException:
+        raise
     except Exception as e:
-        self._log.log_node_warn(self.get_node_name(),f"Error in local caption generation: {str(e)}")
+        self._log.log_node_warn(self.get_node_name(), "Error in local caption generation: %s", e)
         error_msg = f"Error generating caption: {str(e)}"
-        return error_msg, error_msg
+        return [error_msg] * frame_count, [error_msg] * frame_count
 
 
 class JoyCaption(ExtensionNode):
@@ -189,16 +403,37 @@ class JoyCaption(ExtensionNode):
                                  "step": TEMPERATURE_STEP}),
                 "top_p": ("FLOAT", {"default": DEFAULT_TOP_P, "min": MIN_TOP_P, "max": MAX_TOP_P, "step": TOP_P_STEP}),
                 "top_k": ("INT", {"default": DEFAULT_TOP_K, "min": MIN_TOP_K, "max": MAX_TOP_K}),
-            }
+            },
+            "optional": {
+                "batch_size": ("INT", {"default": DEFAULT_BATCH_SIZE, "min": MIN_BATCH_SIZE, "max": MAX_BATCH_SIZE}),
+                "cache_sampled": ("BOOLEAN", {"default": False}),
+                "upload_format": (IMAGE_FORMATS,),
+                "upload_quality": ("INT", {"default": DEFAULT_IMAGE_QUALITY, "min": 1, "max": 100}),
+                "upload_short_side": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 8,
+                                              "tooltip": f"Remote mode only. Downscale so the shorter side has this "
+                                                         f"many pixels before uploading, 0 keeps the original size. "
+                                                         f"The model sees {MODEL_IMAGE_SIZE}x{MODEL_IMAGE_SIZE}."}),
+                "stream": ("BOOLEAN", {"default": False,
+                                       "tooltip": "Local mode only. Show the caption on the node while it is "
+                                                  "generated, frames are captioned one at a time."}),
+                "output_language": (OUTPUT_LANGUAGE.labels(), {"tooltip": "Languages to caption in, a single "
+                                                                          "language generates about half the tokens."}),
+            },
+            "hidden": {"unique_id": "UNIQUE_ID"}
         }
 
     RETURN_TYPES = ("STRING", "STRING", "STRING")
     RETURN_NAMES = ("query", "en_caption", "cn_caption")
+    OUTPUT_IS_LIST = (False, True, True)
     DESCRIPTION = "JoyCaption生成图片描述"
     FUNCTION = "generate"
 
     def generate(self, exec_opt, base_url, image, memory_mode, caption_type, caption_length, extra_option1,
-                 extra_option2, extra_option3, person_name, max_new_tokens, temperature, top_p, top_k):
+                 extra_option2, extra_option3, person_name, max_new_tokens, temperature, top_p, top_k,
+                 batch_size=DEFAULT_BATCH_SIZE, cache_sampled=False,
+                 upload_format=DEFAULT_IMAGE_FORMAT, upload_quality=DEFAULT_IMAGE_QUALITY, upload_short_side=0,
+                 stream=False, output_language=None, unique_id=None):
+        output_language_code = OUTPUT_LANGUAGE.get_by_label(output_language) or DEFAULT_OUTPUT_LANGUAGE
 
         extras = [extra_option1, extra_option2, extra_option3]
         extras = [extra for extra in extras if extra]
@@ -209,17 +444,19 @@ class JoyCaption(ExtensionNode):
         prompt_code, prompt_label = build_prompt(caption_type, caption_length, extras, person_name)
 
         if exec_mode == "remote":
-            caption_result = _process_remote_request(self,base_url, image, system_prompt, prompt_code, max_new_tokens,
-                                                     temperature, top_p, top_k)
-
-            en_caption = caption_result.get("enCaption", "")
-            cn_caption = caption_result.get("cnCaption", "")
+            en_captions, cn_captions = _process_remote_request(self,base_url, image, system_prompt, prompt_code,
+                                                               max_new_tokens, temperature, top_p, top_k,
+                                                               cache_sampled, batch_size, upload_format,
+                                                               upload_quality, upload_short_side,
+                                                               output_language_code)
 
         else:
-            en_caption, cn_caption = _process_local_request(self, image, system_prompt, prompt_code, memory_mode,
-                                                            max_new_tokens, temperature, top_p, top_k)
+            en_captions, cn_captions = _process_local_request(self, image, system_prompt, prompt_code, memory_mode,
+                                                              max_new_tokens, temperature, top_p, top_k, batch_size,
+                                                              cache_sampled, stream, unique_id,
+                                                              output_language_code)
 
-        return prompt_label, en_caption, cn_caption
+        return prompt_label, en_captions, cn_captions
 
 
 class JoyCaptionCustom(ExtensionNode):
@@ -241,28 +478,86 @@ class JoyCaptionCustom(ExtensionNode):
                 "top_p": ("FLOAT", {"default": DEFAULT_TOP_P, "min": MIN_TOP_P, "max": MAX_TOP_P, "step": TOP_P_STEP}),
                 "top_k": ("INT", {"default": DEFAULT_TOP_K, "min": MIN_TOP_K, "max": MAX_TOP_K}),
             },
+            "optional": {
+                "batch_size": ("INT", {"default": DEFAULT_BATCH_SIZE, "min": MIN_BATCH_SIZE, "max": MAX_BATCH_SIZE}),
+                "cache_sampled": ("BOOLEAN", {"default": False}),
+                "upload_format": (IMAGE_FORMATS,),
+                "upload_quality": ("INT", {"default": DEFAULT_IMAGE_QUALITY, "min": 1, "max": 100}),
+                "upload_short_side": ("INT", {"default": 0, "min": 0, "max": 8192, "step": 8,
+                                              "tooltip": f"Remote mode only. Downscale so the shorter side has this "
+                                                         f"many pixels before uploading, 0 keeps the original size. "
+                                                         f"The model sees {MODEL_IMAGE_SIZE}x{MODEL_IMAGE_SIZE}."}),
+                "stream": ("BOOLEAN", {"default": False,
+                                       "tooltip": "Local mode only. Show the caption on the node while it is "
+                                                  "generated, frames are captioned one at a time."}),
+                "output_language": (OUTPUT_LANGUAGE.labels(), {"tooltip": "Languages to caption in, a single "
+                                                                          "language generates about half the tokens."}),
+            },
+            "hidden": {"unique_id": "UNIQUE_ID"},
         }
 
     RETURN_TYPES = ("STRING", "STRING", "STRING")
     RETURN_NAMES = ("query", "en_caption", "cn_caption")
+    OUTPUT_IS_LIST = (False, True, True)
     DESCRIPTION = "JoyCaption生成图片描述,自定义提示词."
     FUNCTION = "generate"
 
     def generate(self, exec_opt, base_url, image, memory_mode, system_prompt, user_query, max_new_tokens, temperature,
-                 top_p, top_k):
+                 top_p, top_k, batch_size=DEFAULT_BATCH_SIZE, cache_sampled=False,
+                 upload_format=DEFAULT_IMAGE_FORMAT, upload_quality=DEFAULT_IMAGE_QUALITY, upload_short_side=0,
+                 stream=False, output_language=None, unique_id=None):
+        output_language_code = OUTPUT_LANGUAGE.get_by_label(output_language) or DEFAULT_OUTPUT_LANGUAGE
 
         exec_mode = EXEC_OPTIONS.get_by_label(exec_opt)
 
         if exec_mode == "remote":
 
-            caption_result = _process_remote_request(self,base_url, image, system_prompt, user_query, max_new_tokens,
-                                                     temperature, top_p, top_k)
-
-            en_caption = caption_result.get("enCaption", "")
-            cn_caption = caption_result.get("cnCaption", "")
+            en_captions, cn_captions = _process_remote_request(self,base_url, image, system_prompt, user_query,
+                                                               max_new_tokens, temperature, top_p, top_k,
+                                                               cache_sampled, batch_size, upload_format,
+                                                               upload_quality, upload_short_side,
+                                                               output_language_code)
 
         else:
-            en_caption, cn_caption = _process_local_request(self, image, system_prompt, user_query, memory_mode,
-                                                            max_new_tokens, temperature, top_p, top_k)
+            en_captions, cn_captions = _process_local_request(self, image, system_prompt, user_query, memory_mode,
+                                                              max_new_tokens, temperature, top_p, top_k, batch_size,
+                                                              cache_sampled, stream, unique_id,
+                                                              output_language_code)
+
+        return user_query, en_captions, cn_captions
 
-        return user_query, en_caption, cn_caption
\ No newline at end of file
+
+def preload_joy_caption(memory_mode_code: str = PRELOAD_MEMORY_MODE, warmup: bool = PRELOAD_WARMUP) -> Future:
+    """
+    Download and load the local JoyCaption model on a background thread, so the first local caption
+    does not block the queue. Captions requested meanwhile wait for this load instead of starting another.
+    """
+    from ..service.joy_caption_service import JoyCaptionService
+    from ..service.model_registry import ModelRegistry
+
+    with _preloads_lock:
+        preload = _preloads.get(memory_mode_code)
+        if preload is not None and not preload.done():
+            return preload
+
+        node = JoyCaption()
+        checkpoint_path = node._model_save_path(JOY_CAPTION_REPO_ID, "LLavacheckpoints")
+        preload = ModelRegistry.preload(
+            JoyCaptionService, str(checkpoint_path), memory_mode_code, warmup=warmup,
+            prepare=lambda: node._download_model_from_hf(JOY_CAPTION_REPO_ID, "LLavacheckpoints", False, False))
+        _preloads[memory_mode_code] = preload
+        return preload
+
+
+def joy_caption_status() -> Dict[str, Any]:
+    """Readiness of the local JoyCaption model per memory mode, and every loaded model."""
+    from ..service.joy_caption_service import JoyCaptionService
+    from ..service.model_registry import ModelRegistry
+
+    checkpoint_path = str(JoyCaption._model_save_path(JOY_CAPTION_REPO_ID, "LLavacheckpoints"))
+    return {
+        "model": JOY_CAPTION_REPO_ID,
+        "memory_modes": {code: ModelRegistry.status(JoyCaptionService, checkpoint_path, code)
+                         for code in MEMORY_MODE.codes()},
+        "resident": ModelRegistry.resident(),
+    }
@@ -0,0 +1,53 @@
+"""
+Hook into ComfyUI's model management, so the local caption models give their VRAM back when ComfyUI needs
+it for its own models and are moved back on demand by the next caption.
+"""
+import functools
+
+import comfy.model_management
+
+from ..util.log import log
+
+_installed = False
+
+
+def install_model_management_hook() -> None:
+    """
+    Wrap comfy.model_management.free_memory, called before ComfyUI loads models: when the device does not
+    have the memory asked for, idle caption models on it are offloaded to the CPU (or unloaded if they cannot
+    be moved) before ComfyUI evicts its own models. unload_all_models, behind the "Free model and node cache"
+    button, unloads the idle caption models too.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    free_memory = comfy.model_management.free_memory
+    unload_all_models = comfy.model_management.unload_all_models
+
+    @functools.wraps(free_memory)
+    def free_memory_hook(memory_required, device, *args, **kwargs):
+        try:
+            if getattr(device, "type", "cpu") != "cpu" \
+                    and comfy.model_management.get_free_memory(device) < memory_required:
+                from ..service.model_registry import ModelRegistry
+                count = ModelRegistry.offload_idle_services(device)
+                if count:
+                    log(f"Freed the memory of {count} idle caption model(s) for ComfyUI", "CYAN")
+        except Exception as e:
+            log(f"Freeing caption model memory failed: {e}", "YELLOW")
+        return free_memory(memory_required, device, *args, **kwargs)
+
+    @functools.wraps(unload_all_models)
+    def unload_all_models_hook(*args, **kwargs):
+        try:
+            from ..service.model_registry import ModelRegistry
+            ModelRegistry.unload_all()
+        except Exception as e:
+            log(f"Unloading caption models failed: {e}", "YELLOW")
+        return unload_all_models(*args, **kwargs)
+
+    comfy.model_management.free_memory = free_memory_hook
+    comfy.model_management.unload_all_models = unload_all_models_hook
+
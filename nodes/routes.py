@@ -0,0 +1,45 @@
+"""
+HTTP routes the extension adds to the ComfyUI server.
+"""
+from aiohttp import web
+from server import PromptServer
+
+from .joy_caption import joy_caption_status, preload_joy_caption
+from ..client.base_client import BaseClient
+from ..util import metrics
+from ..util.constants import MEMORY_MODE
+from ..util.settings import PRELOAD_MEMORY_MODE, PRELOAD_WARMUP
+
+routes = PromptServer.instance.routes
+
+
+@routes.get("/pillar/models")
+async def get_models(request: web.Request) -> web.Response:
+    return web.json_response(joy_caption_status())
+
+
+@routes.get("/pillar/servers")
+async def get_servers(request: web.Request) -> web.Response:
+    return web.json_response(BaseClient.server_status())
+
+
+@routes.post("/pillar/preload")
+async def post_preload(request: web.Request) -> web.Response:
+    """Start loading the local JoyCaption model, body: {"memory_mode": label or code, "warmup": bool}."""
+    body = await request.json() if request.can_read_body else {}
+    memory_mode = body.get("memory_mode", PRELOAD_MEMORY_MODE)
+    memory_mode = MEMORY_MODE.get_by_label(memory_mode) or memory_mode
+    if memory_mode not in MEMORY_MODE.codes():
+        return web.json_response({"error": f"Unknown memory mode: {memory_mode}"}, status=400)
+
+    preload_joy_caption(memory_mode, bool(body.get("warmup", PRELOAD_WARMUP)))
+    return web.json_response(joy_caption_status(), status=202)
+
+
+@routes.get("/pillar/metrics")
+async def get_metrics(request: web.Request) -> web.Response:
+    """Stage latencies, throughput, queue waits and cache hits in the Prometheus text format (PILLAR_METRICS=1)."""
+    if not metrics.METRICS_ENABLED:
+        return web.json_response({"error": "Metrics are disabled, set PILLAR_METRICS=1"}, status=404)
+    # aiohttp rejects a charset inside content_type, so the header is set as is
+    return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
@@ -1,13 +1,55 @@
+import os
+import unicodedata
+from typing import Any, Dict, List, Tuple
+
+import folder_paths
 from .extension_node import ExtensionNode
-from ..dto.translate_dto import TranslationRequest
-from ..util.constants import DEFAULT_BASE_URL, EXEC_OPTIONS, MEMORY_MODE
+from ..dto.translate_dto import TranslationBatchRequest
+from ..util.cache import ResultCache, SQLiteStore, hash_key
+from ..util.constants import DEFAULT_BASE_URL, DEFAULT_BATCH_SIZE, DEFAULT_TRANSLATION_DIRECTION, EXEC_OPTIONS, \
+    MAX_BATCH_SIZE, MEMORY_MODE, MIN_BATCH_SIZE, TRANSLATION_DIRECTION
+from ..util.pyproject import NAME
+from ..util.settings import TRANSLATION_CACHE_DISK, TRANSLATION_CACHE_DISK_MAX_ENTRIES, TRANSLATION_CACHE_ENABLED, \
+    TRANSLATION_CACHE_MAX_ENTRIES, TRANSLATION_CACHE_TTL
+from ..util.tags import join_segments, split_segments
 
 DEFAULT_USER = "anonymous"
 ERROR_INVALID_BASE_URL = "Error: Please provide a valid base_url for remote execution"
+MODEL_REPO_ID = "fancyfeast/llama-joycaption-beta-one-hf-llava"
 
-class Translation(ExtensionNode):
+# Shared cache instance
+_translation_cache = None
+
+
+def _get_translation_cache() -> ResultCache | None:
+    global _translation_cache
+    if not TRANSLATION_CACHE_ENABLED:
+        return None
+    if _translation_cache is None:
+        store = None
+        if TRANSLATION_CACHE_DISK:
+            db_path = os.path.join(folder_paths.get_user_directory(), NAME, "translation_cache.sqlite")
+            store = SQLiteStore(db_path, "translations", TRANSLATION_CACHE_DISK_MAX_ENTRIES, TRANSLATION_CACHE_TTL)
+        _translation_cache = ResultCache("translation", TRANSLATION_CACHE_MAX_ENTRIES, TRANSLATION_CACHE_TTL, store)
+    return _translation_cache
+
+
+def _normalize_text(text: str) -> str:
+    """Cache lookup form of a source text: NFKC normalized with whitespace runs collapsed."""
+    return unicodedata.normalize("NFKC", " ".join(text.split()))
+
+
+def _translation_model_id(exec_mode: str, base_url: str) -> str:
+    """Where translations come from, a remote server may run another model or other settings than local runs."""
+    return f"remote:{base_url}" if exec_mode == "remote" else f"local:{MODEL_REPO_ID}"
 
-    from typing import Tuple, Dict, Any
+
+def _translation_cache_key(normalized_text: str, model_id: str,
+                           direction: str = DEFAULT_TRANSLATION_DIRECTION) -> str:
+    return hash_key(normalized_text, direction, model_id)
+
+
+class Translation(ExtensionNode):
 
     @classmethod
     def INPUT_TYPES(cls) -> Dict[str, Any]:
@@ -16,52 +58,109 @@ class Translation(ExtensionNode):
                 "exec_opt": (EXEC_OPTIONS.labels(),),
                 "base_url": ("STRING", {"default": DEFAULT_BASE_URL, "multiline": False, "placeholder": ""}),
                 "text": ("STRING", {"multiline": True, "placeholder": "请输入要翻译的内容..."}),
+            },
+            "optional": {
+                "batch_size": ("INT", {"default": DEFAULT_BATCH_SIZE, "min": MIN_BATCH_SIZE, "max": MAX_BATCH_SIZE,
+                                       "tooltip": "Texts translated per generate call when a list of texts is connected"}),
+                "direction": (TRANSLATION_DIRECTION.labels(),
+                              {"tooltip": "Translate in a fixed direction instead of detecting the language per text"}),
+                "segment_tags": ("BOOLEAN", {"default": False,
+                                             "tooltip": "Translate comma separated tags one by one, so recurring "
+                                                        "tags are served from the translation cache"}),
             }
         }
 
+    # A list of texts, e.g. the caption lists of the JoyCaption nodes, is translated in batches
+    INPUT_IS_LIST = True
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("text",)
+    OUTPUT_IS_LIST = (True,)
     FUNCTION = "translate_text"
     DESCRIPTION = "JoyCaption模型翻译"
 
-    def _remote_translate(self, base_url: str, text: str) -> str:
+    def _remote_translate(self, base_url: str, texts: List[str], direction: str) -> List[str]:
         if not base_url or base_url == DEFAULT_BASE_URL:
-            self._log.log_node_warn(self.get_node_name(),self.ERROR_INVALID_BASE_URL)
-            return text
+            raise ValueError(ERROR_INVALID_BASE_URL)
 
-        from ..client.joy_caption_service_client import JoyCaptionServiceClient
-        client = JoyCaptionServiceClient()
-        request = TranslationRequest(
-            text=text,
+        from ..client.joy_caption_service_client import get_shared_client
+        client = get_shared_client()
+        request = TranslationBatchRequest(
+            texts=texts,
+            direction=direction,
         )
-        return client.translate(base_url, request)
+        return client.translate_many(base_url, request)
 
-    def _local_translate(self, text: str) -> str:
+    def _local_translate(self, texts: List[str], batch_size: int, direction: str) -> List[str]:
         check_path = self._download_model_from_hf(
-            "fancyfeast/llama-joycaption-beta-one-hf-llava",
+            MODEL_REPO_ID,
             "LLavacheckpoints", False, False
         )
 
         from ..service.joy_caption_service import JoyCaptionService
+        from ..service.model_registry import ModelRegistry
+
+        # Translate with the JoyCaption model already loaded by a caption node in any memory mode,
+        # only load a 4-bit copy when none is resident
+        with ModelRegistry.use(JoyCaptionService, str(check_path), "Maximum Savings (4-bit)",
+                               prefer_resident=True) as service:
+            return service.translate_many(texts, batch_size, direction)
+
+    def _translate_uncached(self, exec_mode: str, base_url: str, sources: Dict[str, str], batch_size: int,
+                            direction: str) -> Dict[str, str]:
+        """Translate the sources (normalized text -> source text) that missed the cache and store the results."""
+        cache = _get_translation_cache()
+        model_id = _translation_model_id(exec_mode, base_url)
+        translations = {}
+        for key, source in sources.items():
+            cached = cache.get(_translation_cache_key(key, model_id, direction)) if cache is not None else None
+            if cached is not None:
+                translations[key] = cached
+        missing = [key for key in sources if key not in translations]
+
+        if missing:
+            texts = [sources[key] for key in missing]
+            try:
+                if exec_mode == "remote":
+                    texts_translated = self._remote_translate(base_url, texts, direction)
+                else:
+                    texts_translated = self._local_translate(texts, batch_size, direction)
+            except Exception as e:
+                self._log.log_node_warn(self.get_node_name(), "Translation error (%s): %s", exec_mode, e)
+                texts_translated, cache = texts, None
 
-        # Use an instance variable to cache the service
-        if not hasattr(self, "_joy_caption_service") or self._joy_caption_service is None:
-            self._joy_caption_service = JoyCaptionService(str(check_path), "Maximum Savings (4-bit)")
-        service = self._joy_caption_service
+            for key, text_translated in zip(missing, texts_translated):
+                translations[key] = text_translated
+                if cache is not None:
+                    cache.set(_translation_cache_key(key, model_id, direction), text_translated)
 
-        return service.tranlation(text)
+        if cache is not None:
+            stats = cache.stats()
+            self._log.log_node_info(self.get_node_name(),
+                                    "Translation cache: %d/%d texts served from cache (total hits: %d, misses: %d)",
+                                    len(sources) - len(missing), len(sources), stats['hits'], stats['misses'])
+        return translations
 
-    def translate_text(self, **kwargs) -> Tuple[str]:
-        exec_mode = EXEC_OPTIONS.get_by_label(kwargs["exec_opt"])
-        text = kwargs["text"]
+    def translate_text(self, **kwargs) -> Tuple[List[str]]:
+        # INPUT_IS_LIST wraps every input in a list, only text holds more than one value
+        exec_mode = EXEC_OPTIONS.get_by_label(kwargs["exec_opt"][0])
+        texts = kwargs["text"]
+        batch_size = kwargs.get("batch_size", [DEFAULT_BATCH_SIZE])[0]
+        segment_tags = kwargs.get("segment_tags", [False])[0]
+        direction = TRANSLATION_DIRECTION.get_by_label(kwargs.get("direction", [None])[0]) \
+            or DEFAULT_TRANSLATION_DIRECTION
 
-        try:
-            if exec_mode == "remote":
-                text_translated = self._remote_translate(kwargs["base_url"],text)
-            else:
-                text_translated = self._local_translate(text)
-        except Exception as e:
-            self._log.log_node_warn(self.get_node_name(),f"Translation error ({exec_mode}): {str(e)}")
-            text_translated = text
+        segmented = [split_segments(text) if segment_tags else [(text, "")] for text in texts]
+        # Every distinct source is translated once, however often it occurs in the texts
+        sources = {}
+        for segments in segmented:
+            for segment, _ in segments:
+                key = _normalize_text(segment)
+                if key:
+                    sources.setdefault(key, segment.strip())
 
-        return (text_translated,)
+        translations = {}
+        if sources:
+            translations = self._translate_uncached(exec_mode, kwargs["base_url"][0], sources, batch_size, direction)
+        texts_translated = [join_segments([(translations.get(_normalize_text(segment), segment), separator)
+                                            for segment, separator in segments]) for segments in segmented]
+        return (texts_translated,)
@@ -38,5 +38,15 @@ if IS_COMFYUI_ENVIRONMENT:
         }
 
         log(f"version:{VERSION} start successfully. load node count: {len(NODE_CLASS_MAPPINGS)}.🚀🚀🚀", "CYAN")
+
+        from .nodes import routes
+        from .util.settings import COMFY_MEMORY_HOOK, PRELOAD_MODEL, PRELOAD_MEMORY_MODE
+        if COMFY_MEMORY_HOOK:
+            from .nodes.model_management_hook import install_model_management_hook
+            install_model_management_hook()
+        if PRELOAD_MODEL:
+            from .nodes.joy_caption import preload_joy_caption
+            preload_joy_caption(PRELOAD_MEMORY_MODE)
+            log(f"Preloading JoyCaption ({PRELOAD_MEMORY_MODE}) in the background", "CYAN")
     except Exception as e:
         log(f"Error loading {NAME} : {e}", "RED")
\ No newline at end of file
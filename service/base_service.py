@@ -3,31 +3,52 @@ from abc import abstractmethod
 import gc
 import torch
 from ..pillar_plus import IS_COMFYUI_ENVIRONMENT
+import logging
+logger = logging.getLogger(__name__)
 if not IS_COMFYUI_ENVIRONMENT:
-    from server import logger
-else:
-    import logging
-    logger = logging.getLogger(__name__)
+    try:
+        from server import logger
+    except ImportError:
+        # Running standalone, e.g. inside the bundled caption server
+        pass
+
+def default_device() -> torch.device:
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 class SingletonMeta(type):
+    """One instance per class and instance key, see BaseService.instance_key."""
     _instances = {}
     _lock = threading.Lock()
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
+        key = (cls, cls.instance_key(*args, **kwargs))
+        if key not in cls._instances:
             with cls._lock:
-                if cls not in cls._instances:
-                    cls._instances[cls] = super().__call__(*args, **kwargs)
-        return cls._instances[cls]
+                if key not in cls._instances:
+                    cls._instances[key] = super().__call__(*args, **kwargs)
+        return cls._instances[key]
+
+    @classmethod
+    def discard(mcs, instance) -> None:
+        """Forget an instance so the next call with its arguments creates a new one."""
+        with mcs._lock:
+            for key, value in list(mcs._instances.items()):
+                if value is instance:
+                    del mcs._instances[key]
 
 class BaseService(metaclass=SingletonMeta):
 
-    def __init__(self, model_path):
+    def __init__(self, model_path, device=None):
         self.logger = logger
         self.model_path = model_path
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.device = torch.device(device) if device is not None else default_device()
         self.model = None
 
+    @classmethod
+    def instance_key(cls, *args, **kwargs) -> tuple:
+        """Constructor arguments that identify a distinct instance, one instance per class by default."""
+        return ()
+
     @classmethod
     def get_name(cls) -> str:
         return cls.__name__
@@ -41,10 +62,32 @@ class BaseService(metaclass=SingletonMeta):
     def cleanup(self):
         pass
 
+    def warmup(self):
+        """Run a minimal inference so the first real request does not pay for kernel setup, no-op by default."""
+        pass
+
+    @property
+    def offloaded(self) -> bool:
+        """Whether the model waits on the CPU for onload(), see offload()."""
+        return False
+
+    def offload(self) -> bool:
+        """
+        Move the model to the CPU to free device memory while it is not used, onload() moves it back.
+
+        Returns:
+            False if the model cannot be moved and has to be unloaded to free the memory
+        """
+        return False
+
+    def onload(self) -> None:
+        """Move an offloaded model back to its device, no-op otherwise."""
+        pass
+
     def _free_memory(self):
         if hasattr(self, 'model') and self.model is not None:
-            # Move model to CPU first if it was on GPU
-            if self.device != "cpu":
+            # Move model to CPU first if it was on GPU, bitsandbytes quantized models cannot be moved
+            if self.device.type != "cpu" and not getattr(self.model, "is_quantized", False):
                 self.model.to("cpu")
 
             # Delete model and explicitly call garbage collector
@@ -0,0 +1,118 @@
+"""
+Dynamic request batching: requests submitted concurrently are queued, grouped by a
+compatibility key and executed together in one batched model call.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, List, Tuple
+
+from ..util import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """
+    Groups compatible requests into batches and runs them on a single worker thread.
+
+    A batch is dispatched as soon as max_batch_size compatible requests are waiting, or when the
+    oldest waiting request has waited max_wait seconds. Each caller gets a Future resolved with
+    its own result.
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], List[Any]], max_batch_size: int = 8,
+                 max_wait: float = 0.02, name: str = "batch"):
+        """
+        Args:
+            run_batch: Called with a compatibility key and the items of a batch, returns one result per item
+            max_batch_size: Maximum number of items in a batch
+            max_wait: Seconds the oldest request may wait for more compatible requests to arrive
+            name: Name of the worker thread
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.name = name
+        # key -> [(enqueue time, item, future)], ordered by the arrival of each group's oldest item
+        self._pending: "OrderedDict[Hashable, List[Tuple[float, Any, Future]]]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"{name}-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, key: Hashable, item: Any) -> Future:
+        """Queue an item, requests sharing the same key may be batched together."""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"{self.name} scheduler is shut down")
+            self._pending.setdefault(key, []).append((time.monotonic(), item, future))
+            self._condition.notify()
+        return future
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return sum(len(group) for group in self._pending.values())
+
+    def shutdown(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+
+    def _next_batch(self) -> Tuple[Hashable, List[Tuple[float, Any, Future]]] | None:
+        """Block until a batch is ready, return None once shut down and drained."""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    if self._closed:
+                        return None
+                    self._condition.wait()
+                    continue
+
+                # A full group goes first, otherwise the group holding the oldest request
+                key = next((k for k, group in self._pending.items() if len(group) >= self.max_batch_size), None)
+                if key is None:
+                    key = next(iter(self._pending))
+                    remaining = self.max_wait - (time.monotonic() - self._pending[key][0][0])
+                    if remaining > 0 and not self._closed:
+                        self._condition.wait(remaining)
+                        continue
+
+                group = self._pending[key]
+                batch, rest = group[:self.max_batch_size], group[self.max_batch_size:]
+                if rest:
+                    self._pending[key] = rest
+                else:
+                    del self._pending[key]
+                return key, batch
+
+    def _run(self) -> None:
+        while True:
+            next_batch = self._next_batch()
+            if next_batch is None:
+                return
+            key, batch = next_batch
+            now = time.monotonic()
+            for enqueued, _, _ in batch:
+                metrics.observe_queue_wait(self.name, now - enqueued)
+            # Skip requests whose caller cancelled them while they were queued
+            live = [(item, future) for _, item, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+
+            items = [item for item, _ in live]
+            futures = [future for _, future in live]
+            try:
+                results = self.run_batch(key, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error("%s batch of %d failed: %s", self.name, len(items), e, exc_info=True)
+                for future in futures:
+                    future.set_exception(e)
@@ -0,0 +1,136 @@
+"""
+Parsing of the bilingual captions BILINGUAL_SUFFIX asks for: **English:** ... **Chinese:** ...,
+and of single language captions, see OUTPUT_LANGUAGE.
+"""
+import re
+from typing import Dict, List, Tuple
+
+EN_MARKERS = ["**English Description:**", "**英文描述:**", "**English:**", "English Description:"]
+CN_MARKERS = ["**Chinese Description:**", "**中文描述:**", "**Chinese:**", "Chinese Description:"]
+
+_MARKER_LANGUAGES = {**{marker: "en" for marker in EN_MARKERS}, **{marker: "cn" for marker in CN_MARKERS}}
+# Longest first, so "**English Description:**" wins over the "English Description:" inside it
+_MARKER_PATTERN = re.compile("|".join(re.escape(marker) for marker in
+                                      sorted(_MARKER_LANGUAGES, key=len, reverse=True)))
+_MAX_MARKER_LENGTH = max(len(marker) for marker in _MARKER_LANGUAGES)
+# marker -> [(longer marker containing it, offset within the longer marker)]
+_CONTAINING_MARKERS = {marker: [(longer, longer.index(marker)) for longer in _MARKER_LANGUAGES
+                                if longer != marker and marker in longer]
+                       for marker in _MARKER_LANGUAGES}
+_CHINESE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+
+class BilingualCaptionParser:
+    """
+    Incremental parser fed with the caption text as it is generated.
+
+    Markers are found in a single regex pass over the new text only. A section runs from its marker
+    to the next marker of the other language; a repeated marker of the same language stays part of the
+    text. complete turns True once both sections are closed, that is when the model starts another
+    section after writing both, so generation can stop there.
+    """
+
+    def __init__(self):
+        self.text = ""
+        # language -> [start, end], end is None while the section is open
+        self._sections: Dict[str, List[int | None]] = {}
+        self._open: str | None = None
+        self._scan_from = 0
+        self.complete = False
+
+    def feed(self, chunk: str) -> bool:
+        """Add generated text, returns complete."""
+        self.text += chunk
+        self._scan(final=False)
+        return self.complete
+
+    def result(self) -> Tuple[str, str]:
+        """
+        The (en_caption, cn_caption) pair. Falls back to splitting lines on Chinese characters without
+        markers, and to the whole caption for both when nothing is found.
+        """
+        self._scan(final=True)
+        caption = self.text.strip()
+        en_caption = self._section_text("en")
+        cn_caption = self._section_text("cn")
+
+        if not en_caption and not cn_caption:
+            english_lines = []
+            chinese_lines = []
+            for line in caption.split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
+                if _CHINESE_CHAR_PATTERN.search(line):
+                    chinese_lines.append(line)
+                else:
+                    english_lines.append(line)
+
+            en_caption = " ".join(english_lines).strip()
+            cn_caption = " ".join(chinese_lines).strip()
+
+        return (en_caption, cn_caption) if en_caption or cn_caption else (caption, caption)
+
+    def _scan(self, final: bool) -> None:
+        for match in _MARKER_PATTERN.finditer(self.text, self._scan_from):
+            if not final and self._may_grow(match):
+                # Wait for more text, e.g. "English Description:" may become "**English Description:**"
+                return
+            self._on_marker(_MARKER_LANGUAGES[match.group()], match.start(), match.end())
+            self._scan_from = match.end()
+        # A marker cut off at the end of the text starts within the last _MAX_MARKER_LENGTH characters
+        self._scan_from = max(self._scan_from, len(self.text) - _MAX_MARKER_LENGTH)
+
+    def _may_grow(self, match: re.Match) -> bool:
+        for longer, offset in _CONTAINING_MARKERS[match.group()]:
+            begin = match.start() - offset
+            if begin >= 0 and len(self.text) - begin < len(longer) and longer.startswith(self.text[begin:]):
+                return True
+        return False
+
+    def _on_marker(self, language: str, start: int, end: int) -> None:
+        if self._open is not None and self._open != language:
+            self._sections[self._open][1] = start
+            self._open = None
+        if self._open is None:
+            if language in self._sections:
+                # Both sections closed and the model starts over
+                self.complete = len(self._sections) == 2 and all(section_end is not None
+                                                                 for _, section_end in self._sections.values())
+            else:
+                self._sections[language] = [end, None]
+                self._open = language
+
+    def _section_text(self, language: str) -> str:
+        section = self._sections.get(language)
+        if section is None:
+            return ""
+        start, end = section
+        return self.text[start:end].strip()
+
+
+def parse_bilingual_caption(caption: str) -> Tuple[str, str]:
+    parser = BilingualCaptionParser()
+    parser.feed(caption.strip())
+    return parser.result()
+
+
+def parse_caption(caption: str, output_language: str = "both") -> Tuple[str, str]:
+    """
+    Split a generated caption into (en_caption, cn_caption) for an OUTPUT_LANGUAGE code,
+    the language that was not asked for is empty.
+    """
+    if output_language == "en":
+        return _strip_marker(caption, EN_MARKERS), ""
+    if output_language == "cn":
+        return "", _strip_marker(caption, CN_MARKERS)
+    return parse_bilingual_caption(caption)
+
+
+def _strip_marker(caption: str, markers: List[str]) -> str:
+    """Drop a leading section marker the model may still write in single language mode."""
+    caption = caption.strip()
+    match = _MARKER_PATTERN.match(caption)
+    if match is not None and match.group() in markers:
+        caption = caption[match.end():].strip()
+    return caption
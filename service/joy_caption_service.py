@@ -1,44 +1,73 @@
 # Configure logging
-import re
+import copy
 import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
 
 import torch
 from PIL import Image
-from transformers import AutoProcessor, LlavaForConditionalGeneration, BitsAndBytesConfig
-from langdetect import detect
-from .base_service import BaseService
-from ..util.constants import DEFAULT_SYSTEM_PROMPT, DEFAULT_TEMPERATURE, DEFAULT_TOP_K, DEFAULT_TOP_P, MAX_TOKENS, MEMORY_MODE
+from .base_service import BaseService, default_device
+from .bilingual import parse_bilingual_caption, parse_caption
+from .preprocess import prefetch, preprocess
+from ..util.constants import DEFAULT_BATCH_SIZE, DEFAULT_OUTPUT_LANGUAGE, DEFAULT_SYSTEM_PROMPT, DEFAULT_TEMPERATURE, \
+    DEFAULT_TOP_K, DEFAULT_TOP_P, MAX_BATCH_SIZE, MAX_TOKENS, MEMORY_MODE, MIN_BATCH_SIZE, OUTPUT_LANGUAGE, \
+    DEFAULT_TRANSLATION_DIRECTION, TRANSLATION_DIRECTION, TRANSLATION_MIN_NEW_TOKENS, TRANSLATION_TOKEN_RATIO
+from ..util import metrics
+from ..util.cache import LRUCache, hash_key
+from ..util.lang import is_chinese_batch
+from ..util.settings import PREFIX_CACHE_ENABLED, PREFIX_CACHE_MAX_ENTRIES
 
-BILINGUAL_SUFFIX = "Please reply in both Chinese and English according to this format **English:**English Description**Chinese:**Chinese Description"
+
+# Llava in transformers 4.x only forwards pixel_values when generation starts at cache position 0, continuing
+# from a prefix cache would caption without the image
+PREFIX_CACHE_MIN_TRANSFORMERS_MAJOR = 5
 
 
 class JoyCaptionService(BaseService):
     """
-    A singleton service for generating captions for images using the Llava model.
+    A service for generating captions for images using the Llava model.
+    One instance exists per (model path, memory mode, device), use ModelRegistry to bound how many stay loaded.
     """
-    _lock = threading.Lock()  # Class-level lock for thread safety
-
     @classmethod
     def get_model_name(cls):
         return "llama-joycaption-beta-one-hf-llava"
 
-    def __init__(self, model_path: str, memory_mode: str):
-        # Prevent re-initialization
-        if not hasattr(self, '_initialized'):
+    @classmethod
+    def instance_key(cls, model_path: str, memory_mode: str, device: str = None) -> tuple:
+        return str(model_path), memory_mode, str(torch.device(device) if device is not None else default_device())
+
+    def __init__(self, model_path: str, memory_mode: str, device: str = None):
+        # Prevent re-initialization, but reload after cleanup()
+        if not getattr(self, '_initialized', False):
             # Initialize the base class
-            super().__init__(model_path)
+            super().__init__(model_path, device)
+            # Guards the model of this instance only, models loaded side by side do not wait on each other
+            self._lock = threading.Lock()
+            self.memory_mode = memory_mode
+            # Let accelerate place the model unless a device was requested explicitly, a CPU model is loaded in
+            # place, which does not need accelerate
+            if self.device.type == "cpu":
+                device_map = None
+            else:
+                device_map = "auto" if device is None else {"": self.device}
 
             try:
-                # Check if GPU is available
-                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-                self.logger.info(f"Using device: {self.device}")
+                # Imported on first load, transformers alone takes seconds to import at ComfyUI startup
+                from transformers import AutoProcessor, LlavaForConditionalGeneration, BitsAndBytesConfig
+
+                self.logger.info("Using device: %s", self.device)
 
                 self.processor = AutoProcessor.from_pretrained(model_path)
+                # Decoder-only generation needs left padding so batched prompts end at the same position
+                self.processor.tokenizer.padding_side = "left"
+                if self.processor.tokenizer.pad_token is None:
+                    self.processor.tokenizer.pad_token = self.processor.tokenizer.eos_token
 
                 if memory_mode == "Default":
                     self.model = LlavaForConditionalGeneration.from_pretrained(model_path,
                                                                                torch_dtype="bfloat16",
-                                                                               device_map="auto")
+                                                                               device_map=device_map)
                 else:
                     # Configure quantization based on memory mode
                     quantization_config_params = MEMORY_MODE.get_by_code(memory_mode)
@@ -48,158 +77,399 @@ class JoyCaptionService(BaseService):
                         # Transformer's Siglip implementation has bugs when quantized, so skip those.
                     )
                     self.model = LlavaForConditionalGeneration.from_pretrained(str(model_path), torch_dtype="auto",
-                                                                               device_map="auto",
+                                                                               device_map=device_map,
                                                                                quantization_config=quantization_config)
 
-                self.logger.info(f"Loaded model {model_path} with memory mode {memory_mode}")
+                self.logger.info("Loaded model %s with memory mode %s", model_path, memory_mode)
 
                 self.model.eval()
+                # Prefix past key/values live on the model's device, bounded by PREFIX_CACHE_MAX_ENTRIES
+                self._prefix_cache = LRUCache(PREFIX_CACHE_MAX_ENTRIES) \
+                    if PREFIX_CACHE_ENABLED and self._prefix_cache_supported() else None
+                self._offloaded = False
                 self._initialized = True
 
-                self.logger.info(f"Model loaded with 4-bit quantization and ready for inference")
+                self.logger.info("Model loaded with 4-bit quantization and ready for inference")
             except Exception as e:
-                self.logger.error(f"Error loading model: {str(e)}")
+                self.logger.error("Error loading model: %s", e)
                 raise
 
     def cleanup(self):
         # Only clean up if initialized
         if hasattr(self, '_initialized') and self._initialized:
-            self.logger.info("Starting cleanup of JoyCaptionService resources...")
-            # Clean up processor
-            if hasattr(self, 'processor') and self.processor is not None:
-                self.logger.debug("Cleaning up processor...")
-                del self.processor
-                self.processor = None
-                self.logger.debug("Cleaning up model and memory...")
-                self._free_memory()
-                # Mark as uninitialized
-                self._initialized = False
-                self.logger.info("Cleaned up model resources for JoyCaptionService")
-
-    @staticmethod
-    def extract_section(caption: str, markers: list, other_markers: list):
-        for marker in markers:
-            if marker in caption:
-                parts = caption.split(marker, 1)
-                if len(parts) > 1:
-                    text = parts[1].strip()
-                    for other_marker in other_markers:
-                        if other_marker in text:
-                            text = text.split(other_marker, 1)[0].strip()
-                    return text
-        return ""
-
-    @staticmethod
-    def parse_bilingual_caption(caption: str):
-        caption = caption.strip()
-        en_markers = ["**English Description:**", "**英文描述:**", "**English:**", "English Description:"]
-        cn_markers = ["**Chinese Description:**", "**中文描述:**", "**Chinese:**", "Chinese Description:"]
-
-        en_caption = JoyCaptionService.extract_section(caption, en_markers, cn_markers)
-        cn_caption = JoyCaptionService.extract_section(caption, cn_markers, en_markers)
-
-        if not en_caption and not cn_caption:
-            lines = caption.split('\n')
-            english_lines = []
-            chinese_lines = []
-            chinese_char_pattern = re.compile(r'[\u4e00-\u9fff]')
-            current_section = "unknown"
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                if chinese_char_pattern.search(line):
-                    if current_section != "chinese":
-                        current_section = "chinese"
-                    chinese_lines.append(line)
-                else:
-                    if current_section != "english":
-                        current_section = "english"
-                    english_lines.append(line)
-
-            en_caption = " ".join(english_lines).strip() if english_lines else ""
-            cn_caption = " ".join(chinese_lines).strip() if chinese_lines else ""
-
-        return (en_caption, cn_caption) if en_caption or cn_caption else (caption, caption)
-
-    @torch.inference_mode()
-    def generate(self, image: Image.Image, system: str, prompt: str, max_new_tokens: int, temperature: float,
-                 top_p: float, top_k: int):
-        # Limit max_new_tokens not to exceed MAX_TOKENS
-        max_new_tokens = min(max_new_tokens, MAX_TOKENS)
-
-        prompt = f"{prompt.strip()} {BILINGUAL_SUFFIX}"
-
+            # Wait for a generation in progress on this instance to finish before tearing the model down
+            with self._lock:
+                self.logger.info("Starting cleanup of JoyCaptionService resources...")
+                # Clean up processor
+                if hasattr(self, 'processor') and self.processor is not None:
+                    self.logger.debug("Cleaning up processor...")
+                    del self.processor
+                    self.processor = None
+                    if getattr(self, '_prefix_cache', None) is not None:
+                        self._prefix_cache.clear()
+                    self.logger.debug("Cleaning up model and memory...")
+                    self._free_memory()
+                    # Mark as uninitialized
+                    self._offloaded = False
+                    self._initialized = False
+                    self.logger.info("Cleaned up model resources for JoyCaptionService")
+
+    def warmup(self):
+        """Caption a blank image with a few tokens to initialize the CUDA kernels and the KV cache."""
+        start = time.perf_counter()
+        self.generate(Image.new("RGB", (64, 64)), DEFAULT_SYSTEM_PROMPT, "Describe this image.", 4, 0.0,
+                      DEFAULT_TOP_P, DEFAULT_TOP_K, 1)
+        self.logger.info("Warmed up %s in %.1fs", self.get_name(), time.perf_counter() - start)
+
+    @property
+    def offloaded(self) -> bool:
+        return getattr(self, "_offloaded", False)
+
+    def offload(self) -> bool:
+        """Move the model to the CPU, bitsandbytes quantized and multi-device models cannot be moved."""
+        with self._lock:
+            if self.offloaded or self.model is None or self.device.type == "cpu":
+                return True
+            device_map = getattr(self.model, "hf_device_map", None) or {}
+            if getattr(self.model, "is_quantized", False) or len(set(device_map.values())) > 1:
+                return False
+
+            start = time.perf_counter()
+            self.model.to("cpu")
+            # The cached prefixes live on the device, they are cheap to compute again
+            if self._prefix_cache is not None:
+                self._prefix_cache.clear()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            self._offloaded = True
+        seconds = time.perf_counter() - start
+        metrics.observe_stage("offload", seconds)
+        self.logger.info("Offloaded %s %s to the CPU in %.1fs", self.get_name(), self.model_path, seconds)
+        return True
+
+    def onload(self) -> None:
+        with self._lock:
+            if not self.offloaded:
+                return
+            start = time.perf_counter()
+            self.model.to(self.device)
+            self._offloaded = False
+        seconds = time.perf_counter() - start
+        metrics.observe_stage("onload", seconds)
+        self.logger.info("Moved %s %s back to %s in %.1fs", self.get_name(), self.model_path, self.device, seconds)
+
+    parse_bilingual_caption = staticmethod(parse_bilingual_caption)
+
+    def _caption_convo_string(self, system: str, prompt: str, output_language: str = DEFAULT_OUTPUT_LANGUAGE) -> str:
+        suffix = OUTPUT_LANGUAGE.get_by_code(output_language)
         convo = [
             {"role": "system", "content": system.strip()},
-            {"role": "user", "content": prompt}
+            {"role": "user", "content": f"{prompt.strip()} {suffix}".strip()}
         ]
-        # Acquire lock to ensure thread safety
-        with self._lock:
-            convo_string = self.processor.apply_chat_template(convo, tokenize=False, add_generation_prompt=True)
+        return self.processor.apply_chat_template(convo, tokenize=False, add_generation_prompt=True)
 
-            # Use self.device to maintain device consistency
-            inputs = self.processor(text=[convo_string], images=[image], return_tensors="pt").to(self.device)
+    @torch.inference_mode()
+    def generate(self, images: Image.Image | List[Image.Image], system: str, prompt: str, max_new_tokens: int,
+                 temperature: float, top_p: float, top_k: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                 should_stop: Callable[[], bool] = None, output_language: str = DEFAULT_OUTPUT_LANGUAGE):
+        """
+        Generate captions for one image or a list of images.
+        output_language is an OUTPUT_LANGUAGE code, the caption of a language that was not asked for is empty.
+
+        Images are captioned in padded micro-batches of at most ``batch_size`` so a whole IMAGE batch
+        runs through a handful of ``model.generate`` calls instead of one call per frame.
+
+        Returns:
+            ``(en_caption, cn_caption)`` for a single image, or a list of such tuples for a list of images
+        """
+        single_image = isinstance(images, Image.Image)
+        if single_image:
+            images = [images]
+        if not images:
+            return []
+
+        results = self.generate_many([(image, system, prompt) for image in images], max_new_tokens, temperature,
+                                     top_p, top_k, batch_size, should_stop, output_language)
+        return results[0] if single_image else results
+
+    @torch.inference_mode()
+    def generate_many(self, items: List[Tuple[Image.Image, str, str]], max_new_tokens: int, temperature: float,
+                      top_p: float, top_k: int, batch_size: int = DEFAULT_BATCH_SIZE,
+                      should_stop: Callable[[], bool] = None,
+                      output_language: str = DEFAULT_OUTPUT_LANGUAGE) -> List[Tuple[str, str]]:
+        """
+        Caption a list of (image, system prompt, prompt) items that share the same generation parameters.
+        Prompts may differ between items, they are left-padded to a common length.
+        Once should_stop returns True the running batch ends after the current token and the rest is skipped.
+        """
+        batch_size = max(MIN_BATCH_SIZE, min(batch_size, MAX_BATCH_SIZE))
+        chunks = (items[start:start + batch_size] for start in range(0, len(items), batch_size))
+
+        results = []
+        # The next chunks are preprocessed while the model generates, the lock only covers generation
+        for chunk, inputs in prefetch(chunks, lambda chunk: self._caption_inputs(chunk, output_language)):
+            if should_stop is not None and should_stop():
+                break
+            with self._model_lock():
+                # Use self.device to maintain device consistency
+                inputs = inputs.to(self.device)
+                generate_ids = self._timed_generate(
+                    "caption",
+                    inputs,
+                    self._stopping_criteria(len(chunk), should_stop, output_language),
+                    **self._sampling_kwargs(max_new_tokens, temperature, top_p, top_k),
+                    **self._prefix_kwargs(inputs),
+                )
+
+            with metrics.stage("parse"):
+                generate_ids = generate_ids[:, inputs['input_ids'].shape[1]:]
+                captions = self.processor.tokenizer.batch_decode(generate_ids, skip_special_tokens=True,
+                                                                 clean_up_tokenization_spaces=False)
+                results.extend(parse_caption(caption, output_language) for caption in captions)
+
+        return results
+
+    def generate_stream(self, image: Image.Image, system: str, prompt: str, max_new_tokens: int, temperature: float,
+                        top_p: float, top_k: int, on_text: Callable[[str], None],
+                        should_stop: Callable[[], bool] = None,
+                        output_language: str = DEFAULT_OUTPUT_LANGUAGE) -> str:
+        """
+        Caption one image, calling on_text with the raw caption generated so far after every decoded chunk.
+
+        Generation ends early once should_stop returns True or on_text raises, the model is released before
+        this returns or raises. Pass the returned text to parse_caption.
+
+        Returns:
+            The raw caption
+        """
+        from transformers import TextIteratorStreamer
+
+        closed = threading.Event()
+        stopping_criteria = self._stopping_criteria(
+            1, lambda: closed.is_set() or (should_stop is not None and should_stop()), output_language)
+        errors = []
+
+        inputs = preprocess(self._caption_inputs, [(image, system, prompt)], output_language)
+        text = ""
+        with self._model_lock():
+            inputs = inputs.to(self.device)
+            prefix_kwargs = self._prefix_kwargs(inputs)
+            streamer = TextIteratorStreamer(self.processor.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                            clean_up_tokenization_spaces=False)
+
+            def run():
+                try:
+                    with torch.inference_mode():
+                        self._timed_generate("caption", inputs, stopping_criteria,
+                                             **self._sampling_kwargs(max_new_tokens, temperature, top_p, top_k),
+                                             **prefix_kwargs, streamer=streamer)
+                except Exception as e:
+                    errors.append(e)
+                    streamer.end()
+
+            worker = threading.Thread(target=run, name="caption-stream", daemon=True)
+            worker.start()
+            try:
+                for chunk in streamer:
+                    text += chunk
+                    on_text(text)
+            finally:
+                closed.set()
+                worker.join()
+
+        if errors:
+            raise errors[0]
+        return text
+
+    def _caption_inputs(self, items: List[Tuple[Image.Image, str, str]], output_language: str):
+        """Chat template, image preprocessing and tokenization of a batch into CPU tensors, see service.preprocess."""
+        with metrics.stage("preprocess"):
+            convo_strings = [self._caption_convo_string(system, prompt, output_language)
+                             for _, system, prompt in items]
+
+            inputs = self.processor(text=convo_strings, images=[image for image, _, _ in items], padding=True,
+                                    return_tensors="pt")
 
             # Use bfloat16 for pixel_values to save memory
             if torch.cuda.is_available():
                 inputs['pixel_values'] = inputs['pixel_values'].to(torch.bfloat16)
+            return inputs
 
-            generate_ids = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                do_sample=True if temperature > 0 else False,
-                suppress_tokens=None,
-                use_cache=True,
-                temperature=temperature,
-                top_k=None if top_k == 0 else top_k,
-                top_p=top_p,
-            )[0]
-
-            generate_ids = generate_ids[inputs['input_ids'].shape[1]:]
-            caption = self.processor.tokenizer.decode(generate_ids, skip_special_tokens=True,
-                                                      clean_up_tokenization_spaces=False).strip()
+    @contextmanager
+    def _model_lock(self):
+        """Hold self._lock, recording how long the caller waited for the model."""
+        wait_start = time.perf_counter()
+        with self._lock:
+            metrics.observe_stage("lock_wait", time.perf_counter() - wait_start)
+            yield
+
+    def _timed_generate(self, task: str, inputs, stopping_criteria=None, **kwargs):
+        """model.generate, recording prefill and decode time and the generated tokens when metrics are enabled."""
+        if not metrics.METRICS_ENABLED:
+            return self.model.generate(**inputs, stopping_criteria=stopping_criteria, **kwargs)
+
+        from transformers import StoppingCriteriaList
+        from .stopping import TimingStoppingCriteria
+
+        timer = TimingStoppingCriteria()
+        criteria = StoppingCriteriaList(stopping_criteria or [])
+        criteria.append(timer)
+        start = time.perf_counter()
+        generate_ids = self.model.generate(**inputs, stopping_criteria=criteria, **kwargs)
+        end = time.perf_counter()
+
+        first_token_time = timer.first_token_time or end
+        metrics.observe_stage("prefill", first_token_time - start)
+        metrics.observe_stage("decode", end - first_token_time)
+        new_ids = generate_ids[:, inputs["input_ids"].shape[1]:]
+        metrics.observe_generation(task, int((new_ids != self.processor.tokenizer.pad_token_id).sum()),
+                                   end - first_token_time)
+        return generate_ids
 
-            en_caption, cn_caption = JoyCaptionService.parse_bilingual_caption(caption)
-            return en_caption, cn_caption
+    @staticmethod
+    def _sampling_kwargs(max_new_tokens: int, temperature: float, top_p: float, top_k: int) -> Dict[str, Any]:
+        return {
+            # Limit max_new_tokens not to exceed MAX_TOKENS
+            "max_new_tokens": min(max_new_tokens, MAX_TOKENS),
+            "do_sample": True if temperature > 0 else False,
+            "suppress_tokens": None,
+            "use_cache": True,
+            "temperature": temperature,
+            "top_k": None if top_k == 0 else top_k,
+            "top_p": top_p,
+        }
+
+    def _prefix_cache_supported(self) -> bool:
+        import transformers
+        from packaging.version import Version
+
+        version = Version(transformers.__version__)
+        if version.major >= PREFIX_CACHE_MIN_TRANSFORMERS_MAJOR:
+            return True
+        self.logger.warning("PILLAR_PREFIX_CACHE needs transformers %d or newer, disabled with transformers %s",
+                            PREFIX_CACHE_MIN_TRANSFORMERS_MAJOR, version)
+        return False
 
     @torch.inference_mode()
-    def tranlation(self, prompt: str):
+    def _prefix_kwargs(self, inputs) -> Dict[str, Any]:
+        """
+        past_key_values for the text in front of the image, the chat header and system prompt every caption with
+        the same system prompt starts with. The prompt template follows the image, so its keys/values depend on
+        the image and cannot be shared. Computed once per prefix, copied for each generate call.
+        Only unpadded batches whose rows share the prefix use it. Call with self._lock held.
+        """
+        if self._prefix_cache is None or not bool(inputs["attention_mask"].all()):
+            return {}
+        input_ids = inputs["input_ids"]
+        image_positions = (input_ids[0] == self.model.config.image_token_index).nonzero()
+        if len(image_positions) == 0 or image_positions[0].item() == 0:
+            return {}
+        prefix = input_ids[:, :image_positions[0].item()]
+        if not bool((prefix == prefix[:1]).all()):
+            return {}
+
+        key = hash_key(prefix[0].tolist())
+        prefix_cache = self._prefix_cache.get(key)
+        if prefix_cache is None:
+            from transformers import DynamicCache
+
+            prefix_cache = DynamicCache()
+            self.model(input_ids=prefix[:1], past_key_values=prefix_cache, use_cache=True)
+            self._prefix_cache.set(key, prefix_cache)
+
+        # generate extends the cache it is given
+        past_key_values = copy.deepcopy(prefix_cache)
+        past_key_values.batch_repeat_interleave(input_ids.shape[0])
+        return {"past_key_values": past_key_values}
+
+    def _stopping_criteria(self, batch_size: int, should_stop: Callable[[], bool] = None,
+                           output_language: str = DEFAULT_OUTPUT_LANGUAGE):
+        """Stop each bilingual caption once both language sections are closed, and all of them once should_stop is set."""
+        from transformers import StoppingCriteriaList
+        from .stopping import BilingualStoppingCriteria, CallbackStoppingCriteria
+
+        criteria = StoppingCriteriaList()
+        if output_language == "both":
+            criteria.append(BilingualStoppingCriteria(self.processor.tokenizer, batch_size))
+        if should_stop is not None:
+            criteria.append(CallbackStoppingCriteria(should_stop))
+        return criteria
 
-        lang = detect(prompt)
-
-        if lang == "zh-cn":
-            lang = "English"
-        else:
-            lang = "Chinese"
-
-        prompt = f"translate this passage into{lang}: {prompt.strip()} "
-
-        convo = [
-            {"role": "system", "content": "You are a translation expert".strip()},
-            {"role": "user", "content": prompt}
-        ]
+    @torch.inference_mode()
+    def tranlation(self, prompt: str, direction: str = DEFAULT_TRANSLATION_DIRECTION):
+        return self.translate_many([prompt], direction=direction)[0]
 
-        # Acquire lock to ensure thread safety
-        with self._lock:
-            convo_string = self.processor.apply_chat_template(convo, tokenize=False, add_generation_prompt=True)
-
-            # Use self.device to maintain device consistency
-            inputs = self.processor(text=[convo_string], return_tensors="pt").to(self.device)
-
-            generate_ids = self.model.generate(
-                **inputs,
-                max_new_tokens=MAX_TOKENS,
-                do_sample=True,
-                suppress_tokens=None,
-                use_cache=True,
-                temperature=DEFAULT_TEMPERATURE,
-                top_k=DEFAULT_TOP_K,
-                top_p=DEFAULT_TOP_P,
-            )[0]
-
-            generate_ids = generate_ids[inputs['input_ids'].shape[1]:]
-            content = self.processor.tokenizer.decode(generate_ids, skip_special_tokens=True,
-                                                      clean_up_tokenization_spaces=False).strip()
-            return content
\ No newline at end of file
+    @torch.inference_mode()
+    def translate_many(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                       direction: str = DEFAULT_TRANSLATION_DIRECTION) -> List[str]:
+        """
+        Translate a list of texts in padded micro-batches of at most ``batch_size``.
+        direction is a TRANSLATION_DIRECTION code, "auto" translates Chinese texts into English
+        and everything else into Chinese, see util.lang.
+
+        Texts are batched by length so little padding is generated, and every batch may generate
+        at most TRANSLATION_TOKEN_RATIO times its longest input plus TRANSLATION_MIN_NEW_TOKENS tokens
+        instead of MAX_TOKENS, so a short text stuck in a sampling loop ends early.
+
+        Returns:
+            The translations in the order of texts
+        """
+        if not texts:
+            return []
+        batch_size = max(MIN_BATCH_SIZE, min(batch_size, MAX_BATCH_SIZE))
+        target = TRANSLATION_DIRECTION.get_by_code(direction)
+        targets = [target] * len(texts) if target else \
+            ["English" if chinese else "Chinese" for chinese in is_chinese_batch(texts)]
+        tokenizer = self.processor.tokenizer
+        lengths = preprocess(self._text_lengths, texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+        def prepare(chunk: List[int]):
+            with metrics.stage("preprocess"):
+                convo_strings = []
+                for i in chunk:
+                    prompt = f"translate this passage into {targets[i]}: {texts[i].strip()} "
+
+                    convo = [
+                        {"role": "system", "content": "You are a translation expert".strip()},
+                        {"role": "user", "content": prompt}
+                    ]
+                    convo_strings.append(self.processor.apply_chat_template(convo, tokenize=False,
+                                                                            add_generation_prompt=True))
+                return self.processor(text=convo_strings, padding=True, return_tensors="pt")
+
+        results = [""] * len(texts)
+        chunks = (order[start:start + batch_size] for start in range(0, len(order), batch_size))
+        for chunk, inputs in prefetch(chunks, prepare):
+            max_new_tokens = min(MAX_TOKENS,
+                                 TRANSLATION_MIN_NEW_TOKENS + TRANSLATION_TOKEN_RATIO * lengths[chunk[-1]])
+
+            with self._model_lock():
+                # Use self.device to maintain device consistency
+                inputs = inputs.to(self.device)
+
+                generate_ids = self._timed_generate(
+                    "translation",
+                    inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=True,
+                    suppress_tokens=None,
+                    use_cache=True,
+                    temperature=DEFAULT_TEMPERATURE,
+                    top_k=DEFAULT_TOP_K,
+                    top_p=DEFAULT_TOP_P,
+                )
+
+            generate_ids = generate_ids[:, inputs['input_ids'].shape[1]:]
+            contents = tokenizer.batch_decode(generate_ids, skip_special_tokens=True,
+                                              clean_up_tokenization_spaces=False)
+
+            for i, content in zip(chunk, contents):
+                results[i] = content.strip()
+
+        return results
+
+    def _text_lengths(self, texts: List[str]) -> List[int]:
+        # Padded like every other tokenizer call, so the tokenizer's padding setting is not switched back and forth
+        encoding = self.processor.tokenizer([text.strip() for text in texts], padding=True, add_special_tokens=False)
+        return [sum(mask) for mask in encoding["attention_mask"]]
@@ -0,0 +1,437 @@
+"""
+Registry of loaded model services keyed on (service, model path, memory mode, device).
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Type
+
+import torch
+
+from .base_service import BaseService, SingletonMeta, default_device, logger
+from ..util import metrics
+from ..util.settings import MAX_RESIDENT_MODELS, MODEL_IDLE_TIMEOUT, MODEL_OFFLOAD, MODEL_OFFLOAD_IDLE
+
+
+class _Entry:
+    def __init__(self, service: BaseService):
+        self.service = service
+        self.refs = 0
+        self.last_used = time.monotonic()
+        # Set while the service is offloaded or unloaded outside the registry lock, acquire() waits for it
+        self.moving = False
+        # Set once the service is being unloaded, the entry leaves the registry when cleanup() returns
+        self.unloading = False
+
+    def idle(self) -> bool:
+        return self.refs == 0 and not self.moving
+
+
+class ModelRegistry:
+    """
+    Loads, reference counts and unloads model services.
+
+    At most max_resident services stay loaded; when another one is needed, the least recently
+    used service nobody holds is unloaded through its cleanup(), which frees the memory with
+    BaseService._free_memory. Services being loaded count toward max_resident, a load beyond it waits for the
+    loads started before it.
+
+    Services nobody holds are unloaded once idle for idle_timeout seconds and, with offload set, moved to
+    the CPU once idle for offload_idle seconds; acquire() moves an offloaded service back to its device.
+    Services that cannot be moved, e.g. quantized ones, stay loaded. Moving or unloading a model takes seconds,
+    so it happens outside the registry lock.
+    """
+    max_resident = MAX_RESIDENT_MODELS
+    idle_timeout = MODEL_IDLE_TIMEOUT
+    offload = MODEL_OFFLOAD
+    offload_idle = MODEL_OFFLOAD_IDLE
+    _entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+    _loading: Dict[Tuple, Future] = {}
+    _failures: Dict[Tuple, str] = {}
+    _lock = threading.RLock()
+    # Notified whenever an entry stops moving or a load ends
+    _moved = threading.Condition(_lock)
+    _reaper = None
+
+    @staticmethod
+    def make_key(service_cls: Type[BaseService], model_path: str, memory_mode: str, device: str = None) -> Tuple:
+        resolved_device = str(device) if device is not None else str(default_device())
+        return service_cls.get_name(), str(model_path), memory_mode, resolved_device
+
+    @classmethod
+    def acquire(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str, device: str = None,
+                prefer_resident: bool = False) -> BaseService:
+        """
+        Return a loaded service, loading it if needed, and hold a reference to it until release().
+        A caller asking for a service another thread is loading waits for that load instead of starting a second one.
+
+        Args:
+            service_cls: The service class to load
+            model_path: Path of the model checkpoint
+            memory_mode: Memory mode code, see MEMORY_MODE
+            device: Device to load on, the service picks one if omitted
+            prefer_resident: Reuse an already loaded service for the same model in any memory mode
+                instead of loading a second copy
+        """
+        key = cls.make_key(service_cls, model_path, memory_mode, device)
+        while True:
+            with cls._lock:
+                found = cls._find(key, prefer_resident)
+                if found is not None and found[1].moving:
+                    # Take it once it is offloaded, then move it back
+                    cls._moved.wait()
+                    continue
+                if found is not None:
+                    found_key, entry = found
+                    entry.refs += 1
+                    entry.last_used = time.monotonic()
+                    cls._entries.move_to_end(found_key)
+                else:
+                    loading = cls._loading.get(key)
+                    if loading is None and prefer_resident:
+                        loading = next((future for k, future in cls._loading.items() if cls._same_model(k, key)),
+                                       None)
+                    owner = loading is None
+                    if owner:
+                        loading = cls._loading[key] = Future()
+
+            if found is not None:
+                # The reference taken keeps the service from being offloaded again meanwhile
+                try:
+                    entry.service.onload()
+                except Exception:
+                    with cls._lock:
+                        entry.refs -= 1
+                    raise
+                return entry.service
+            if owner:
+                return cls._load(key, loading, service_cls, model_path, memory_mode, device)
+            # Raises the loader's error, otherwise take a reference on the next pass
+            loading.result()
+
+    @classmethod
+    def preload(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str, device: str = None,
+                warmup: bool = True, prepare: Callable[[], Any] = None) -> Future:
+        """
+        Load a service on a background thread without holding a reference to it.
+
+        Args:
+            warmup: Run the service's warmup() once loaded
+            prepare: Called on the background thread before loading, e.g. to download the checkpoint
+
+        Returns:
+            A future resolved with the service once it is ready for inference
+        """
+        future = Future()
+
+        def run():
+            try:
+                if prepare is not None:
+                    prepare()
+                service = cls.acquire(service_cls, model_path, memory_mode, device)
+                try:
+                    if warmup:
+                        service.warmup()
+                finally:
+                    cls.release(service)
+                future.set_result(service)
+            except Exception as e:
+                logger.error("Preloading %s %s failed: %s", service_cls.get_name(), model_path, e, exc_info=True)
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"preload-{service_cls.get_name()}", daemon=True).start()
+        return future
+
+    @classmethod
+    def release(cls, service: BaseService) -> None:
+        """Drop a reference taken by acquire(), the service stays loaded until evicted or unloaded."""
+        with cls._lock:
+            entry = next((entry for entry in cls._entries.values() if entry.service is service), None)
+            if entry is None:
+                return
+            entry.refs = max(0, entry.refs - 1)
+            entry.last_used = time.monotonic()
+            if not (cls.offload and cls.offload_idle <= 0 and entry.idle()):
+                return
+            entry.moving = True
+        cls._offload_entries([entry], unload_unmovable=False)
+
+    @classmethod
+    @contextmanager
+    def use(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str, device: str = None,
+            prefer_resident: bool = False) -> Iterator[BaseService]:
+        """Hold a loaded service for the duration of a with block."""
+        service = cls.acquire(service_cls, model_path, memory_mode, device, prefer_resident)
+        try:
+            yield service
+        finally:
+            cls.release(service)
+
+    @classmethod
+    def load(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str,
+             device: str = None) -> BaseService:
+        """Load a service without holding a reference, it can be evicted once the cap is reached."""
+        service = cls.acquire(service_cls, model_path, memory_mode, device)
+        cls.release(service)
+        return service
+
+    @classmethod
+    def unload(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str, device: str = None,
+               force: bool = False) -> bool:
+        """
+        Unload a service.
+
+        Returns:
+            True if it was unloaded, False if it is not loaded or still referenced and force is not set
+        """
+        key = cls.make_key(service_cls, model_path, memory_mode, device)
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None or entry.moving or (entry.refs > 0 and not force):
+                return False
+            cls._mark_unloading([entry])
+        cls._unload_entries([entry])
+        return True
+
+    @classmethod
+    def unload_all(cls, force: bool = False) -> int:
+        with cls._lock:
+            entries = [entry for entry in cls._entries.values() if entry.idle() or (force and not entry.moving)]
+            cls._mark_unloading(entries)
+        cls._unload_entries(entries)
+        return len(entries)
+
+    @classmethod
+    def offload_idle_services(cls, device: str | torch.device = None) -> int:
+        """
+        Free the device memory of every service nobody holds, on device if given: offload it to the CPU,
+        or unload it if it cannot be moved. Used when another model needs the memory.
+
+        Returns:
+            The number of services offloaded or unloaded
+        """
+        with cls._lock:
+            entries = [entry for key, entry in cls._entries.items()
+                       if entry.idle() and not entry.service.offloaded and torch.device(key[3]).type != "cpu"
+                       and (device is None or _same_device(key[3], device))]
+            for entry in entries:
+                entry.moving = True
+        cls._offload_entries(entries, unload_unmovable=True)
+        return len(entries)
+
+    @classmethod
+    def reap(cls) -> None:
+        """Unload or offload the services idle for longer than idle_timeout or offload_idle."""
+        now = time.monotonic()
+        unload, offload = [], []
+        with cls._lock:
+            for key, entry in cls._entries.items():
+                idle = now - entry.last_used
+                if not entry.idle():
+                    continue
+                if 0 < cls.idle_timeout <= idle:
+                    logger.info("%s %s was idle for %.0fs", key[0], key[1], idle)
+                    unload.append(entry)
+                elif cls.offload and 0 < cls.offload_idle <= idle and not entry.service.offloaded:
+                    entry.moving = True
+                    offload.append(entry)
+            cls._mark_unloading(unload)
+        cls._unload_entries(unload)
+        cls._offload_entries(offload, unload_unmovable=False)
+
+    @classmethod
+    def status(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str, device: str = None) -> str:
+        """Readiness of a service: "ready", "loading", "failed" (the last load raised) or "unloaded"."""
+        key = cls.make_key(service_cls, model_path, memory_mode, device)
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None and not entry.unloading:
+                return "ready"
+            if key in cls._loading:
+                return "loading"
+            return "failed" if key in cls._failures else "unloaded"
+
+    @classmethod
+    def is_loaded(cls, service_cls: Type[BaseService], model_path: str, memory_mode: str,
+                  device: str = None) -> bool:
+        with cls._lock:
+            entry = cls._entries.get(cls.make_key(service_cls, model_path, memory_mode, device))
+            return entry is not None and not entry.unloading
+
+    @classmethod
+    def resident(cls) -> List[Dict[str, Any]]:
+        """Describe the loaded services, least recently used first."""
+        with cls._lock:
+            return [{"service": key[0], "model_path": key[1], "memory_mode": key[2], "device": key[3],
+                     "refs": entry.refs, "idle_seconds": time.monotonic() - entry.last_used,
+                     "offloaded": entry.service.offloaded}
+                    for key, entry in cls._entries.items()]
+
+    @classmethod
+    def _find(cls, key: Tuple, prefer_resident: bool) -> Tuple[Tuple, _Entry] | None:
+        entry = cls._entries.get(key)
+        if entry is not None:
+            return key, entry
+        if prefer_resident:
+            return next(((k, e) for k, e in reversed(cls._entries.items()) if cls._same_model(k, key)), None)
+        return None
+
+    @staticmethod
+    def _same_model(key: Tuple, other: Tuple) -> bool:
+        """Same service, checkpoint and device, in any memory mode."""
+        return key[0] == other[0] and key[1] == other[1] and key[3] == other[3]
+
+    @classmethod
+    def _load(cls, key: Tuple, loading: Future, service_cls: Type[BaseService], model_path: str, memory_mode: str,
+              device: str = None) -> BaseService:
+        """
+        Construct the service outside the lock, other callers wait on loading meanwhile.
+        Returns the service with a reference held for the caller, so no other load evicts it first.
+        """
+        try:
+            with cls._lock:
+                # A load beyond the cap waits for the earlier ones, then evicts what is idle by then
+                while (next(iter(cls._loading)) != key
+                       and cls._resident_count() + len(cls._loading) > cls.max_resident):
+                    cls._moved.wait()
+                evicted = cls._evict()
+            # Free the memory of the evicted services before loading
+            cls._unload_entries(evicted)
+            start = time.perf_counter()
+            if device is None:
+                service = service_cls(model_path, memory_mode)
+            else:
+                service = service_cls(model_path, memory_mode, device)
+            seconds = time.perf_counter() - start
+            metrics.observe_stage("model_load", seconds)
+            logger.info("Loaded %s %s (%s, %s) in %.1fs", key[0], key[1], key[2], key[3], seconds)
+        except Exception as e:
+            with cls._lock:
+                cls._failures[key] = str(e)
+                del cls._loading[key]
+                cls._moved.notify_all()
+            loading.set_exception(e)
+            raise
+
+        with cls._lock:
+            entry = cls._entries[key] = _Entry(service)
+            entry.refs = 1
+            cls._failures.pop(key, None)
+            del cls._loading[key]
+            cls._start_reaper()
+            cls._moved.notify_all()
+        loading.set_result(service)
+        return service
+
+    @classmethod
+    def _resident_count(cls) -> int:
+        return sum(1 for entry in cls._entries.values() if not entry.unloading)
+
+    @classmethod
+    def _evict(cls) -> List[_Entry]:
+        """
+        Pick least recently used, unreferenced services to unload until the services being loaded fit under the
+        cap. Call with the lock held, then pass the returned entries to _unload_entries() without it.
+        """
+        resident = [entry for entry in cls._entries.values() if not entry.unloading]
+        evicted = []
+        while len(resident) + len(cls._loading) > cls.max_resident:
+            entry = next((entry for entry in resident if entry.idle()), None)
+            if entry is None:
+                logger.warning("%d loaded models are in use and %d loading, exceeding the limit of %d resident "
+                               "models", len(resident), len(cls._loading), cls.max_resident)
+                break
+            resident.remove(entry)
+            evicted.append(entry)
+        cls._mark_unloading(evicted)
+        return evicted
+
+    @staticmethod
+    def _mark_unloading(entries: List[_Entry]) -> None:
+        """Reserve entries for _unload_entries(), call with the lock held."""
+        for entry in entries:
+            entry.moving = entry.unloading = True
+
+    @classmethod
+    def _unload_entries(cls, entries: List[_Entry]) -> None:
+        """
+        Unload services through their cleanup(), call without the lock held and with the entries marked
+        by _mark_unloading(). Callers acquiring one of them wait until it is gone, then load it again.
+        """
+        for entry in entries:
+            service = entry.service
+            start = time.perf_counter()
+            try:
+                service.cleanup()
+            except Exception as e:
+                logger.error("Unloading %s %s failed: %s", service.get_name(), service.model_path, e, exc_info=True)
+            SingletonMeta.discard(service)
+            seconds = time.perf_counter() - start
+            metrics.observe_stage("model_unload", seconds)
+
+            with cls._lock:
+                key = next((key for key, value in cls._entries.items() if value is entry), None)
+                if key is not None:
+                    del cls._entries[key]
+                    logger.info("Unloaded %s %s (%s, %s) in %.1fs", key[0], key[1], key[2], key[3], seconds)
+                entry.moving = False
+                cls._moved.notify_all()
+
+    @classmethod
+    def _offload_entries(cls, entries: List[_Entry], unload_unmovable: bool) -> None:
+        """
+        Offload services to the CPU, call without the lock held and with the entries marked moving.
+
+        Args:
+            unload_unmovable: Unload the services that cannot be moved to free their memory, otherwise they
+                stay loaded on their device
+        """
+        if not entries:
+            return
+        unmovable, unload = [], []
+        for entry in entries:
+            try:
+                if not entry.service.offload():
+                    unmovable.append(entry)
+            except Exception as e:
+                logger.warning("Offloading %s failed: %s", entry.service.get_name(), e)
+                unmovable.append(entry)
+
+        with cls._lock:
+            for entry in entries:
+                entry.moving = False
+            if unload_unmovable:
+                unload = [entry for entry in unmovable if entry.idle()]
+                cls._mark_unloading(unload)
+            cls._moved.notify_all()
+        cls._unload_entries(unload)
+
+    @classmethod
+    def _start_reaper(cls) -> None:
+        """Start the thread checking for idle services, once, if idle unloading or offloading is enabled."""
+        intervals = [seconds for seconds in (cls.idle_timeout, cls.offload_idle if cls.offload else 0) if seconds > 0]
+        if cls._reaper is not None or not intervals:
+            return
+        # Check often enough that a service is handled at most ~10% later than its timeout
+        period = min(30.0, max(1.0, min(intervals) / 10))
+
+        def run():
+            while True:
+                time.sleep(period)
+                try:
+                    cls.reap()
+                except Exception as e:
+                    logger.error("Checking for idle models failed: %s", e, exc_info=True)
+
+        cls._reaper = threading.Thread(target=run, name="model-reaper", daemon=True)
+        cls._reaper.start()
+
+
+def _same_device(device: str | torch.device, other: str | torch.device) -> bool:
+    """Same device type and index, a device without index (cuda) matching any index."""
+    device, other = torch.device(device), torch.device(other)
+    if device.type != other.type:
+        return False
+    return device.index is None or other.index is None or device.index == other.index
@@ -0,0 +1,66 @@
+"""
+Preprocessing pipeline of the local services: chat templates, image preprocessing and tokenization of the
+next batches run on a worker thread while the model generates the current one.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple, TypeVar
+
+from ..util.settings import PREPROCESS_PREFETCH
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_preprocess_pool = None
+_preprocess_pool_lock = threading.Lock()
+
+
+def get_preprocess_pool() -> ThreadPoolExecutor:
+    """
+    The process-wide preprocessing thread. A single worker runs every tokenizer call, since the fast
+    tokenizer is reconfigured per call (padding) and fails when that happens during another thread's call.
+    """
+    global _preprocess_pool
+    if _preprocess_pool is None:
+        with _preprocess_pool_lock:
+            if _preprocess_pool is None:
+                _preprocess_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preprocess")
+    return _preprocess_pool
+
+
+def preprocess(prepare: Callable[..., R], *args) -> R:
+    """Run prepare on the preprocessing thread and wait for it."""
+    return get_preprocess_pool().submit(prepare, *args).result()
+
+
+def prefetch(chunks: Iterable[T], prepare: Callable[[T], R], depth: int = PREPROCESS_PREFETCH
+             ) -> Iterator[Tuple[T, R]]:
+    """
+    Yield (chunk, prepare(chunk)) in order, preparing up to depth chunks ahead on the preprocessing thread.
+    Chunks not consumed when the caller stops iterating are cancelled, depth 0 prepares each chunk when needed.
+    """
+    chunks = iter(chunks)
+    pending: deque[Tuple[T, Future]] = deque()
+    pool = get_preprocess_pool()
+    end = object()
+
+    def fill(count: int):
+        while len(pending) < count:
+            chunk = next(chunks, end)
+            if chunk is end:
+                return
+            pending.append((chunk, pool.submit(prepare, chunk)))
+
+    try:
+        while True:
+            fill(depth + 1)
+            if not pending:
+                return
+            chunk, future = pending.popleft()
+            # The next depth chunks are prepared while the caller works on this one
+            fill(depth)
+            yield chunk, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
@@ -0,0 +1,57 @@
+"""
+Stopping criteria for model.generate, imported on first use since they need transformers.
+"""
+import time
+from typing import Callable, List
+
+import torch
+from transformers import StoppingCriteria
+
+from .bilingual import BilingualCaptionParser
+
+
+class CallbackStoppingCriteria(StoppingCriteria):
+    """Stops every sequence of the batch as soon as should_stop returns True, checked after each token."""
+
+    def __init__(self, should_stop: Callable[[], bool]):
+        self.should_stop = should_stop
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), bool(self.should_stop()), dtype=torch.bool, device=input_ids.device)
+
+
+class BilingualStoppingCriteria(StoppingCriteria):
+    """
+    Stops a sequence once its bilingual caption has both sections closed, see BilingualCaptionParser.
+    New tokens are decoded incrementally, only what was generated since the previous step.
+    """
+
+    def __init__(self, tokenizer, batch_size: int):
+        self.tokenizer = tokenizer
+        self.parsers = [BilingualCaptionParser() for _ in range(batch_size)]
+        self._pending: List[List[int]] = [[] for _ in range(batch_size)]
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        done = []
+        for parser, pending, token_id in zip(self.parsers, self._pending, input_ids[:, -1].tolist()):
+            if not parser.complete:
+                pending.append(token_id)
+                text = self.tokenizer.decode(pending, skip_special_tokens=True)
+                # A multi-byte character split across tokens decodes to U+FFFD until its last token arrives
+                if not text.endswith("\ufffd"):
+                    parser.feed(text)
+                    pending.clear()
+            done.append(parser.complete)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class TimingStoppingCriteria(StoppingCriteria):
+    """Never stops, records when the first new token was generated to split prefill from decode time."""
+
+    def __init__(self):
+        self.first_token_time = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        return torch.zeros((input_ids.shape[0],), dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,21 @@
+"""
+Helpers shared by the tests.
+"""
+import importlib
+import sys
+import types
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+
+def import_package_module(name: str):
+    """
+    Import a module of the extension, e.g. "util.cache", without running the package's __init__.py,
+    which registers the ComfyUI nodes and needs a ComfyUI installation.
+    """
+    if PACKAGE_ROOT.name not in sys.modules:
+        package = types.ModuleType(PACKAGE_ROOT.name)
+        package.__path__ = [str(PACKAGE_ROOT)]
+        sys.modules[PACKAGE_ROOT.name] = package
+    return importlib.import_module(f"{PACKAGE_ROOT.name}.{name}")
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import pytest
+
+from _common import import_package_module
+
+pytest.importorskip("requests")
+pytest.importorskip("pydantic")
+async_client = import_package_module("client.async_joy_caption_service_client")
+
+
+class FakeClient:
+    """Records the calls and the threads they ran on, fails for requests equal to "fail"."""
+
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def generate_caption(self, base_url, request, image_format="JPEG"):
+        self.threads.add(threading.current_thread().name)
+        if request == "fail":
+            raise ValueError(request)
+        self.calls.append((base_url, request, image_format))
+        return {"enCaption": request, "cnCaption": ""}
+
+    def translate_many(self, base_url, request):
+        self.calls.append((base_url, request))
+        return [text.upper() for text in request]
+
+
+@pytest.fixture
+def fake():
+    return FakeClient()
+
+
+def test_caption_many_forwards_the_image_format_in_order(fake):
+    client = async_client.AsyncJoyCaptionServiceClient(fake)
+    results = async_client.run_sync(client.generate_caption_many("http://server", ["a", "fail", "b"],
+                                                                 image_format="WEBP"))
+
+    assert results[0] == {"enCaption": "a", "cnCaption": ""}
+    assert isinstance(results[1], ValueError)
+    assert results[2] == {"enCaption": "b", "cnCaption": ""}
+    assert sorted(fake.calls) == [("http://server", "a", "WEBP"), ("http://server", "b", "WEBP")]
+    assert all(name.startswith("joycaption-client") for name in fake.threads)
+
+
+def test_translate_many_sends_one_batch_request(fake):
+    client = async_client.AsyncJoyCaptionServiceClient(fake)
+    assert async_client.run_sync(client.translate_many("http://server", ["a", "b"])) == ["A", "B"]
+    assert fake.calls == [("http://server", ["a", "b"])]
+
+
+def test_run_sync_reuses_one_loop():
+    loops = [async_client.run_sync(_running_loop()) for _ in range(2)]
+    assert loops[0] is loops[1]
+
+
+def test_run_sync_inside_a_running_loop(fake):
+    async def caller():
+        return async_client.run_sync(_running_loop())
+
+    assert asyncio.run(caller()) is async_client._shared_loop()
+
+
+async def _running_loop():
+    return asyncio.get_running_loop()
@@ -0,0 +1,93 @@
+import pytest
+
+from _common import import_package_module
+
+balancer = import_package_module("client.balancer")
+
+A, B, C = "http://a:8000", "http://b:8000", "http://c:8000"
+
+
+@pytest.mark.parametrize("base_url, expected", [
+    ("http://a:8000", ["http://a:8000"]),
+    ("http://a:8000, http://b:8000", ["http://a:8000", "http://b:8000"]),
+    (" http://a:8000 ;http://b:8000\nhttp://c:8000 ", ["http://a:8000", "http://b:8000", "http://c:8000"]),
+    ("http://a:8000,,http://a:8000", ["http://a:8000"]),
+    ("", []),
+    (None, []),
+])
+def test_split_base_urls(base_url, expected):
+    assert balancer.split_base_urls(base_url) == expected
+
+
+def make_balancer(strategy=balancer.LEAST_OUTSTANDING):
+    # No health_interval, so no prober thread; health is set by the tests
+    return balancer.LoadBalancer(lambda url: True, strategy=strategy, health_interval=0)
+
+
+def test_single_server_is_used_without_balancing():
+    lb = make_balancer()
+    assert lb.choose([A]) == A
+    assert lb.choose([A], exclude=[A]) is None
+    assert lb.status() == []
+
+
+def test_least_outstanding_picks_least_busy_server():
+    lb = make_balancer()
+    lb.begin(A)
+    lb.begin(A)
+    lb.begin(B)
+    assert lb.choose([A, B, C]) == C
+    lb.begin(C)
+    lb.begin(C)
+    assert lb.choose([A, B, C]) == B
+
+
+def test_excluded_servers_are_skipped():
+    lb = make_balancer()
+    lb.begin(B)
+    assert lb.choose([A, B], exclude=[A]) == B
+    assert lb.choose([A, B], exclude=[A, B]) is None
+
+
+def test_unhealthy_servers_are_avoided_while_a_healthy_one_is_left():
+    lb = make_balancer()
+    lb.begin(B)
+    lb.begin(B)
+    lb.set_health(A, False)
+    assert all(lb.choose([A, B]) == B for _ in range(20))
+
+    lb.set_health(A, True)
+    assert lb.choose([A, B]) == A
+
+
+def test_requests_are_spread_over_unhealthy_servers_when_none_is_healthy():
+    lb = make_balancer()
+    lb.set_health(A, False)
+    lb.set_health(B, False)
+    assert {lb.choose([A, B]) for _ in range(50)} == {A, B}
+
+
+def test_ewma_prefers_faster_server():
+    lb = make_balancer(balancer.EWMA)
+    for url, seconds in [(A, 2.0), (B, 0.5)]:
+        lb.begin(url)
+        lb.end(url, seconds)
+    assert lb.choose([A, B]) == B
+    # Outstanding requests count against the faster server's expected wait
+    for _ in range(4):
+        lb.begin(B)
+    assert lb.choose([A, B]) == A
+
+
+def test_end_updates_outstanding_and_latency_estimate():
+    lb = make_balancer()
+    lb.choose([A, B])
+    lb.begin(A)
+    lb.end(A, 1.0)
+    lb.begin(A)
+    lb.end(A, 2.0)
+    lb.end(A)
+    status = {state["url"]: state for state in lb.status()}
+    assert status[A]["outstanding"] == 0
+    assert status[A]["ewma_ms"] == pytest.approx(1000 + balancer.EWMA_ALPHA * 1000)
+    assert status[B] == {"url": B, "healthy": True, "outstanding": 0, "ewma_ms": None}
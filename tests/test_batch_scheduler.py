@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from _common import import_package_module
+
+batch_scheduler = import_package_module("service.batch_scheduler")
+
+
+class RecordingBatch:
+    """run_batch recording every call, blocked until released so requests can pile up."""
+
+    def __init__(self, fail_keys=()):
+        self.calls = []
+        self.fail_keys = set(fail_keys)
+        self.release = threading.Event()
+
+    def __call__(self, key, items):
+        self.release.wait(5)
+        self.calls.append((key, list(items)))
+        if key in self.fail_keys:
+            raise ValueError(f"bad batch {key}")
+        return [f"{key}:{item}" for item in items]
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(run_batch, max_batch_size=8, max_wait=0.05):
+        scheduler = batch_scheduler.BatchScheduler(run_batch, max_batch_size, max_wait, name="test")
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown()
+
+
+def test_requests_are_batched_by_key(make_scheduler):
+    run_batch = RecordingBatch()
+    scheduler = make_scheduler(run_batch)
+    futures = [scheduler.submit(key, item) for key, item in [("a", 1), ("b", 2), ("a", 3), ("b", 4), ("a", 5)]]
+    run_batch.release.set()
+
+    assert [future.result(5) for future in futures] == ["a:1", "b:2", "a:3", "b:4", "a:5"]
+    assert sorted(run_batch.calls) == [("a", [1, 3, 5]), ("b", [2, 4])]
+
+
+def test_batches_are_limited_to_max_batch_size(make_scheduler):
+    run_batch = RecordingBatch()
+    scheduler = make_scheduler(run_batch, max_batch_size=2)
+    futures = [scheduler.submit("a", item) for item in range(5)]
+    run_batch.release.set()
+
+    assert [future.result(5) for future in futures] == [f"a:{item}" for item in range(5)]
+    assert all(len(items) <= 2 for _, items in run_batch.calls)
+    assert [item for _, items in run_batch.calls for item in items] == list(range(5))
+
+
+def test_single_request_is_dispatched_after_max_wait(make_scheduler):
+    run_batch = RecordingBatch()
+    run_batch.release.set()
+    scheduler = make_scheduler(run_batch, max_wait=0.01)
+    assert scheduler.submit("a", 1).result(5) == "a:1"
+    assert scheduler.pending_count() == 0
+
+
+def test_batch_error_fails_only_that_batch(make_scheduler):
+    run_batch = RecordingBatch(fail_keys={"bad"})
+    scheduler = make_scheduler(run_batch)
+    bad = [scheduler.submit("bad", item) for item in range(2)]
+    good = scheduler.submit("good", 1)
+    run_batch.release.set()
+
+    for future in bad:
+        with pytest.raises(ValueError, match="bad batch"):
+            future.result(5)
+    assert good.result(5) == "good:1"
+
+
+def test_wrong_result_count_is_an_error(make_scheduler):
+    scheduler = make_scheduler(lambda key, items: items[:-1])
+    futures = [scheduler.submit("a", item) for item in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 results for 2 items"):
+            future.result(5)
+
+
+def test_cancelled_requests_are_skipped(make_scheduler):
+    run_batch = RecordingBatch()
+    scheduler = make_scheduler(run_batch, max_wait=0.2)
+    cancelled = scheduler.submit("a", 1)
+    kept = scheduler.submit("a", 2)
+    assert cancelled.cancel()
+    run_batch.release.set()
+
+    assert kept.result(5) == "a:2"
+    assert run_batch.calls == [("a", [2])]
+
+
+def test_submit_after_shutdown_fails():
+    scheduler = batch_scheduler.BatchScheduler(lambda key, items: items, name="test")
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError, match="shut down"):
+        scheduler.submit("a", 1)
@@ -0,0 +1,97 @@
+import re
+
+import pytest
+
+from _common import import_package_module
+
+bilingual = import_package_module("service.bilingual")
+
+
+def _extract_section(caption, markers, other_markers):
+    for marker in markers:
+        if marker in caption:
+            text = caption.split(marker, 1)[1].strip()
+            for other_marker in other_markers:
+                if other_marker in text:
+                    text = text.split(other_marker, 1)[0].strip()
+            return text
+    return ""
+
+
+def reference_parse(caption):
+    """The parser JoyCaptionService used before the incremental one, kept as the expected behavior."""
+    caption = caption.strip()
+    en_caption = _extract_section(caption, bilingual.EN_MARKERS, bilingual.CN_MARKERS)
+    cn_caption = _extract_section(caption, bilingual.CN_MARKERS, bilingual.EN_MARKERS)
+
+    if not en_caption and not cn_caption:
+        english_lines = []
+        chinese_lines = []
+        for line in caption.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            if re.search(r'[\u4e00-\u9fff]', line):
+                chinese_lines.append(line)
+            else:
+                english_lines.append(line)
+        en_caption = " ".join(english_lines).strip()
+        cn_caption = " ".join(chinese_lines).strip()
+
+    return (en_caption, cn_caption) if en_caption or cn_caption else (caption, caption)
+
+
+CAPTIONS = [
+    "**English Description:** A cat sleeps on a sofa.\n\n**Chinese Description:** 一只猫在沙发上睡觉。",
+    "**English:** A red car.\n**Chinese:** 一辆红色的汽车。",
+    "**英文描述:** A dog runs on the beach.\n**中文描述:** 一只狗在海滩上奔跑。",
+    "English Description: Two people talking.\nChinese Description: 两个人在交谈。",
+    "**Chinese Description:** 一座山。\n**English Description:** A mountain.",
+    "**English Description:** A forest path in autumn, leaves on the ground.",
+    "**Chinese Description:** 秋天的森林小路。",
+    "A bowl of fruit on a table.\n桌子上的一碗水果。",
+    "A bowl of fruit on a table.",
+    "桌子上的一碗水果。",
+    "",
+    "   \n  ",
+    "  **English Description:**   A lighthouse at dusk.  \n\n  **Chinese Description:**  黄昏时的灯塔。  \n",
+    "Intro line\n**English Description:** A bridge.\n**Chinese Description:** 一座桥。",
+]
+
+
+@pytest.mark.parametrize("caption", CAPTIONS)
+def test_parse_bilingual_caption_matches_previous_parser(caption):
+    assert bilingual.parse_bilingual_caption(caption) == reference_parse(caption)
+
+
+@pytest.mark.parametrize("caption", CAPTIONS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 7])
+def test_incremental_feed_matches_whole_caption(caption, chunk_size):
+    parser = bilingual.BilingualCaptionParser()
+    for start in range(0, len(caption), chunk_size):
+        parser.feed(caption[start:start + chunk_size])
+    assert parser.result() == bilingual.parse_bilingual_caption(caption)
+
+
+def test_marker_split_across_chunks_is_not_mistaken_for_shorter_marker():
+    parser = bilingual.BilingualCaptionParser()
+    for chunk in ["**English", " Description", ":** A cat.", "\n**Chinese Descr", "iption:** 一只猫。"]:
+        parser.feed(chunk)
+    assert parser.result() == ("A cat.", "一只猫。")
+
+
+def test_complete_once_model_starts_over():
+    parser = bilingual.BilingualCaptionParser()
+    assert not parser.feed("**English:** A cat.\n**Chinese:** 一只猫。\n")
+    assert parser.feed("**English:** A cat again")
+    assert parser.result() == ("A cat.", "一只猫。")
+
+
+@pytest.mark.parametrize("caption, language, expected", [
+    ("**English Description:** A cat.", "en", ("A cat.", "")),
+    ("A cat.", "en", ("A cat.", "")),
+    ("**Chinese Description:** 一只猫。", "cn", ("", "一只猫。")),
+    ("**English:** A cat.\n**Chinese:** 一只猫。", "both", ("A cat.", "一只猫。")),
+])
+def test_parse_caption_per_output_language(caption, language, expected):
+    assert bilingual.parse_caption(caption, language) == expected
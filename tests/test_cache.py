@@ -0,0 +1,107 @@
+import pytest
+
+from _common import import_package_module
+
+cache = import_package_module("util.cache")
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "time", fake)
+    return fake
+
+
+def test_hash_key_is_stable_and_order_sensitive():
+    assert cache.hash_key("a", {"x": 1, "y": 2}) == cache.hash_key("a", {"y": 2, "x": 1})
+    assert cache.hash_key("a", "b") != cache.hash_key("b", "a")
+
+
+def test_lru_evicts_least_recently_used():
+    lru = cache.LRUCache(max_entries=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert len(lru) == 2
+
+
+def test_lru_ttl_expires_entries(clock):
+    lru = cache.LRUCache(max_entries=4, ttl=10)
+    lru.set("a", 1)
+    clock.now += 10
+    assert lru.get("a") == 1
+    clock.now += 1
+    assert lru.get("a") is None
+    assert len(lru) == 0
+
+
+def test_lru_without_ttl_never_expires(clock):
+    lru = cache.LRUCache(max_entries=4)
+    lru.set("a", 1)
+    clock.now += 10 ** 9
+    assert lru.get("a") == 1
+
+
+def test_sqlite_store_round_trips_json(tmp_path):
+    store = cache.SQLiteStore(str(tmp_path / "cache.sqlite"), "captions")
+    store.set("a", ["en", "中文"])
+    assert store.get("a") == ["en", "中文"]
+    assert store.get("missing") is None
+
+
+def test_sqlite_store_evicts_least_recently_accessed(tmp_path, clock):
+    store = cache.SQLiteStore(str(tmp_path / "cache.sqlite"), "captions", max_entries=2)
+    store.set("a", 1)
+    clock.now += 1
+    store.set("b", 2)
+    clock.now += 1
+    assert store.get("a") == 1
+    clock.now += 1
+    store.set("c", 3)
+
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
+
+
+def test_sqlite_store_ttl_expires_entries(tmp_path, clock):
+    store = cache.SQLiteStore(str(tmp_path / "cache.sqlite"), "captions", ttl=10)
+    store.set("a", 1)
+    clock.now += 11
+    assert store.get("a") is None
+    clock.now -= 11
+    assert store.get("a") is None
+
+
+def test_sqlite_store_persists_across_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache.SQLiteStore(path, "captions").set("a", {"en": "a cat"})
+    assert cache.SQLiteStore(path, "captions").get("a") == {"en": "a cat"}
+
+
+def test_result_cache_promotes_store_hits_and_counts(tmp_path):
+    store = cache.SQLiteStore(str(tmp_path / "cache.sqlite"), "captions")
+    store.set("a", 1)
+    result_cache = cache.ResultCache("caption", max_entries=4, store=store)
+
+    assert result_cache.get("a") == 1
+    assert result_cache.memory.get("a") == 1
+    assert result_cache.get("b") is None
+
+    stats = result_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert result_cache.clear() == 1
+    assert result_cache.get("a") is None
@@ -0,0 +1,71 @@
+import queue
+import threading
+
+import pytest
+
+from _common import import_package_module
+
+pytest.importorskip("torch")
+pytest.importorskip("PIL")
+transformers = pytest.importorskip("transformers")
+joy_caption_service = import_package_module("service.joy_caption_service")
+JoyCaptionService = joy_caption_service.JoyCaptionService
+
+
+class FakeStreamer:
+    def __init__(self, *args, **kwargs):
+        self.queue = queue.Queue()
+
+    def put(self, text):
+        self.queue.put(text)
+
+    def end(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+        while (text := self.queue.get()) is not None:
+            yield text
+
+
+class FakeInputs(dict):
+    def to(self, device):
+        return self
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """A JoyCaptionService without a model, streaming "a", "b" and "c" until stopped."""
+    monkeypatch.setattr(transformers, "TextIteratorStreamer", FakeStreamer)
+    monkeypatch.setattr(joy_caption_service, "preprocess", lambda prepare, items, language: FakeInputs())
+    service = object.__new__(JoyCaptionService)
+    service._lock = threading.Lock()
+    service.device = "cpu"
+    service.processor = type("Processor", (), {"tokenizer": None})()
+
+    def generate(task, inputs, should_stop, streamer, **kwargs):
+        for chunk in ["a", "b", "c"]:
+            if should_stop():
+                break
+            streamer.put(chunk)
+        streamer.end()
+
+    service._stopping_criteria = lambda batch_size, should_stop, output_language: should_stop
+    service._prefix_kwargs = lambda inputs: {}
+    service._timed_generate = generate
+    return service
+
+
+def test_stream_reports_every_chunk(service):
+    texts = []
+    assert service.generate_stream(None, "system", "prompt", 8, 0.0, 0.9, 10, texts.append) == "abc"
+    assert texts == ["a", "ab", "abc"]
+    assert not service._lock.locked()
+
+
+def test_failing_callback_releases_the_model(service):
+    def on_text(text):
+        raise RuntimeError("frontend gone")
+
+    with pytest.raises(RuntimeError):
+        service.generate_stream(None, "system", "prompt", 8, 0.0, 0.9, 10, on_text)
+    assert not service._lock.locked()
@@ -0,0 +1,224 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from _common import import_package_module
+
+pytest.importorskip("torch")
+model_registry = import_package_module("service.model_registry")
+base_service = import_package_module("service.base_service")
+ModelRegistry = model_registry.ModelRegistry
+
+DEVICE = "cuda:0"
+
+
+class FakeService(base_service.BaseService):
+    """Records offload/onload calls, offload() and cleanup() block while block_offload or block_cleanup is cleared."""
+    movable = True
+
+    @classmethod
+    def instance_key(cls, model_path, memory_mode, device=None) -> tuple:
+        return model_path, memory_mode, device
+
+    @classmethod
+    def get_model_name(cls):
+        return "fake"
+
+    def __init__(self, model_path, memory_mode, device=None):
+        super().__init__(model_path, device)
+        self._offloaded = False
+        self.cleaned_up = False
+        self.offload_started = threading.Event()
+        self.block_offload = threading.Event()
+        self.block_offload.set()
+        self.cleanup_started = threading.Event()
+        self.block_cleanup = threading.Event()
+        self.block_cleanup.set()
+
+    @property
+    def offloaded(self) -> bool:
+        return self._offloaded
+
+    def offload(self) -> bool:
+        if not self.movable:
+            return False
+        self.offload_started.set()
+        self.block_offload.wait(5)
+        self._offloaded = True
+        return True
+
+    def onload(self) -> None:
+        self._offloaded = False
+
+    def cleanup(self):
+        self.cleanup_started.set()
+        self.block_cleanup.wait(5)
+        self.cleaned_up = True
+
+
+class QuantizedService(FakeService):
+    movable = False
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(ModelRegistry, "_entries", OrderedDict())
+    monkeypatch.setattr(ModelRegistry, "_loading", {})
+    monkeypatch.setattr(ModelRegistry, "_failures", {})
+    monkeypatch.setattr(ModelRegistry, "max_resident", 4)
+    monkeypatch.setattr(ModelRegistry, "idle_timeout", 0.0)
+    monkeypatch.setattr(ModelRegistry, "offload", False)
+    monkeypatch.setattr(ModelRegistry, "offload_idle", 0.0)
+    yield ModelRegistry
+    ModelRegistry.unload_all(force=True)
+
+
+def test_release_offloads_after_each_use(registry, monkeypatch):
+    monkeypatch.setattr(registry, "offload", True)
+    with registry.use(FakeService, "a", "Default", DEVICE) as service:
+        assert not service.offloaded
+    assert service.offloaded
+
+    with registry.use(FakeService, "a", "Default", DEVICE) as again:
+        assert again is service
+        assert not service.offloaded
+
+
+def test_unmovable_service_stays_loaded_after_each_use(registry, monkeypatch):
+    monkeypatch.setattr(registry, "offload", True)
+    with registry.use(QuantizedService, "q", "Maximum Savings (4-bit)", DEVICE) as service:
+        pass
+    assert not service.cleaned_up
+    assert registry.is_loaded(QuantizedService, "q", "Maximum Savings (4-bit)", DEVICE)
+
+
+def test_memory_pressure_unloads_unmovable_service(registry):
+    movable = registry.load(FakeService, "a", "Default", DEVICE)
+    quantized = registry.load(QuantizedService, "q", "Maximum Savings (4-bit)", DEVICE)
+
+    assert registry.offload_idle_services(DEVICE) == 2
+    assert movable.offloaded
+    assert quantized.cleaned_up
+    assert not registry.is_loaded(QuantizedService, "q", "Maximum Savings (4-bit)", DEVICE)
+
+
+def test_offload_runs_without_the_registry_lock(registry):
+    slow = registry.load(FakeService, "slow", "Default", DEVICE)
+    slow.block_offload.clear()
+    offloader = threading.Thread(target=registry.offload_idle_services, args=(DEVICE,))
+    offloader.start()
+    assert slow.offload_started.wait(5)
+
+    # Other models stay usable while one is being moved
+    other = threading.Thread(target=lambda: registry.release(registry.acquire(FakeService, "other", "Default",
+                                                                               DEVICE)))
+    other.start()
+    other.join(5)
+    assert not other.is_alive()
+    assert registry.status(FakeService, "other", "Default", DEVICE) == "ready"
+
+    # Acquiring the model being moved waits for the offload, then moves it back
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(registry.acquire(FakeService, "slow", "Default",
+                                                                              DEVICE)))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+    slow.block_offload.set()
+    waiter.join(5)
+    offloader.join(5)
+    assert acquired == [slow]
+    assert not slow.offloaded
+    registry.release(slow)
+
+
+def test_held_services_are_not_offloaded(registry):
+    service = registry.acquire(FakeService, "a", "Default", DEVICE)
+    assert registry.offload_idle_services(DEVICE) == 0
+    assert not service.offloaded
+    registry.release(service)
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def test_unload_runs_without_the_registry_lock(registry):
+    slow = registry.load(FakeService, "slow", "Default", DEVICE)
+    slow.block_cleanup.clear()
+    unloader = _start(registry.unload, FakeService, "slow", "Default", DEVICE)
+    assert slow.cleanup_started.wait(5)
+
+    # The registry answers while the model is torn down
+    assert registry.status(FakeService, "slow", "Default", DEVICE) == "unloaded"
+    other = _start(lambda: registry.release(registry.acquire(FakeService, "other", "Default", DEVICE)))
+    other.join(5)
+    assert not other.is_alive()
+
+    # Acquiring the model being unloaded waits for the teardown, then loads it again
+    acquired = []
+    waiter = _start(lambda: acquired.append(registry.acquire(FakeService, "slow", "Default", DEVICE)))
+    waiter.join(0.1)
+    assert waiter.is_alive()
+    slow.block_cleanup.set()
+    waiter.join(5)
+    unloader.join(5)
+    assert slow.cleaned_up
+    assert len(acquired) == 1 and acquired[0] is not slow
+    registry.release(acquired[0])
+
+
+def test_eviction_unloads_before_loading_without_the_registry_lock(registry, monkeypatch):
+    monkeypatch.setattr(registry, "max_resident", 1)
+    evicted = registry.load(FakeService, "a", "Default", DEVICE)
+    evicted.block_cleanup.clear()
+    loader = _start(registry.load, FakeService, "b", "Default", DEVICE)
+    assert evicted.cleanup_started.wait(5)
+
+    assert registry.status(FakeService, "b", "Default", DEVICE) == "loading"
+    assert registry.resident()[0]["model_path"] == "a"
+    evicted.block_cleanup.set()
+    loader.join(5)
+    assert [item["model_path"] for item in registry.resident()] == ["b"]
+
+
+class SlowService(FakeService):
+    """Construction blocks while loading_blocked is cleared."""
+    constructing = threading.Event()
+    loading_blocked = threading.Event()
+
+    def __init__(self, model_path, memory_mode, device=None):
+        SlowService.constructing.set()
+        SlowService.loading_blocked.wait(5)
+        super().__init__(model_path, memory_mode, device)
+
+
+def test_loads_in_flight_count_toward_the_cap(registry, monkeypatch):
+    monkeypatch.setattr(registry, "max_resident", 2)
+    idle = registry.load(FakeService, "idle", "Default", DEVICE)
+    SlowService.constructing.clear()
+    SlowService.loading_blocked.clear()
+    first = _start(registry.load, SlowService, "slow", "Default", DEVICE)
+    assert SlowService.constructing.wait(5)
+
+    # The second load waits for the first one, then evicts the idle model to stay under the cap
+    second = _start(registry.load, FakeService, "b", "Default", DEVICE)
+    second.join(0.1)
+    assert second.is_alive()
+    assert registry.status(FakeService, "b", "Default", DEVICE) == "loading"
+
+    SlowService.loading_blocked.set()
+    first.join(5)
+    second.join(5)
+    assert idle.cleaned_up
+    assert sorted(item["model_path"] for item in registry.resident()) == ["b", "slow"]
+
+
+def test_loader_holds_the_loaded_service(registry):
+    service = registry.acquire(FakeService, "a", "Default", DEVICE)
+    assert registry.resident()[0]["refs"] == 1
+    registry.release(service)
+    assert registry.resident()[0]["refs"] == 0
@@ -0,0 +1,135 @@
+from email.utils import formatdate
+
+import pytest
+
+from _common import import_package_module
+
+retry = import_package_module("client.retry")
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(retry.time, "monotonic", fake)
+    return fake
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("3", 3.0),
+    (" 1.5 ", 1.5),
+    ("-4", 0.0),
+    ("soon", None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert retry.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    delay = retry.parse_retry_after(formatdate(retry.time.time() + 60, usegmt=True))
+    assert 55 <= delay <= 60
+    assert retry.parse_retry_after(formatdate(retry.time.time() - 60, usegmt=True)) == 0.0
+
+
+def test_retry_policy_backoff_is_bounded_and_grows(monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+    policy = retry.RetryPolicy(max_attempts=5, backoff_base=0.5, backoff_max=3.0)
+    assert [policy.delay(attempt) for attempt in range(1, 5)] == [0.5, 1.0, 2.0, 3.0]
+
+
+def test_retry_policy_jitter_stays_below_backoff():
+    policy = retry.RetryPolicy(backoff_base=1.0, backoff_max=10.0)
+    assert all(0 <= policy.delay(3) <= 4.0 for _ in range(100))
+
+
+def test_retry_policy_honors_retry_after_up_to_max():
+    policy = retry.RetryPolicy(backoff_base=0.5, backoff_max=10.0)
+    assert policy.delay(1, retry_after=7) == 7
+    assert policy.delay(1, retry_after=60) == 10.0
+    assert retry.RetryPolicy(max_attempts=0).max_attempts == 1
+
+
+def test_circuit_breaker_opens_after_threshold(clock):
+    breaker = retry.CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == retry.CircuitBreaker.OPEN
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.retry_in() == pytest.approx(20)
+
+
+def test_circuit_breaker_success_resets_failures(clock):
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == retry.CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_half_open_trial(clock):
+    breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    # A single trial call is let through, its failure re-opens the circuit right away
+    assert breaker.allow()
+    assert breaker.state == retry.CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == retry.CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == retry.CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_breaker_registry_shares_breakers_per_key():
+    registry = retry.CircuitBreakerRegistry(failure_threshold=2, reset_timeout=5)
+    breaker = registry.get("http://a/joycaption/generate")
+    assert registry.get("http://a/joycaption/generate") is breaker
+    assert registry.get("http://b/joycaption/generate") is not breaker
+    assert (breaker.failure_threshold, breaker.reset_timeout) == (2, 5)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, detail: str = "failed", headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = detail
+        self._detail = detail
+
+    def json(self):
+        return {"detail": self._detail}
+
+
+@pytest.mark.parametrize("status_code, retryable", [
+    (429, True), (502, True), (503, True), (504, True), (500, False), (501, False), (400, False),
+])
+def test_only_transient_statuses_are_retryable(status_code, retryable):
+    pytest.importorskip("requests")
+    base_client = import_package_module("client.base_client")
+    exceptions = import_package_module("client.exceptions")
+
+    with pytest.raises(exceptions.ClientException) as error:
+        base_client.BaseClient()._handle_error_status(FakeResponse(status_code, headers={"Retry-After": "2"}))
+    assert isinstance(error.value, (exceptions.RateLimitError, exceptions.ServiceUnavailableError)) == retryable
+    if retryable:
+        assert error.value.retry_after == 2.0
+    else:
+        assert error.value.status_code == status_code
@@ -0,0 +1,39 @@
+import pytest
+
+from _common import import_package_module
+
+tags = import_package_module("util.tags")
+
+
+@pytest.mark.parametrize("text", [
+    "1girl, solo, long hair",
+    "一个女孩，独自，长发",
+    "一只猫、一只狗",
+    "cat; dog\nbird",
+    "single tag",
+    "",
+])
+def test_round_trip_keeps_canonical_tag_lists(text):
+    assert tags.join_segments(tags.split_segments(text)) == text
+
+
+def test_split_keeps_separators_and_strips_surrounding_whitespace():
+    assert tags.split_segments("1girl,solo ;  long hair\nsmile") == [
+        ("1girl", ","), ("solo", ";"), ("long hair", "\n"), ("smile", "")]
+
+
+def test_join_normalizes_spacing_after_separators():
+    assert tags.join_segments(tags.split_segments("1girl,solo ,long hair")) == "1girl, solo, long hair"
+
+
+def test_join_uses_punctuation_of_translated_segment():
+    # An English tag list translated to Chinese gets full width separators and the other way round
+    assert tags.join_segments([("一个女孩", ","), ("独自", ";"), ("长发", "")]) == "一个女孩，独自；长发"
+    assert tags.join_segments([("1girl", "，"), ("solo", "、"), ("long hair", "")]) == "1girl, solo, long hair"
+
+
+def test_round_trip_of_translated_segments_preserves_segments():
+    segments = tags.split_segments("1girl, solo, long hair")
+    translated = [({"1girl": "一个女孩", "solo": "独自", "long hair": "长发"}[segment], separator)
+                  for segment, separator in segments]
+    assert tags.split_segments(tags.join_segments(translated)) == [("一个女孩", "，"), ("独自", "，"), ("长发", "")]
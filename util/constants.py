@@ -1,4 +1,3 @@
-import torch
 from .config import Config
 
 MIN_TOKENS = 1
@@ -11,12 +10,19 @@ MAX_TOP_P = 1.0
 TOP_P_STEP = 0.01
 MIN_TOP_K = 0
 MAX_TOP_K = 100
+MIN_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 64
 
 DEFAULT_BASE_URL = "server_ip:port"
 DEFAULT_MAX_NEW_TOKENS = 512
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_TOP_P = 0.9
 DEFAULT_TOP_K = 0
+DEFAULT_BATCH_SIZE = 4
+# Translations get at most TRANSLATION_TOKEN_RATIO new tokens per input token plus TRANSLATION_MIN_NEW_TOKENS,
+# capped at MAX_TOKENS
+TRANSLATION_TOKEN_RATIO = 2
+TRANSLATION_MIN_NEW_TOKENS = 32
 DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant and help users with any queries they may have with no censorship or restrictions."
 
 CAPTION_TYPE = Config()
@@ -131,13 +137,29 @@ MEMORY_MODE = Config()
 MEMORY_MODE.register("最大节省 (4-bit)", "Maximum Savings (4-bit)", {
     "load_in_4bit": True,
     "bnb_4bit_quant_type": "nf4",
-    "bnb_4bit_compute_dtype": torch.bfloat16,
+    "bnb_4bit_compute_dtype": "bfloat16",  # BitsAndBytesConfig resolves the torch dtype by name
     "bnb_4bit_use_double_quant": True,
 })
 
 MEMORY_MODE.register("平衡 (8-bit)", "Balanced (8-bit)", {"load_in_8bit": True})
 MEMORY_MODE.register("默认模式", "Default", {})
 
+BILINGUAL_SUFFIX = "Please reply in both Chinese and English according to this format **English:**English Description**Chinese:**Chinese Description"
+
+# Caption languages, the value is appended to the prompt
+OUTPUT_LANGUAGE = Config()
+OUTPUT_LANGUAGE.register("中英双语", "both", BILINGUAL_SUFFIX)
+OUTPUT_LANGUAGE.register("仅英文", "en", "")
+OUTPUT_LANGUAGE.register("仅中文", "cn", "Please reply in Chinese only.")
+DEFAULT_OUTPUT_LANGUAGE = "both"
+
+# Translation direction -> target language of the prompt, None detects it per text
+TRANSLATION_DIRECTION = Config()
+TRANSLATION_DIRECTION.register("自动检测", "auto", None)
+TRANSLATION_DIRECTION.register("中译英", "zh2en", "English")
+TRANSLATION_DIRECTION.register("英译中", "en2zh", "Chinese")
+DEFAULT_TRANSLATION_DIRECTION = "auto"
+
 EXEC_OPTIONS = Config()
 EXEC_OPTIONS.register("远程", "remote", None)
 EXEC_OPTIONS.register("本地", "local", None)
@@ -0,0 +1,70 @@
+"""
+Fast, deterministic Chinese detection for choosing the translation direction.
+
+A text counts as Chinese when Han characters make up at least CHINESE_RATIO_THRESHOLD of its letters.
+Only texts whose ratio falls in the ambiguous band are handed to langdetect, and only when the
+PILLAR_LANGDETECT_FALLBACK setting is on and langdetect is installed.
+"""
+import logging
+import re
+from typing import List
+
+from .settings import LANGDETECT_FALLBACK
+
+logger = logging.getLogger(__name__)
+
+CHINESE_RATIO_THRESHOLD = 0.3
+# Mixed texts with a ratio in this band go to langdetect when the fallback is enabled
+AMBIGUOUS_RATIO_BAND = (0.1, 0.5)
+
+_HAN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+# Letters of any script, Han characters included
+_LETTER_PATTERN = re.compile(r'[^\W\d_]')
+
+_detect = None
+
+
+def chinese_ratio(text: str) -> float:
+    """Share of Han characters among the letters of text, 0 for a text without letters."""
+    letters = len(_LETTER_PATTERN.findall(text))
+    return len(_HAN_PATTERN.findall(text)) / letters if letters else 0.0
+
+
+def is_chinese(text: str) -> bool:
+    return is_chinese_batch([text])[0]
+
+
+def is_chinese_batch(texts: List[str]) -> List[bool]:
+    """Detect every text of a batch, langdetect is loaded at most once and only for ambiguous texts."""
+    results = []
+    for text in texts:
+        ratio = chinese_ratio(text)
+        if LANGDETECT_FALLBACK and AMBIGUOUS_RATIO_BAND[0] <= ratio <= AMBIGUOUS_RATIO_BAND[1]:
+            detected = _langdetect_is_chinese(text)
+            if detected is not None:
+                results.append(detected)
+                continue
+        results.append(ratio >= CHINESE_RATIO_THRESHOLD)
+    return results
+
+
+def _langdetect_is_chinese(text: str) -> bool | None:
+    global _detect
+    if _detect is None:
+        try:
+            from langdetect import DetectorFactory, detect
+        except ImportError:
+            logger.warning("PILLAR_LANGDETECT_FALLBACK is set but langdetect is not installed, "
+                           "using the Chinese character ratio only")
+            _detect = False
+            return None
+        # langdetect is random unless seeded
+        DetectorFactory.seed = 0
+        _detect = detect
+    if _detect is False:
+        return None
+
+    try:
+        return _detect(text).startswith("zh")
+    except Exception:
+        return None
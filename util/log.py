@@ -1,4 +1,26 @@
+"""
+Console logging of the extension. The colored node messages and the records of the package's stdlib loggers
+are handed to a queue and written by a background thread (PILLAR_LOG_QUEUE), so the executing thread never
+waits on the console and never formats a message.
+
+Records logged with extra={"req_id": ..., "elapsed_ms": ...} are written with a " [req_id 12.3 ms]" suffix,
+so the lines of one request can be found across the client and the server.
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import threading
+
 from .pyproject import DISPAY_NAME
+from .settings import LOG_QUEUE
+
+# Parent logger of every logging.getLogger(__name__) in the package
+PACKAGE_LOGGER_NAME = __name__.rsplit(".", 2)[0]
+
+# Format of the caption server's log lines, request_context is filled in by add_request_context
+LOG_FORMAT = "%(asctime)s %(name)s %(levelname)s %(message)s%(request_context)s"
 
 # https://stackoverflow.com/questions/4842424/list-of-ansi-color-escape-sequences
 # https://en.wikipedia.org/wiki/ANSI_escape_code#3-bit_and_4-bit
@@ -48,36 +70,159 @@ COLORS = {
 }
 
 
-def log_node_success(node_name, message, msg_color='RESET'):
-  """Logs a success message."""
-  _log_node("BRIGHT_GREEN", node_name, message, msg_color=msg_color)
+def log_node_success(node_name, message, *args, msg_color='RESET'):
+  """Logs a success message, args are %-formatted into message when it is written."""
+  _log_node("BRIGHT_GREEN", node_name, message, *args, msg_color=msg_color)
 
 
-def log_node_info(node_name, message, msg_color='RESET'):
+def log_node_info(node_name, message, *args, msg_color='RESET'):
   """Logs an info message."""
-  _log_node("CYAN", node_name, message, msg_color=msg_color)
+  _log_node("CYAN", node_name, message, *args, msg_color=msg_color)
 
 
-def log_node_warn(node_name, message, msg_color='RESET'):
+def log_node_warn(node_name, message, *args, msg_color='RESET'):
   """Logs an warn message."""
-  _log_node("YELLOW", node_name, message, msg_color=msg_color)
+  _log_node("YELLOW", node_name, message, *args, msg_color=msg_color, level=logging.WARNING)
 
 
-def log_node(node_name, message, msg_color='RESET'):
+def log_node(node_name, message, *args, msg_color='RESET'):
   """Logs a message."""
-  _log_node("CYAN", node_name, message, msg_color=msg_color)
+  _log_node("CYAN", node_name, message, *args, msg_color=msg_color)
 
 
-def _log_node(color, node_name, message, msg_color='RESET'):
+def _log_node(color, node_name, message, *args, msg_color='RESET', level=logging.INFO):
   """Logs for a node message."""
-  log(message, color=color, prefix=node_name.replace(" (rgthree)", ""), msg_color=msg_color)
+  _emit(level, message, args, color=color, prefix=node_name.replace(" (rgthree)", ""), msg_color=msg_color)
 
 
 def log(message, color=None, msg_color=None, prefix=None):
   """Basic logging."""
-  color = COLORS[color] if color is not None and color in COLORS else COLORS["BRIGHT_GREEN"]
-  msg_color = COLORS[msg_color] if msg_color is not None and msg_color in COLORS else ''
-  prefix = f'[{prefix}]' if prefix is not None else ''
-  msg = f'{color}[{DISPAY_NAME}]{prefix}'
-  msg += f'{msg_color} {message}{COLORS["RESET"]}'
-  print(msg)
+  _emit(logging.INFO, message, (), color=color, prefix=prefix, msg_color=msg_color)
+
+
+def _emit(level, message, args, color=None, prefix=None, msg_color=None):
+  logger = _console_logger()
+  if logger.isEnabledFor(level):
+    logger.log(level, message, *args, extra={"color": color, "prefix": prefix, "msg_color": msg_color})
+
+
+class _ConsoleFormatter(logging.Formatter):
+  """The ANSI colored "[Pillar][node] message" line, built on the writing thread."""
+
+  def format(self, record):
+    color = COLORS[record.color] if record.color is not None and record.color in COLORS else COLORS["BRIGHT_GREEN"]
+    msg_color = COLORS[record.msg_color] if record.msg_color is not None and record.msg_color in COLORS else ''
+    prefix = f'[{record.prefix}]' if record.prefix is not None else ''
+    return f'{color}[{DISPAY_NAME}]{prefix}{msg_color} {record.getMessage()}{COLORS["RESET"]}'
+
+
+class _PrintHandler(logging.Handler):
+  """print()s records, resolving sys.stdout on every call since ComfyUI wraps it after startup."""
+
+  def emit(self, record):
+    try:
+      print(self.format(record))
+    except Exception:
+      self.handleError(record)
+
+
+def add_request_context(record):
+  """Logging filter setting record.request_context from the req_id and elapsed_ms extras, for LOG_FORMAT."""
+  if not hasattr(record, "request_context"):
+    req_id = getattr(record, "req_id", None)
+    elapsed_ms = getattr(record, "elapsed_ms", None)
+    if req_id is None:
+      record.request_context = ""
+    elif elapsed_ms is None:
+      record.request_context = f" [{req_id}]"
+    else:
+      record.request_context = f" [{req_id} {elapsed_ms:.1f} ms]"
+  return True
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+  """
+  Enqueues records unformatted. QueueHandler.prepare formats the message and traceback on the logging thread
+  to make records safe to send to another process; the listener runs in this process and formats them itself.
+  """
+
+  def prepare(self, record):
+    return record
+
+
+class _RootHandler(logging.Handler):
+  """
+  Passes records of the package loggers on to the root logger's handlers, as propagation would. The host
+  application's format does not know the request extras, so they are appended to the message here.
+  """
+
+  def emit(self, record):
+    add_request_context(record)
+    if record.request_context:
+      record = copy.copy(record)
+      record.msg, record.args = record.getMessage() + record.request_context, None
+      record.request_context = ""
+    logging.getLogger().handle(record)
+
+
+def _is_console_record(record):
+  return hasattr(record, "color")
+
+
+_console = None
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _console_logger() -> logging.Logger:
+  if _console is None:
+    setup_logging()
+  return _console
+
+
+def setup_logging(use_queue: bool = LOG_QUEUE) -> None:
+  """
+  Route the colored console messages and the package loggers through one queue drained by a background
+  thread. Without use_queue the console messages are printed directly and the package loggers are left alone.
+  Called on first use, calling it again has no effect.
+  """
+  global _console, _listener
+  with _setup_lock:
+    if _console is not None:
+      return
+    console_handler = _PrintHandler()
+    console_handler.setFormatter(_ConsoleFormatter())
+    console = logging.getLogger(f"{PACKAGE_LOGGER_NAME}.console")
+    console.setLevel(logging.INFO)
+    console.propagate = False
+
+    if use_queue:
+      console_handler.addFilter(_is_console_record)
+      root_handler = _RootHandler()
+      root_handler.addFilter(lambda record: not _is_console_record(record))
+      records = queue.SimpleQueue()
+      _listener = logging.handlers.QueueListener(records, console_handler, root_handler)
+      _listener.start()
+      atexit.register(_listener.stop)
+
+      queue_handler = _LazyQueueHandler(records)
+      console.addHandler(queue_handler)
+      package_logger = logging.getLogger(PACKAGE_LOGGER_NAME)
+      package_logger.addHandler(queue_handler)
+      package_logger.propagate = False
+    else:
+      console.addHandler(console_handler)
+    _console = console
+
+
+def setup_server_logging(level: int = logging.INFO) -> None:
+  """
+  Log to stderr in LOG_FORMAT, for the caption server. Every uvicorn worker process has to call it, workers do
+  not inherit the logging configuration of the process that started them.
+  """
+  handler = logging.StreamHandler()
+  handler.setFormatter(logging.Formatter(LOG_FORMAT))
+  handler.addFilter(add_request_context)
+  # No effect when the root logger already has handlers, e.g. in the process that configured it
+  logging.basicConfig(level=level, handlers=[handler])
+  setup_logging()
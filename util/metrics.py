@@ -0,0 +1,174 @@
+"""
+In-process metrics exported in the Prometheus text format, without the prometheus_client dependency.
+
+Instrumented code calls the module functions (observe_stage, stage, count_cache, ...), which return right away
+unless PILLAR_METRICS is on. render() produces the exposition served by the ComfyUI route /pillar/metrics and
+the caption server's /metrics.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from .settings import METRICS_ENABLED
+
+# Seconds, from sub-millisecond parsing up to model downloads
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram per label set, with the _bucket, _sum and _count series Prometheus expects."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per bucket counts (last one is +Inf), sum]
+        self._values: Dict[LabelValues, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "pillar_stage_seconds",
+    "Time spent per stage: model_check, encode, request, preprocess, lock_wait, prefill, decode, parse, "
+    "model_load, model_unload, offload, onload",
+    ["stage"])
+QUEUE_WAIT_SECONDS = Histogram("pillar_queue_wait_seconds", "Time requests wait in a batch scheduler queue",
+                               ["queue"])
+GENERATED_TOKENS = Counter("pillar_generated_tokens_total", "Tokens generated by the local model", ["task"])
+TOKENS_PER_SECOND = Histogram("pillar_decode_tokens_per_second", "Decode throughput of each generate call",
+                              ["task"], TOKENS_PER_SECOND_BUCKETS)
+CACHE_REQUESTS = Counter("pillar_cache_requests_total", "Result cache lookups", ["cache", "result"])
+UPLOAD_BYTES = Counter("pillar_upload_bytes_total", "Encoded image bytes uploaded to the caption server")
+
+METRICS = [STAGE_SECONDS, QUEUE_WAIT_SECONDS, GENERATED_TOKENS, TOKENS_PER_SECOND, CACHE_REQUESTS, UPLOAD_BYTES]
+
+
+def observe_stage(stage_name: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage_name)
+
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    """Time the with block as one observation of the stage."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage_name)
+
+
+
+def timed(stage_name: str) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of the function as one observation of the stage."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_queue_wait(queue: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        QUEUE_WAIT_SECONDS.observe(seconds, queue)
+
+
+def observe_generation(task: str, tokens: int, decode_seconds: float) -> None:
+    if METRICS_ENABLED:
+        GENERATED_TOKENS.inc(tokens, task)
+        if decode_seconds > 0:
+            TOKENS_PER_SECOND.observe(tokens / decode_seconds, task)
+
+
+def count_cache(cache: str, hit: bool) -> None:
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.inc(1, cache, "hit" if hit else "miss")
+
+
+def count_upload(size: int) -> None:
+    if METRICS_ENABLED:
+        UPLOAD_BYTES.inc(size)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
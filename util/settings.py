@@ -0,0 +1,108 @@
+"""
+Runtime settings for the extension, read from PILLAR_* environment variables.
+"""
+import os
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.environ.get(name)
+    return value.strip() if value and value.strip() else default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Caption cache
+CAPTION_CACHE_ENABLED = _env_bool("PILLAR_CAPTION_CACHE", True)
+CAPTION_CACHE_MAX_ENTRIES = _env_int("PILLAR_CAPTION_CACHE_MAX_ENTRIES", 2048)
+CAPTION_CACHE_TTL = _env_float("PILLAR_CAPTION_CACHE_TTL", 0.0)  # seconds, 0 means entries never expire
+CAPTION_CACHE_DISK = _env_bool("PILLAR_CAPTION_CACHE_DISK", False)
+CAPTION_CACHE_DISK_MAX_ENTRIES = _env_int("PILLAR_CAPTION_CACHE_DISK_MAX_ENTRIES", 100000)
+
+# Translation cache, persisted by default since translations of recurring tags and prompts are small
+TRANSLATION_CACHE_ENABLED = _env_bool("PILLAR_TRANSLATION_CACHE", True)
+TRANSLATION_CACHE_MAX_ENTRIES = _env_int("PILLAR_TRANSLATION_CACHE_MAX_ENTRIES", 8192)
+TRANSLATION_CACHE_TTL = _env_float("PILLAR_TRANSLATION_CACHE_TTL", 0.0)  # seconds, 0 means entries never expire
+TRANSLATION_CACHE_DISK = _env_bool("PILLAR_TRANSLATION_CACHE_DISK", True)
+TRANSLATION_CACHE_DISK_MAX_ENTRIES = _env_int("PILLAR_TRANSLATION_CACHE_DISK_MAX_ENTRIES", 100000)
+
+# Ask langdetect about texts mixing Chinese and other letters, see util.lang (needs langdetect installed)
+LANGDETECT_FALLBACK = _env_bool("PILLAR_LANGDETECT_FALLBACK", False)
+
+# Batches of the local services preprocessed ahead of the running generate call, 0 disables the pipeline
+PREPROCESS_PREFETCH = max(0, _env_int("PILLAR_PREPROCESS_PREFETCH", 2))
+
+# Past key/values of the prompt text before the image, reused by captions sharing the system prompt
+PREFIX_CACHE_ENABLED = _env_bool("PILLAR_PREFIX_CACHE", False)
+PREFIX_CACHE_MAX_ENTRIES = _env_int("PILLAR_PREFIX_CACHE_MAX_ENTRIES", 8)
+
+# Stage timings, token throughput, cache and upload counters in Prometheus format, see util.metrics
+METRICS_ENABLED = _env_bool("PILLAR_METRICS", False)
+
+# Write log records on a background thread instead of the thread logging them, see util.log
+LOG_QUEUE = _env_bool("PILLAR_LOG_QUEUE", True)
+
+# HTTP client connection pool
+HTTP_POOL_CONNECTIONS = _env_int("PILLAR_HTTP_POOL_CONNECTIONS", 4)
+HTTP_POOL_MAXSIZE = _env_int("PILLAR_HTTP_POOL_MAXSIZE", 16)
+HTTP_KEEP_ALIVE = _env_bool("PILLAR_HTTP_KEEP_ALIVE", True)
+HTTP_CONNECT_TIMEOUT = _env_float("PILLAR_HTTP_CONNECT_TIMEOUT", 5.0)
+HTTP_READ_TIMEOUT = _env_float("PILLAR_HTTP_READ_TIMEOUT", 60.0)
+
+# HTTP client retries and circuit breaking
+HTTP_RETRY_MAX_ATTEMPTS = _env_int("PILLAR_HTTP_RETRY_MAX_ATTEMPTS", 3)
+HTTP_RETRY_BACKOFF_BASE = _env_float("PILLAR_HTTP_RETRY_BACKOFF_BASE", 0.5)
+HTTP_RETRY_BACKOFF_MAX = _env_float("PILLAR_HTTP_RETRY_BACKOFF_MAX", 10.0)
+CIRCUIT_FAILURE_THRESHOLD = _env_int("PILLAR_CIRCUIT_FAILURE_THRESHOLD", 5)
+CIRCUIT_RESET_TIMEOUT = _env_float("PILLAR_CIRCUIT_RESET_TIMEOUT", 30.0)
+
+# Servers listed together in base_url: balancing strategy (least_outstanding or ewma) and seconds between
+# health checks of each server, 0 disables the checks
+LB_STRATEGY = _env_str("PILLAR_LB_STRATEGY", "least_outstanding").lower()
+HEALTH_CHECK_INTERVAL = _env_float("PILLAR_HEALTH_CHECK_INTERVAL", 10.0)
+
+# Bundled caption server
+SERVER_HOST = _env_str("PILLAR_SERVER_HOST", "0.0.0.0")
+SERVER_PORT = _env_int("PILLAR_SERVER_PORT", 8000)
+SERVER_WORKERS = _env_int("PILLAR_SERVER_WORKERS", 1)
+SERVER_MODEL = _env_str("PILLAR_SERVER_MODEL", "fancyfeast/llama-joycaption-beta-one-hf-llava")
+SERVER_MODEL_DIR = _env_str("PILLAR_SERVER_MODEL_DIR", os.path.join("models", "LLavacheckpoints"))
+SERVER_MEMORY_MODE = _env_str("PILLAR_SERVER_MEMORY_MODE", "Default")
+SERVER_MAX_BATCH_SIZE = _env_int("PILLAR_SERVER_MAX_BATCH_SIZE", 8)
+SERVER_BATCH_WAIT_MS = _env_float("PILLAR_SERVER_BATCH_WAIT_MS", 20.0)
+# Requests refused with 503 and Retry-After once this many are queued per scheduler, 0 disables the limit
+SERVER_MAX_QUEUE = max(0, _env_int("PILLAR_SERVER_MAX_QUEUE", 256))
+SERVER_RETRY_AFTER = _env_int("PILLAR_SERVER_RETRY_AFTER", 2)  # seconds
+
+# Local models
+MAX_RESIDENT_MODELS = _env_int("PILLAR_MAX_RESIDENT_MODELS", 1)
+# Load the local JoyCaption model on a background thread when the extension loads
+PRELOAD_MODEL = _env_bool("PILLAR_PRELOAD", False)
+PRELOAD_MEMORY_MODE = _env_str("PILLAR_PRELOAD_MEMORY_MODE", "Default")
+PRELOAD_WARMUP = _env_bool("PILLAR_PRELOAD_WARMUP", True)
+# Unload local models nobody used for this many seconds, 0 keeps them loaded
+MODEL_IDLE_TIMEOUT = _env_float("PILLAR_MODEL_IDLE_TIMEOUT", 0.0)
+# Move local models to the CPU once idle for MODEL_OFFLOAD_IDLE seconds (0: right after each use), reloaded on demand.
+# 8-bit and 4-bit models cannot be moved and stay on the GPU, MODEL_IDLE_TIMEOUT unloads them
+MODEL_OFFLOAD = _env_bool("PILLAR_MODEL_OFFLOAD", False)
+MODEL_OFFLOAD_IDLE = _env_float("PILLAR_MODEL_OFFLOAD_IDLE", 0.0)
+# Offload idle local models when ComfyUI's model management needs their VRAM, e.g. to load a checkpoint
+COMFY_MEMORY_HOOK = _env_bool("PILLAR_COMFY_MEMORY_HOOK", True)
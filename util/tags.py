@@ -0,0 +1,30 @@
+"""
+Splitting of tag lists for per-tag translation, and reassembly in the punctuation style of the
+translated tags.
+"""
+import re
+from typing import List, Tuple
+
+from .lang import is_chinese
+
+# Tag list separators, captured so the list can be reassembled in its original layout
+_SEGMENT_SEPARATOR = re.compile(r"\s*([,，、;；\n])\s*")
+# separator -> (after an English segment, after a Chinese segment)
+_SEPARATORS = {",": (", ", "，"), "，": (", ", "，"), "、": (", ", "、"), ";": ("; ", "；"), "；": ("; ", "；"),
+               "\n": ("\n", "\n")}
+
+
+def split_segments(text: str) -> List[Tuple[str, str]]:
+    """Split a tag list into (segment, separator) pairs, the last separator is empty."""
+    parts = _SEGMENT_SEPARATOR.split(text)
+    return list(zip(parts[::2], parts[1::2] + [""]))
+
+
+def join_segments(segments: List[Tuple[str, str]]) -> str:
+    """Reassemble translated segments, with separators in the punctuation style of the preceding segment."""
+    joined = []
+    for segment, separator in segments:
+        joined.append(segment)
+        if separator:
+            joined.append(_SEPARATORS[separator][1 if is_chinese(segment) else 0])
+    return "".join(joined)